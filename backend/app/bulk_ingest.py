@@ -0,0 +1,250 @@
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, cast, AsyncIterator, Callable, Iterable, Optional
+from app.crud import bulk_add_photos, get_existing_hashes, upsert_file_index_entries
+from app.image_utils import (
+    ByteStream,
+    NewPhotosCallback,
+    get_scan_batch_size,
+    get_scan_hash_workers,
+    photo_filename,
+    place_upload,
+    spool_upload,
+)
+from app.photo_layout import get_photo_layout, photo_storage_path
+import anyio.from_thread
+import logging
+import shutil
+import tarfile
+import tempfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+# Raised while reading a damaged tar (any compression) or zip archive
+ARCHIVE_ERRORS = (tarfile.TarError, zipfile.BadZipFile, EOFError)
+
+
+class BlockingBodyReader:
+    """
+    File-like view of a streamed request body for code running in a worker
+    thread (tarfile, shutil): each read pulls chunks from the event loop as
+    they arrive, so at most one read's worth is buffered.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes]) -> None:
+        self.chunks = chunks
+        self.buffer = bytearray()
+        self.done = False
+
+    async def _next_chunk(self) -> Optional[bytes]:
+        try:
+            return await self.chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    def read(self, size: int = -1) -> bytes:
+        while not self.done and (size < 0 or len(self.buffer) < size):
+            chunk = anyio.from_thread.run(self._next_chunk)
+            if chunk is None:
+                self.done = True
+            else:
+                self.buffer += chunk
+        if size < 0:
+            size = len(self.buffer)
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+@dataclass
+class IngestResult:
+    filename: str
+    # "added", "duplicate", "rejected" or "error" (the unread rest of a damaged
+    # archive); "pending" until committed
+    status: str
+    hash: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BulkIngest:
+    """
+    Adds many photos to the library with one transaction per batch.
+
+    Each file is spooled into the photos folder and hashed as it is copied (see
+    spool_upload). Spooled files are checked against the DB a batch at a time:
+    duplicates are deleted, the rest renamed into place, and their photo and
+    file index rows committed together, so the folder watcher does not hash them
+    again. Files go where PHOTO_LAYOUT puts them; in the flat layout they are
+    rejected, not overwritten, when their name is taken.
+    """
+
+    def __init__(
+        self,
+        photos_dir: Path,
+        db: Any,
+        batch_size: Optional[int] = None,
+        on_new_photos: Optional[NewPhotosCallback] = None,
+    ) -> None:
+        self.photos_dir = Path(photos_dir)
+        self.db = db
+        self.batch_size = batch_size or get_scan_batch_size()
+        self.on_new_photos = on_new_photos
+        self.layout = get_photo_layout()
+        self.results: list[IngestResult] = []
+        # Results for spooled files waiting for the next commit, in input order
+        self.pending: list[tuple[IngestResult, Path]] = []
+        self.hashes: set[str] = set()
+
+    def reject(self, name: str, detail: str) -> None:
+        self.results.append(IngestResult(name, "rejected", detail=detail))
+
+    def add(self, name: str, stream: ByteStream) -> None:
+        filename, problem = photo_filename(name)
+        if problem is not None:
+            self.reject(name, problem)
+            return
+        self.add_spooled(filename, *spool_upload(self.photos_dir, stream))
+
+    def add_spooled(self, filename: str, tmp_path: Path, sha256: str) -> None:
+        result = IngestResult(filename, "pending", sha256)
+        self.results.append(result)
+        self.pending.append((result, tmp_path))
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def add_files(self, files: Iterable[tuple[str, ByteStream]]) -> None:
+        """
+        Add already received files (e.g. multipart parts), hashing them in
+        parallel on SCAN_HASH_WORKERS threads.
+        """
+        checked = [(name, stream, *photo_filename(name)) for name, stream in files]
+        with ThreadPoolExecutor(max_workers=get_scan_hash_workers()) as pool:
+            # hashlib releases the GIL while hashing, so threads use all cores
+            spooling = iter(
+                [
+                    pool.submit(spool_upload, self.photos_dir, stream)
+                    for _, stream, _, problem in checked
+                    if problem is None
+                ]
+            )
+            for name, _, filename, problem in checked:
+                if problem is not None:
+                    self.reject(name, problem)
+                else:
+                    tmp_path, sha256 = next(spooling).result()
+                    self.add_spooled(filename, tmp_path, sha256)
+
+    def add_tar(self, stream: ByteStream) -> None:
+        """
+        Add the files of a tar archive (optionally compressed) read front to
+        back, one entry at a time, without buffering the archive.
+        """
+        with tarfile.open(fileobj=cast(Any, stream), mode="r|*") as archive:
+            for member in archive:
+                if member.isdir():
+                    continue
+                member_stream = archive.extractfile(member) if member.isfile() else None
+                if member_stream is None:
+                    self.reject(member.name, "Not a regular file.")
+                    continue
+                self.add(member.name, member_stream)
+            # A stream cut off between two entries looks like the end of the
+            # archive to tarfile, except that no end-of-archive block was read
+            assert archive.fileobj is not None
+            if archive.fileobj.tell() < archive.offset + tarfile.BLOCKSIZE:
+                raise tarfile.ReadError("unexpected end of archive")
+
+    def add_zip(self, stream: ByteStream) -> None:
+        """
+        Add the files of a zip archive. The archive is first copied to a temp
+        file, since the zip directory sits at its end.
+        """
+        with tempfile.TemporaryFile() as spooled:
+            shutil.copyfileobj(stream, spooled)
+            spooled.seek(0)
+            with zipfile.ZipFile(spooled) as archive:
+                for info in archive.infolist():
+                    if info.is_dir():
+                        continue
+                    with archive.open(info) as member_stream:
+                        self.add(info.filename, member_stream)
+
+    def add_archive(
+        self, add: Callable[[ByteStream], None], stream: ByteStream
+    ) -> None:
+        """
+        Run add_tar or add_zip on stream. If the archive turns out to be
+        truncated or corrupt after some entries were read, those entries are
+        committed as usual and an "error" result stands for the rest; an archive
+        that cannot be read at all raises ARCHIVE_ERRORS.
+        """
+        try:
+            add(stream)
+        except ARCHIVE_ERRORS as e:
+            if not self.results:
+                raise
+            self.results.append(
+                IngestResult(
+                    "",
+                    "error",
+                    detail=f"Archive is truncated or corrupt ({e}); "
+                    "the entries after this point were not read.",
+                )
+            )
+
+    def flush(self) -> None:
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        existing = get_existing_hashes(self.db, {r.hash for r, _ in batch if r.hash})
+        added: list[tuple[str, str]] = []
+        index_entries: list[tuple[str, int, int, int, str]] = []
+        # Files this batch created, taken back out if its rows are not committed
+        created: list[Path] = []
+        try:
+            for result, tmp_path in batch:
+                sha256 = result.hash or ""
+                path = photo_storage_path(sha256, result.filename, self.layout)
+                target = self.photos_dir / path
+                if sha256 in existing or sha256 in self.hashes:
+                    tmp_path.unlink()
+                    result.status = "duplicate"
+                    continue
+                try:
+                    if place_upload(tmp_path, target, self.layout):
+                        created.append(target)
+                except FileExistsError:
+                    tmp_path.unlink()
+                    result.status = "rejected"
+                    result.detail = "A file with this name already exists."
+                    continue
+                st = target.stat()
+                added.append((sha256, result.filename))
+                index_entries.append(
+                    (path, st.st_size, st.st_mtime_ns, st.st_ino, sha256)
+                )
+                self.hashes.add(sha256)
+                result.status = "added"
+            bulk_add_photos(self.db, added)
+            upsert_file_index_entries(self.db, index_entries)
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            for _, tmp_path in batch:
+                tmp_path.unlink(missing_ok=True)
+            for target in created:
+                target.unlink(missing_ok=True)
+            raise
+        logger.info(f"Bulk ingest added {len(added)} of {len(batch)} files")
+        if self.on_new_photos and added:
+            self.on_new_photos([(sha256, name, False) for sha256, name in added])
+
+    def discard(self) -> None:
+        """
+        Delete spooled files that were never committed (e.g. after an error).
+        """
+        for _, tmp_path in self.pending:
+            tmp_path.unlink(missing_ok=True)
+        self.pending = []
@@ -1,6 +1,23 @@
-from app.models import Photo
+from app.models import FileIndexEntry, Photo, RemovedCaption
+from sqlalchemy import (
+    ColumnClause,
+    Float,
+    Integer,
+    column,
+    func,
+    select,
+    text,
+    tuple_,
+)
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from typing import Optional, List
+from typing import Any, Iterable, Optional, List
+import re
+import secrets
+import time
+
+# Rows per IN (...) query, well under SQLite's bound-parameter limit
+IN_CHUNK_SIZE = 500
 
 
 def add_photo(
@@ -21,11 +38,298 @@ def get_all_photos(db: Session) -> List[Photo]:
     return db.query(Photo).all()
 
 
+def get_photos_page(
+    db: Session,
+    limit: int,
+    sort: str = "filename",
+    descending: bool = False,
+    after: Optional[tuple[str, ...]] = None,
+    captioned: Optional[bool] = None,
+    filename_prefix: Optional[str] = None,
+) -> tuple[List[Photo], Optional[tuple[str, ...]]]:
+    """
+    Return one keyset-paginated page of photos and the key to resume after.
+
+    `sort` is "filename" (ties broken by hash) or "hash". `after` is the key of
+    the last row of the previous page; the next key is None on the last page.
+    Every filter/sort combination is served by an index on photos, so the cost
+    of a page does not grow with the size of the library.
+    """
+    columns = [Photo.filename, Photo.hash] if sort == "filename" else [Photo.hash]
+    query = db.query(Photo)
+    if captioned is True:
+        query = query.filter(Photo.caption.isnot(None))
+    elif captioned is False:
+        query = query.filter(Photo.caption.is_(None))
+    if filename_prefix:
+        # A range rather than LIKE, so the filename index is used
+        query = query.filter(
+            Photo.filename >= filename_prefix,
+            Photo.filename < filename_prefix + "\U0010ffff",
+        )
+    if after is not None:
+        key = tuple_(*columns)
+        query = query.filter(
+            key < tuple_(*after) if descending else key > tuple_(*after)
+        )
+    query = query.order_by(*(c.desc() if descending else c.asc() for c in columns))
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if sort == "filename":
+        return rows, (last.filename_value, last.hash_value)
+    return rows, (last.hash_value,)
+
+
+def caption_search_query(text: str) -> Optional[str]:
+    """
+    FTS5 query for free text typed by a user: every word must match, the last
+    one as a prefix (so results follow typing), and FTS5 operators and quotes
+    are taken literally. None if the text has no words.
+    """
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " ".join(f'"{word}"' for word in words) + "*"
+
+
+def search_photos(
+    db: Session,
+    query: str,
+    limit: int,
+    after: Optional[tuple[float, int]] = None,
+) -> tuple[List[Photo], Optional[tuple[float, int]]]:
+    """
+    Return one page of photos whose captions match `query` (see
+    caption_search_query), best bm25 match first, and the key to resume after.
+
+    Pages are keyset-paginated on (rank, rowid) of the caption index, like
+    get_photos_page; the next key is None on the last page.
+    """
+    match = caption_search_query(query)
+    if match is None:
+        return [], None
+    params: dict[str, Any] = {"match": match, "limit": limit + 1}
+    resume = ""
+    if after is not None:
+        resume = "AND (rank > :rank OR (rank = :rank AND rowid > :rowid))"
+        params["rank"], params["rowid"] = after
+    rank: ColumnClause[float] = column("search_rank", Float)
+    rowid = column("search_rowid", Integer)
+    # The page is picked from the index alone; only its rows are joined
+    statement = text(
+        "SELECT photos.hash, photos.filename, photos.caption, "
+        "hit.rank AS search_rank, hit.rowid AS search_rowid "
+        "FROM (SELECT rowid, rank FROM photos_fts "
+        f"WHERE photos_fts MATCH :match {resume} "
+        "ORDER BY rank, rowid LIMIT :limit) AS hit "
+        "JOIN photos ON photos.rowid = hit.rowid "
+        "ORDER BY hit.rank, hit.rowid"
+    ).columns(Photo.hash, Photo.filename, Photo.caption, rank, rowid)
+    rows = db.execute(
+        select(Photo, rank, rowid).from_statement(statement), params
+    ).all()
+    photos = [row[0] for row in rows[:limit]]
+    if len(rows) <= limit:
+        return photos, None
+    last = rows[limit - 1]
+    return photos, (last[1], last[2])
+
+
+# Rowid draws before get_random_photo falls back to a random offset
+RANDOM_PHOTO_TRIES = 32
+
+
+def get_random_photo(db: Session, uncaptioned: bool = False) -> Optional[Photo]:
+    """
+    Pick a photo uniformly at random without ORDER BY RANDOM().
+
+    Draw a rowid between the smallest and largest and look it up by primary
+    key, drawing again on a gap left by a deleted photo (or, with uncaptioned,
+    on a captioned one), so every matching photo is equally likely. If the
+    draws keep missing, count the matching rows and skip a random number of
+    them, which is also uniform but walks the rows it skips.
+    """
+    rowid: ColumnClause[int] = column("rowid", Integer)
+    query = db.query(Photo)
+    if uncaptioned:
+        query = query.filter(Photo.caption.is_(None))
+    # Both are one seek at an end of the rowid b-tree
+    low = db.query(func.min(rowid)).select_from(Photo).scalar()
+    high = db.query(func.max(rowid)).select_from(Photo).scalar()
+    if low is None or high is None:
+        return None
+    for _ in range(RANDOM_PHOTO_TRIES):
+        target = low + secrets.randbelow(high - low + 1)
+        photo = query.filter(rowid == target).first()
+        if photo is not None:
+            return photo
+    count = query.count()
+    if count == 0:
+        return None
+    return query.order_by(rowid).offset(secrets.randbelow(count)).first()
+
+
+def get_existing_hashes(db: Session, hashes: Iterable[str]) -> set[str]:
+    """
+    Return the subset of hashes that already have a photo row.
+    """
+    hashes = list(hashes)
+    existing: set[str] = set()
+    for start in range(0, len(hashes), IN_CHUNK_SIZE):
+        chunk = hashes[start : start + IN_CHUNK_SIZE]
+        existing.update(
+            p.hash_value for p in db.query(Photo).filter(Photo.hash.in_(chunk))
+        )
+    return existing
+
+
+def get_photos_by_hashes(db: Session, hashes: Iterable[str]) -> dict[str, Photo]:
+    hashes = list(hashes)
+    photos: dict[str, Photo] = {}
+    for start in range(0, len(hashes), IN_CHUNK_SIZE):
+        chunk = hashes[start : start + IN_CHUNK_SIZE]
+        for photo in db.query(Photo).filter(Photo.hash.in_(chunk)):
+            photos[photo.hash_value] = photo
+    return photos
+
+
+def delete_photos(db: Session, hashes: Iterable[str]) -> None:
+    """
+    Delete photo rows by hash. Captions are kept in removed_captions, so a photo
+    that comes back (e.g. a file moved out of the folder for a while) gets its
+    caption again. The caller is responsible for committing.
+    """
+    hashes = list(hashes)
+    removed_at = time.time()
+    for start in range(0, len(hashes), IN_CHUNK_SIZE):
+        chunk = hashes[start : start + IN_CHUNK_SIZE]
+        captioned = [
+            {
+                "hash": photo.hash_value,
+                "filename": photo.filename_value,
+                "caption": photo.caption_value,
+                "removed_at": removed_at,
+            }
+            for photo in db.query(Photo).filter(
+                Photo.hash.in_(chunk), Photo.caption.is_not(None)
+            )
+        ]
+        if captioned:
+            stmt = sqlite_insert(RemovedCaption)
+            db.execute(
+                stmt.on_conflict_do_update(
+                    index_elements=[RemovedCaption.hash],
+                    set_={
+                        "filename": stmt.excluded.filename,
+                        "caption": stmt.excluded.caption,
+                        "removed_at": stmt.excluded.removed_at,
+                    },
+                ),
+                captioned,
+            )
+        db.query(Photo).filter(Photo.hash.in_(chunk)).delete(synchronize_session=False)
+
+
+def bulk_add_photos(db: Session, photos: Iterable[tuple[str, str]]) -> None:
+    """
+    Insert (hash, filename) rows, skipping hashes that already exist.
+
+    Uses INSERT ... ON CONFLICT DO NOTHING. The caller is responsible for committing.
+    """
+    rows = [{"hash": hash, "filename": filename} for hash, filename in photos]
+    if rows:
+        db.execute(sqlite_insert(Photo).on_conflict_do_nothing(), rows)
+
+
 def update_photo_caption(db: Session, hash: str, caption: str) -> Optional[Photo]:
     photo = db.query(Photo).filter_by(hash=hash).first()
     if not photo:
         return None
-    setattr(photo, "caption", caption)
+    # A blank caption is stored as NULL so "uncaptioned" is a single indexable state
+    setattr(photo, "caption", caption if caption.strip() else None)
     db.commit()
     db.refresh(photo)
     return photo
+
+
+def get_file_index(db: Session) -> dict[str, FileIndexEntry]:
+    return {entry.__dict__["path"]: entry for entry in db.query(FileIndexEntry).all()}
+
+
+def get_file_index_entries(
+    db: Session, paths: Iterable[str]
+) -> dict[str, FileIndexEntry]:
+    paths = list(paths)
+    entries: dict[str, FileIndexEntry] = {}
+    for start in range(0, len(paths), IN_CHUNK_SIZE):
+        chunk = paths[start : start + IN_CHUNK_SIZE]
+        for entry in db.query(FileIndexEntry).filter(FileIndexEntry.path.in_(chunk)):
+            entries[entry.__dict__["path"]] = entry
+    return entries
+
+
+def get_indexed_hashes(db: Session, hashes: Iterable[str]) -> set[str]:
+    """
+    Return the subset of hashes that at least one indexed file still has.
+    """
+    hashes = list(hashes)
+    indexed: set[str] = set()
+    for start in range(0, len(hashes), IN_CHUNK_SIZE):
+        chunk = hashes[start : start + IN_CHUNK_SIZE]
+        indexed.update(
+            entry.sha256_value
+            for entry in db.query(FileIndexEntry).filter(
+                FileIndexEntry.sha256.in_(chunk)
+            )
+        )
+    return indexed
+
+
+def upsert_file_index_entries(
+    db: Session, entries: Iterable[tuple[str, int, int, int, str]]
+) -> None:
+    """
+    Record (path, size, mtime_ns, inode, sha256) for scanned files.
+
+    The caller is responsible for committing.
+    """
+    rows = [
+        {
+            "path": path,
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "inode": inode,
+            "sha256": sha,
+        }
+        for path, size, mtime_ns, inode, sha in entries
+    ]
+    if not rows:
+        return
+    stmt = sqlite_insert(FileIndexEntry)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[FileIndexEntry.path],
+            set_={
+                "size": stmt.excluded.size,
+                "mtime_ns": stmt.excluded.mtime_ns,
+                "inode": stmt.excluded.inode,
+                "sha256": stmt.excluded.sha256,
+            },
+        ),
+        rows,
+    )
+
+
+def delete_file_index_entries(db: Session, paths: Iterable[str]) -> None:
+    """
+    Forget files that are no longer present. The caller is responsible for committing.
+    """
+    paths = list(paths)
+    for start in range(0, len(paths), IN_CHUNK_SIZE):
+        chunk = paths[start : start + IN_CHUNK_SIZE]
+        db.query(FileIndexEntry).filter(FileIndexEntry.path.in_(chunk)).delete(
+            synchronize_session=False
+        )
@@ -1,26 +1,107 @@
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, Session
-from typing import Generator, Optional
-from app.models import Base
+from fastapi import Request
+from pathlib import Path
+from typing import Any, Generator, Optional, Union
+from app.models import CAPTION_SEARCH_DDL, Base
+import os
 
+DEFAULT_DB_PATH = Path(__file__).parent.parent / "photos.db"
 
-def get_db(
-    session_maker: Optional[sessionmaker[Session]] = None,
-) -> Generator[Session, None, None]:
+# Per-connection SQLite settings. WAL lets readers proceed while a scan writes,
+# and synchronous=NORMAL is durable under WAL without an fsync per commit.
+SQLITE_PRAGMAS: dict[str, Union[str, int]] = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # negative means KiB, i.e. 64 MiB
+    "busy_timeout": 5000,
+    "foreign_keys": "ON",
+}
+
+
+# Stored in PRAGMA user_version once init_db has run its one-time data fixes
+DATA_VERSION = 1
+
+
+def _apply_sqlite_pragmas(dbapi_connection: Any, connection_record: Any) -> None:
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+    finally:
+        cursor.close()
+
+
+def create_db_engine(db_path: Optional[Union[str, Path]] = None) -> Engine:
     """
-    Returns a DB session from the given sessionmaker, or the default if not provided.
+    Create the application's SQLite engine with a connection pool and pragmas.
+
+    The path defaults to DB_PATH from the environment, then backend/photos.db.
+    Pool size and overflow can be tuned with DB_POOL_SIZE and DB_MAX_OVERFLOW.
     """
-    from sqlalchemy.orm import sessionmaker as _sessionmaker
-    from sqlalchemy import create_engine
-    from pathlib import Path
-
-    if session_maker is None:
-        db_path = Path(__file__).parent.parent / "photos.db"
-        engine = create_engine(
-            f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    if db_path is None:
+        db_path = os.environ.get("DB_PATH") or DEFAULT_DB_PATH
+    engine = create_engine(
+        f"sqlite:///{db_path}",
+        connect_args={"check_same_thread": False},
+        pool_size=int(os.environ.get("DB_POOL_SIZE", "5")),
+        max_overflow=int(os.environ.get("DB_MAX_OVERFLOW", "10")),
+    )
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    return engine
+
+
+def init_db(engine: Engine) -> None:
+    """
+    Create any missing tables and indexes for the given engine.
+
+    create_all skips the indexes of tables that already exist, so indexes added to
+    the models later, and the caption search index, are created here for
+    existing databases; the search index is rebuilt every time. Data fixes that
+    only need to run once are recorded in PRAGMA user_version.
+    """
+    Base.metadata.create_all(bind=engine)
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+    with engine.begin() as connection:
+        version = connection.exec_driver_sql("PRAGMA user_version").scalar() or 0
+        if version < 1:
+            # Blank captions saved before they were stored as NULL, so that
+            # "uncaptioned" is the single state the partial indexes cover
+            connection.exec_driver_sql(
+                "UPDATE photos SET caption = NULL WHERE trim(caption) = ''"
+            )
+            connection.exec_driver_sql(f"PRAGMA user_version = {DATA_VERSION}")
+        indexed = connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'photos_fts'"
+        ).first()
+        if indexed is None:
+            # A database from before caption search: index the existing captions
+            for statement in CAPTION_SEARCH_DDL:
+                connection.exec_driver_sql(statement)
+        # The index points at photos by rowid, and photos has no INTEGER PRIMARY
+        # KEY to pin rowids down: VACUUM may renumber them, and a dump and
+        # restore always does. Rebuilding from the captions on every start puts
+        # the index back in line with whatever happened while the app was down.
+        connection.exec_driver_sql(
+            "INSERT INTO photos_fts(photos_fts) VALUES ('rebuild')"
         )
-        session_maker = _sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        Base.metadata.create_all(bind=engine)
-    db = session_maker()
+
+
+def create_sessionmaker(engine: Engine) -> sessionmaker[Session]:
+    return sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+
+def get_session(request: Request) -> Generator[Session, None, None]:
+    """
+    FastAPI dependency yielding a session from the app's shared sessionmaker.
+
+    The session is always closed when the request finishes.
+    """
+    db = request.app.state.db_sessionmaker()
     try:
         yield db
     finally:
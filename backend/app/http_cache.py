@@ -0,0 +1,41 @@
+from fastapi import Request
+from typing import Optional
+from fastapi.responses import Response
+
+# Content-addressed responses never change for a given URL
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def make_etag(*parts: object) -> str:
+    """
+    Strong ETag built from the parts that identify a representation,
+    e.g. make_etag(sha256) for an original or make_etag(sha256, 256) for a thumbnail.
+    """
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def cache_headers(etag: str, vary: Optional[str] = None) -> dict[str, str]:
+    headers = {"ETag": etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL}
+    if vary:
+        # Negotiated responses: shared caches must key on these request headers
+        headers["Vary"] = vary
+    return headers
+
+
+def if_none_match(request: Request, etag: str) -> bool:
+    """
+    True if the request's If-None-Match header matches etag (weak comparison,
+    as RFC 9110 requires for If-None-Match).
+    """
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def not_modified(etag: str, vary: Optional[str] = None) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, vary))
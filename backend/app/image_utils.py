@@ -1,8 +1,39 @@
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import asyncio
 import hashlib
-from typing import Optional, Any
+import os
+import shutil
+import stat
+import tempfile
+import time
+from typing import (
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    Any,
+    Protocol,
+    TypeVar,
+    Union,
+)
 
-from app.crud import get_photo_by_hash, add_photo
+from app.crud import (
+    bulk_add_photos,
+    delete_photos,
+    get_existing_hashes,
+    get_file_index,
+    get_file_index_entries,
+    get_indexed_hashes,
+    get_photos_by_hashes,
+    upsert_file_index_entries,
+    delete_file_index_entries,
+)
+from app.metrics import THUMBNAIL_RENDER_SECONDS, record_scan
+from app.models import FileIndexEntry, Photo
+from app.photo_layout import is_shard_dir, sharded_photo_path
 
 import threading
 import logging
@@ -11,26 +42,58 @@ logger = logging.getLogger(__name__)
 
 # Allowed image extensions
 ALLOWED_EXTS = {".jpg", ".jpeg", ".png", ".webp", ".tif", ".tiff"}
+# Extensions picked up from the photos folder by scans and the watcher
+SCAN_EXTS = ALLOWED_EXTS | {".heic"}
 
 from collections import OrderedDict
 import io
 
 
+class ThumbnailCache(Protocol):
+    """
+    Interface shared by the in-memory thumbnail caches.
+    """
+
+    max_bytes: int
+
+    def get(self, key: str) -> Optional[bytes]: ...
+
+    def put(self, key: str, value: bytes) -> None: ...
+
+    def clear(self) -> None: ...
+
+    def __contains__(self, key: str) -> bool: ...
+
+
 class LRUThumbnailCache:
     def __init__(self, max_bytes: int = 100 * 1024 * 1024) -> None:
         self.cache: OrderedDict[str, bytes] = OrderedDict()
         self.lock = threading.Lock()
         self.max_bytes = max_bytes
         self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def entries(self) -> int:
+        return len(self.cache)
 
     def get(self, key: str) -> Optional[bytes]:
         with self.lock:
             if key not in self.cache:
+                self.misses += 1
                 return None
+            self.hits += 1
             value = self.cache.pop(key)
             self.cache[key] = value  # move to end
             return value
 
+    def __contains__(self, key: str) -> bool:
+        # Membership only; does not count as a use
+        with self.lock:
+            return key in self.cache
+
     def put(self, key: str, value: bytes) -> None:
         size = len(value)
         with self.lock:
@@ -40,6 +103,7 @@ class LRUThumbnailCache:
             while self.current_bytes + size > self.max_bytes and self.cache:
                 _, evicted = self.cache.popitem(last=False)
                 self.current_bytes -= len(evicted)
+                self.evictions += 1
             self.cache[key] = value
             self.current_bytes += size
 
@@ -49,21 +113,385 @@ class LRUThumbnailCache:
             self.current_bytes = 0
 
 
-def get_thumbnail_path(photos_dir: Path, sha256: str) -> Path:
-    return photos_dir / f"{sha256}.thumb.jpg"
+# Sizes (long edge, px) the thumbnail route serves unless THUMBNAIL_SIZES is set
+DEFAULT_THUMBNAIL_SIZES = (128, 256, 512)
+
+
+def get_thumbnail_sizes() -> tuple[int, ...]:
+    value = os.environ.get("THUMBNAIL_SIZES")
+    if not value:
+        return DEFAULT_THUMBNAIL_SIZES
+    return tuple(sorted({int(size) for size in value.split(",") if size.strip()}))
+
+
+# Thumbnail encodings: name -> (Pillow format, media type, save options)
+THUMBNAIL_FORMATS: dict[str, tuple[str, str, dict[str, Any]]] = {
+    "avif": ("AVIF", "image/avif", {"quality": 60, "speed": 8}),
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 85}),
+}
+DEFAULT_THUMBNAIL_FORMATS = ("webp", "avif", "jpeg")
+
+
+def get_thumbnail_formats() -> tuple[str, ...]:
+    """
+    Thumbnail formats in server preference order, from THUMBNAIL_FORMATS.
+
+    Formats this Pillow build cannot encode are dropped; JPEG is always last.
+    """
+    from PIL import features
+
+    value = os.environ.get("THUMBNAIL_FORMATS")
+    names = (
+        [name.strip().lower() for name in value.split(",")]
+        if value
+        else DEFAULT_THUMBNAIL_FORMATS
+    )
+    formats = [
+        name
+        for name in names
+        if name in THUMBNAIL_FORMATS
+        and name != "jpeg"
+        and features.check(name)  # type: ignore[no-untyped-call]
+    ]
+    return tuple(dict.fromkeys(formats)) + ("jpeg",)
+
+
+def negotiate_thumbnail_format(
+    accept: Optional[str], candidates: Optional[Iterable[str]] = None
+) -> str:
+    """
+    Pick the thumbnail format for an Accept header, among `candidates` if given.
+
+    Only formats the client names explicitly (with q > 0) are chosen; a bare
+    */* gets JPEG, which every client can display.
+    """
+    accepted: set[str] = set()
+    for item in (accept or "").split(","):
+        media_type, *params = [part.strip() for part in item.split(";")]
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(media_type.lower())
+    for fmt in get_thumbnail_formats():
+        if candidates is not None and fmt not in candidates:
+            continue
+        if THUMBNAIL_FORMATS[fmt][1] in accepted:
+            return fmt
+    return "jpeg"
+
+
+def thumbnail_cache_key(sha256: str, size: int, fmt: str = "jpeg") -> str:
+    """
+    Key of one rendered thumbnail in the memory and disk caches.
+    """
+    return f"{sha256}-{size}-{fmt}"
+
+
+# Long edge of the display-size preview served to the detail view
+DEFAULT_PREVIEW_SIZE = 2048
+# AVIF takes seconds to encode at this size; previews are WebP or JPEG
+PREVIEW_FORMATS = ("webp", "jpeg")
+
 
+def get_preview_size() -> int:
+    return int(os.environ.get("PREVIEW_SIZE", DEFAULT_PREVIEW_SIZE))
 
-def generate_thumbnail(image_path: Path, max_size: int = 256) -> bytes:
+
+def create_thumbnail_cache(
+    max_bytes: int, photos_dir: Optional[Path] = None
+) -> ThumbnailCache:
+    """
+    Memory cache for THUMBNAIL_CACHE_POLICY: "lru" (default), "tinylfu", a
+    sharded, scan-resistant cache with THUMBNAIL_CACHE_SHARDS locks, or "shared",
+    a pack file mapped by every worker process (THUMBNAIL_SHARED_CACHE_PATH,
+    by default in /dev/shm and named after `photos_dir`).
+    """
+    from app.tinylfu import ShardedTinyLFUCache
+
+    policy = os.environ.get("THUMBNAIL_CACHE_POLICY", "lru").lower()
+    if policy == "tinylfu":
+        shards = int(os.environ.get("THUMBNAIL_CACHE_SHARDS", "16"))
+        return ShardedTinyLFUCache(max_bytes, shards=shards)
+    if policy == "shared":
+        from app.shared_thumbnail_cache import (
+            SharedThumbnailCache,
+            default_shared_cache_path,
+        )
+
+        path = os.environ.get("THUMBNAIL_SHARED_CACHE_PATH")
+        if not path:
+            path = default_shared_cache_path(photos_dir or Path.cwd())
+        return SharedThumbnailCache(Path(path), max_bytes)
+    if policy != "lru":
+        raise ValueError(f"Unknown THUMBNAIL_CACHE_POLICY: {policy}")
+    return LRUThumbnailCache(max_bytes)
+
+
+def get_thumbnail_path(cache_dir: Path, key: str) -> Path:
+    return cache_dir / f"{key}.thumb"
+
+
+class DiskThumbnailCache:
+    """
+    Persistent thumbnail store, used as a second tier behind LRUThumbnailCache.
+
+    Files are written to a temp file and renamed into place, so readers never see
+    a partial thumbnail. Entries are evicted least-recently-used first once the
+    total size passes max_bytes, and dropped when older than max_age seconds.
+    Recency is kept in file mtimes, so the LRU order survives restarts; the index
+    is rebuilt from a directory listing when the cache is created.
+    """
+
+    SUFFIX = ".thumb"
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 1024 * 1024 * 1024,
+        max_age: Optional[float] = None,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.lock = threading.Lock()
+        # key -> (size, last use); oldest first
+        self.index: OrderedDict[str, tuple[int, float]] = OrderedDict()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._load_index()
+
+    @property
+    def entries(self) -> int:
+        return len(self.index)
+
+    def _load_index(self) -> None:
+        entries: list[tuple[float, str, int]] = []
+        try:
+            with os.scandir(self.cache_dir) as it:
+                for entry in it:
+                    if entry.name.endswith(".tmp"):
+                        # Left behind by a crash mid-write (not one in progress)
+                        if entry.stat().st_mtime < time.time() - 3600:
+                            os.unlink(entry.path)
+                    elif entry.name.endswith(self.SUFFIX):
+                        st = entry.stat()
+                        key = entry.name[: -len(self.SUFFIX)]
+                        entries.append((st.st_mtime, key, st.st_size))
+        except FileNotFoundError:
+            return
+        with self.lock:
+            for mtime, key, size in sorted(entries):
+                self.index[key] = (size, mtime)
+                self.current_bytes += size
+            self._evict(0)
+        logger.info(
+            f"Thumbnail disk cache {self.cache_dir}: {len(self.index)} entries, "
+            f"{self.current_bytes} bytes"
+        )
+
+    def _remove(self, key: str) -> None:
+        size, _ = self.index.pop(key)
+        self.current_bytes -= size
+        try:
+            os.unlink(get_thumbnail_path(self.cache_dir, key))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, incoming: int) -> None:
+        # Caller holds the lock
+        if self.max_age is not None:
+            cutoff = time.time() - self.max_age
+            while self.index and next(iter(self.index.values()))[1] < cutoff:
+                self._remove(next(iter(self.index)))
+                self.evictions += 1
+        while self.index and self.current_bytes + incoming > self.max_bytes:
+            self._remove(next(iter(self.index)))
+            self.evictions += 1
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.get_path(key)
+        if path is None:
+            return None
+        try:
+            return path.read_bytes()
+        except FileNotFoundError:
+            # Evicted between the lookup and the read
+            return None
+
+    def get_path(self, key: str) -> Optional[Path]:
+        """
+        Like get, but return the entry's file instead of its bytes, so that
+        large entries can be streamed (e.g. with FileResponse).
+        """
+        with self.lock:
+            if key not in self.index:
+                self.misses += 1
+                return None
+            size, last_used = self.index[key]
+            if self.max_age is not None and last_used < time.time() - self.max_age:
+                self._remove(key)
+                self.evictions += 1
+                self.misses += 1
+                return None
+        path = get_thumbnail_path(self.cache_dir, key)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+                if key in self.index:
+                    self._remove(key)
+            return None
+        with self.lock:
+            self.hits += 1
+            if key in self.index:
+                self.index.move_to_end(key)
+                self.index[key] = (size, time.time())
+        return path
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return key in self.index
+
+    def put(self, key: str, value: bytes) -> None:
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(value)
+            with self.lock:
+                if key in self.index:
+                    old_size, _ = self.index.pop(key)
+                    self.current_bytes -= old_size
+                self._evict(size)
+                os.replace(tmp_path, get_thumbnail_path(self.cache_dir, key))
+                self.index[key] = (size, time.time())
+                self.current_bytes += size
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def clear(self) -> None:
+        with self.lock:
+            for key in list(self.index):
+                self._remove(key)
+
+
+# EXIF orientation -> transpose that puts the image upright
+EXIF_ORIENTATION_TAG = 0x0112
+EXIF_TRANSPOSES = {
+    2: "FLIP_LEFT_RIGHT",
+    3: "ROTATE_180",
+    4: "FLIP_TOP_BOTTOM",
+    5: "TRANSPOSE",
+    6: "ROTATE_270",
+    7: "TRANSVERSE",
+    8: "ROTATE_90",
+}
+# Modes that can be resized as decoded; anything else is converted to RGB first
+FAST_RESIZE_MODES = {"L", "LA", "RGB", "RGBA", "RGBX", "CMYK", "YCbCr", "I", "F"}
+
+
+def _embedded_thumbnail(img: Any, max_size: int) -> Optional[Any]:
+    """
+    Return the EXIF thumbnail (IFD1) of img if it is at least max_size on its long
+    edge and has the same aspect ratio as the image, else None.
+    """
+    from PIL import ExifTags, Image
+
+    exif_bytes = img.info.get("exif")
+    if not exif_bytes:
+        return None
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        offset, length = ifd1.get(0x0201), ifd1.get(0x0202)
+        if not offset or not length:
+            return None
+        # Offsets are relative to the TIFF header, after the "Exif\0\0" marker
+        base = 6 if exif_bytes.startswith(b"Exif") else 0
+        data = exif_bytes[base + offset : base + offset + length]
+        thumb = Image.open(io.BytesIO(data))
+        thumb.load()
+    except Exception:
+        return None
+    if max(thumb.size) < max_size:
+        return None
+    # Some cameras letterbox the thumbnail to a different aspect ratio
+    if abs(thumb.width / thumb.height - img.width / img.height) > 0.02 * (
+        img.width / img.height
+    ):
+        return None
+    return thumb
+
+
+def _encode_thumbnail(img: Any, fmt: str = "jpeg", progressive: bool = False) -> bytes:
+    pil_format, _, options = THUMBNAIL_FORMATS[fmt]
+    if progressive and pil_format == "JPEG":
+        # Large images paint a full low-detail frame first, then sharpen
+        options = {**options, "progressive": True, "optimize": True}
+    buf = io.BytesIO()
+    img.convert("RGB").save(buf, format=pil_format, **options)
+    return buf.getvalue()
+
+
+def resize_thumbnail(data: bytes, max_size: int, fmt: str = "jpeg") -> bytes:
+    """
+    Shrink an already rendered (upright) thumbnail to fit max_size x max_size.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as img:
+        img.draft("RGB", (max_size, max_size))
+        img.thumbnail((max_size, max_size))
+        return _encode_thumbnail(img, fmt)
+
+
+def generate_thumbnail(
+    image_path: Path, max_size: int = 256, fmt: str = "jpeg", progressive: bool = False
+) -> bytes:
+    """
+    Render a thumbnail that fits in max_size x max_size, upright per EXIF, encoded
+    as fmt (a THUMBNAIL_FORMATS key); JPEGs are progressive if asked.
+
+    Avoids a full-resolution decode where possible: a large enough embedded EXIF
+    thumbnail is used as is, JPEGs are decoded at reduced scale with draft(), and
+    other large images are shrunk by an integer factor with reduce() before the
+    final high-quality resize.
+    """
     from PIL import Image, UnidentifiedImageError
     import traceback
 
     try:
         with Image.open(image_path) as img:
-            img = img.convert("RGB")
-            img.thumbnail((max_size, max_size))
-            buf = io.BytesIO()
-            img.save(buf, format="JPEG", quality=85)
-            return buf.getvalue()
+            orientation = img.getexif().get(EXIF_ORIENTATION_TAG, 1)
+            source = _embedded_thumbnail(img, max_size)
+            if source is None:
+                if img.format == "JPEG":
+                    img.draft("RGB", (max_size, max_size))
+                source = img
+                if source.mode not in FAST_RESIZE_MODES:
+                    source = source.convert("RGB")
+                # Keep at least 2x the target so the final resize stays sharp
+                factor = max(source.size) // (2 * max_size)
+                if factor >= 2:
+                    source = source.reduce(factor)
+            source.thumbnail((max_size, max_size))
+            if orientation in EXIF_TRANSPOSES:
+                source = source.transpose(Image.Transpose[EXIF_TRANSPOSES[orientation]])
+            return _encode_thumbnail(source, fmt, progressive)
     except UnidentifiedImageError as e:
         logger.error(f"Unsupported image format for thumbnail: {image_path} ({e})")
         print(traceback.format_exc())
@@ -74,84 +502,790 @@ def generate_thumbnail(image_path: Path, max_size: int = 256) -> bytes:
         raise
 
 
+def _get_cached_thumbnail(
+    key: str,
+    cache: ThumbnailCache,
+    disk_cache: Optional[DiskThumbnailCache],
+    promote: bool = True,
+    memory: bool = True,
+) -> Optional[bytes]:
+    thumb = cache.get(key) if memory else None
+    if thumb is None and disk_cache is not None:
+        thumb = disk_cache.get(key)
+        if thumb is not None and promote:
+            cache.put(key, thumb)
+    return thumb
+
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while a call for
+    their key is in flight wait for it and share its result or exception.
+
+    `executed` counts calls that ran, `coalesced` counts callers that waited on
+    another caller's call instead.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.calls: dict[str, Future[Any]] = {}
+        self.executed = 0
+        self.coalesced = 0
+        # Calls started by do_async; the event loop only keeps weak references
+        self.tasks: set[asyncio.Task[Any]] = set()
+
+    def _join(self, key: str) -> tuple[Future[Any], bool]:
+        with self.lock:
+            call = self.calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                return call, False
+            call = self.calls[key] = Future()
+            self.executed += 1
+            return call, True
+
+    def _settle(
+        self, key: str, call: Future[Any], result: Any, error: Optional[BaseException]
+    ) -> None:
+        with self.lock:
+            del self.calls[key]
+        if error is not None:
+            call.set_exception(error)
+        else:
+            call.set_result(result)
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        call, leader = self._join(key)
+        if not leader:
+            return call.result()
+        try:
+            result = fn()
+        except BaseException as e:
+            self._settle(key, call, None, e)
+            raise
+        self._settle(key, call, result, None)
+        return result
+
+    async def do_async(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        do for callers on an event loop: waiting holds no thread, and a caller
+        that is cancelled (e.g. its client went away) does not cancel the call
+        others are waiting on.
+        """
+        call, leader = self._join(key)
+        if leader:
+            task = asyncio.ensure_future(fn())
+            self.tasks.add(task)
+
+            def finished(done: asyncio.Task[Any]) -> None:
+                self.tasks.discard(done)
+                if done.cancelled():
+                    with self.lock:
+                        del self.calls[key]
+                    call.cancel()
+                else:
+                    error = done.exception()
+                    self._settle(key, call, None if error else done.result(), error)
+
+            task.add_done_callback(finished)
+        return await asyncio.shield(asyncio.wrap_future(call))
+
+
+# Shared by every caller of get_or_create_thumbnail in this process
+thumbnail_flights = SingleFlight()
+
+
+def _original_path(photos_dir: Path, sha256: str, filename: str) -> Path:
+    img_path = get_image_file_path(photos_dir, sha256, Path(filename).suffix, filename)
+    if not img_path.exists():
+        raise FileNotFoundError("Image file not found.")
+    return img_path
+
+
+def _find_thumbnail(
+    sha256: str,
+    max_size: int,
+    fmt: str,
+    cache: ThumbnailCache,
+    disk_cache: Optional[DiskThumbnailCache],
+    promote: bool,
+) -> Optional[bytes]:
+    """
+    A flight's lookups before it renders: memory, disk, then a cached thumbnail
+    of a larger configured size, shrunk (and stored). None if the original has
+    to be decoded.
+    """
+    cache_key = thumbnail_cache_key(sha256, max_size, fmt)
+    # An earlier flight may have filled memory since the caller's lookup; the
+    # membership test keeps this one from counting as a second miss
+    thumb = cache.get(cache_key) if cache_key in cache else None
+    if thumb is None:
+        thumb = _get_cached_thumbnail(
+            cache_key, cache, disk_cache, promote, memory=False
+        )
+    if thumb is not None:
+        return thumb
+    for larger in get_thumbnail_sizes():
+        if larger <= max_size:
+            continue
+        source = _get_cached_thumbnail(
+            thumbnail_cache_key(sha256, larger, fmt), cache, disk_cache, promote
+        )
+        if source is not None:
+            started = time.perf_counter()
+            thumb = resize_thumbnail(source, max_size, fmt)
+            THUMBNAIL_RENDER_SECONDS.observe(
+                time.perf_counter() - started, source="derived"
+            )
+            _store_thumbnail(cache_key, thumb, cache, disk_cache, promote)
+            return thumb
+    return None
+
+
+def _store_thumbnail(
+    cache_key: str,
+    thumb: bytes,
+    cache: ThumbnailCache,
+    disk_cache: Optional[DiskThumbnailCache],
+    promote: bool,
+) -> None:
+    if promote:
+        cache.put(cache_key, thumb)
+    if disk_cache is not None:
+        disk_cache.put(cache_key, thumb)
+
+
 def get_or_create_thumbnail(
     photos_dir: Path,
     sha256: str,
     filename: str,
-    cache: LRUThumbnailCache,
+    cache: ThumbnailCache,
     max_size: int = 256,
+    disk_cache: Optional[DiskThumbnailCache] = None,
+    fmt: str = "jpeg",
+    flights: Optional[SingleFlight] = None,
+    render: Optional[Callable[[Path, int, str], bytes]] = None,
+    store_in_memory: bool = True,
 ) -> bytes:
-    ext = Path(filename).suffix
-    img_path = get_image_file_path(photos_dir, sha256, ext, filename)
-    if not img_path.exists():
-        raise FileNotFoundError("Image file not found.")
-    cache_key = sha256
+    """
+    Return the max_size thumbnail of a photo in format fmt, from the caches if
+    possible.
+
+    On a miss, a cached thumbnail of a larger configured size (in the same format)
+    is shrunk instead of decoding the original again. Concurrent misses for the
+    same key are coalesced so only one of them renders the thumbnail. `render`
+    replaces generate_thumbnail for the decode, e.g. to run it in a worker process.
+    With store_in_memory=False (and a disk cache), results only go to disk.
+    """
+    img_path = _original_path(photos_dir, sha256, filename)
+    cache_key = thumbnail_cache_key(sha256, max_size, fmt)
     thumb = cache.get(cache_key)
     if thumb is not None:
         return thumb
-    thumb_bytes = generate_thumbnail(img_path, max_size=max_size)
-    cache.put(cache_key, thumb_bytes)
-    return thumb_bytes
+
+    promote = store_in_memory or disk_cache is None
+
+    def load() -> bytes:
+        thumb = _find_thumbnail(sha256, max_size, fmt, cache, disk_cache, promote)
+        if thumb is not None:
+            return thumb
+        started = time.perf_counter()
+        thumb = (render or generate_thumbnail)(img_path, max_size, fmt)
+        THUMBNAIL_RENDER_SECONDS.observe(
+            time.perf_counter() - started, source="original"
+        )
+        _store_thumbnail(cache_key, thumb, cache, disk_cache, promote)
+        return thumb
+
+    return (flights or thumbnail_flights).do(cache_key, load)
+
+
+async def get_or_create_thumbnail_async(
+    photos_dir: Path,
+    sha256: str,
+    filename: str,
+    cache: ThumbnailCache,
+    submit: Callable[[Path, int, str], Future[bytes]],
+    max_size: int = 256,
+    disk_cache: Optional[DiskThumbnailCache] = None,
+    fmt: str = "jpeg",
+    flights: Optional[SingleFlight] = None,
+) -> bytes:
+    """
+    get_or_create_thumbnail for callers on an event loop. Cache lookups and
+    writes run in a thread, and the render is started with `submit` (e.g.
+    ThumbnailPool.submit) and awaited, so no thread waits for a decode.
+    """
+    cache_key = thumbnail_cache_key(sha256, max_size, fmt)
+
+    def lookup() -> tuple[Path, Optional[bytes]]:
+        return _original_path(photos_dir, sha256, filename), cache.get(cache_key)
+
+    img_path, thumb = await asyncio.to_thread(lookup)
+    if thumb is not None:
+        return thumb
+
+    async def load() -> bytes:
+        thumb = await asyncio.to_thread(
+            _find_thumbnail, sha256, max_size, fmt, cache, disk_cache, True
+        )
+        if thumb is not None:
+            return thumb
+        started = time.perf_counter()
+        thumb = await asyncio.wrap_future(submit(img_path, max_size, fmt))
+        THUMBNAIL_RENDER_SECONDS.observe(
+            time.perf_counter() - started, source="original"
+        )
+        await asyncio.to_thread(
+            _store_thumbnail, cache_key, thumb, cache, disk_cache, True
+        )
+        return thumb
+
+    return await (flights or thumbnail_flights).do_async(cache_key, load)
+
+
+def _find_preview(
+    store: Optional[DiskThumbnailCache], cache_key: str
+) -> Optional[Path]:
+    if store is not None and cache_key in store:
+        return store.get_path(cache_key)
+    return None
+
+
+def _store_preview(
+    store: Optional[DiskThumbnailCache], cache_key: str, preview: bytes
+) -> Union[Path, bytes]:
+    if store is None:
+        return preview
+    store.put(cache_key, preview)
+    path = get_thumbnail_path(store.cache_dir, cache_key)
+    # Not stored if larger than the whole budget
+    return path if path.exists() else preview
+
+
+def get_or_create_preview(
+    photos_dir: Path,
+    sha256: str,
+    filename: str,
+    store: Optional[DiskThumbnailCache],
+    max_size: int = DEFAULT_PREVIEW_SIZE,
+    fmt: str = "jpeg",
+    flights: Optional[SingleFlight] = None,
+    render: Optional[Callable[..., bytes]] = None,
+) -> Union[Path, bytes]:
+    """
+    Display-size rendering of a photo (progressive if JPEG), for viewers that
+    should not download the original.
+
+    Each preview is rendered once and kept in `store`, and its file there is
+    returned so it can be streamed; without a store the bytes are returned.
+    Previews skip the memory cache, where a few of them would push out hundreds
+    of thumbnails.
+    """
+    img_path = _original_path(photos_dir, sha256, filename)
+    cache_key = thumbnail_cache_key(sha256, max_size, fmt)
+    if store is not None:
+        path = store.get_path(cache_key)
+        if path is not None:
+            return path
+
+    def load() -> Union[Path, bytes]:
+        path = _find_preview(store, cache_key)
+        if path is not None:
+            return path
+        started = time.perf_counter()
+        preview = (render or generate_thumbnail)(
+            img_path, max_size, fmt, progressive=True
+        )
+        THUMBNAIL_RENDER_SECONDS.observe(
+            time.perf_counter() - started, source="preview"
+        )
+        return _store_preview(store, cache_key, preview)
+
+    return (flights or thumbnail_flights).do(f"preview-{cache_key}", load)
+
+
+async def get_or_create_preview_async(
+    photos_dir: Path,
+    sha256: str,
+    filename: str,
+    store: Optional[DiskThumbnailCache],
+    submit: Callable[..., Future[bytes]],
+    max_size: int = DEFAULT_PREVIEW_SIZE,
+    fmt: str = "jpeg",
+    flights: Optional[SingleFlight] = None,
+) -> Union[Path, bytes]:
+    """
+    get_or_create_preview for callers on an event loop, like
+    get_or_create_thumbnail_async: store lookups and writes run in a thread,
+    and the render is started with `submit` and awaited.
+    """
+    cache_key = thumbnail_cache_key(sha256, max_size, fmt)
+
+    def lookup() -> tuple[Path, Optional[Path]]:
+        img_path = _original_path(photos_dir, sha256, filename)
+        return img_path, store.get_path(cache_key) if store is not None else None
+
+    img_path, path = await asyncio.to_thread(lookup)
+    if path is not None:
+        return path
+
+    async def load() -> Union[Path, bytes]:
+        path = await asyncio.to_thread(_find_preview, store, cache_key)
+        if path is not None:
+            return path
+        started = time.perf_counter()
+        preview = await asyncio.wrap_future(
+            submit(img_path, max_size, fmt, progressive=True)
+        )
+        THUMBNAIL_RENDER_SECONDS.observe(
+            time.perf_counter() - started, source="preview"
+        )
+        return await asyncio.to_thread(_store_preview, store, cache_key, preview)
+
+    return await (flights or thumbnail_flights).do_async(f"preview-{cache_key}", load)
 
 
 def hash_image_bytes(data: bytes) -> str:
     return hashlib.sha256(data).hexdigest()
 
 
+# Files are hashed in fixed-size chunks so memory per worker stays constant
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path: Path, chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def get_scan_hash_workers() -> int:
+    default = min(8, os.cpu_count() or 1)
+    return max(1, int(os.environ.get("SCAN_HASH_WORKERS", default)))
+
+
+def get_scan_batch_size() -> int:
+    return max(1, int(os.environ.get("SCAN_BATCH_SIZE", "500")))
+
+
+def get_scan_max_removed_fraction() -> float:
+    return float(os.environ.get("SCAN_MAX_REMOVED_FRACTION", "0.5"))
+
+
+# (sha256, filename, captioned) for each photo a scan or upload just added
+NewPhotos = list[tuple[str, str, bool]]
+NewPhotosCallback = Callable[[NewPhotos], None]
+
+
+@dataclass
+class ScanStats:
+    files_seen: int = 0
+    files_hashed: int = 0
+    bytes_hashed: int = 0
+    files_added: int = 0
+    elapsed: float = 0.0
+    interrupted: bool = False
+
+    @property
+    def files_per_second(self) -> float:
+        return self.files_hashed / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def mb_per_second(self) -> float:
+        return self.bytes_hashed / (1024 * 1024) / self.elapsed if self.elapsed else 0.0
+
+
+def iter_photo_files(photos_dir: Path) -> Iterator[tuple[str, os.DirEntry[str]]]:
+    """
+    Image files in photos_dir with their paths relative to it: files at the top
+    level (flat layout) and in two levels of shard folders (ab/cd/, see
+    photo_layout). Each listing stays small once a library is sharded.
+    """
+    shard_dirs: list[str] = []
+    with os.scandir(photos_dir) as entries:
+        for entry in entries:
+            if entry.is_dir() and is_shard_dir(entry.name):
+                shard_dirs.append(entry.name)
+            elif entry.is_file() and _is_scanned(entry.name):
+                yield entry.name, entry
+    for top in shard_dirs:
+        with os.scandir(photos_dir / top) as subdirs:
+            inner = [e.name for e in subdirs if e.is_dir() and is_shard_dir(e.name)]
+        for sub in inner:
+            with os.scandir(photos_dir / top / sub) as entries:
+                for entry in entries:
+                    if entry.is_file() and _is_scanned(entry.name):
+                        yield f"{top}/{sub}/{entry.name}", entry
+
+
+def _is_scanned(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in SCAN_EXTS
+
+
 def scan_photos_folder_on_startup(
-    photos_dir: Path, db: Any
-) -> None:  # db should come from injected sessionmaker in app.state for tests
+    photos_dir: Path,
+    db: Any,
+    workers: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    progress: Optional[Callable[[ScanStats], None]] = None,
+    should_stop: Optional[Callable[[], bool]] = None,
+    on_new_photos: Optional[NewPhotosCallback] = None,
+) -> ScanStats:  # db should come from injected sessionmaker in app.state for tests
+    """
+    Add any new images in photos_dir to the DB.
+
+    Files are listed with os.scandir (at the top level and in content-addressed
+    shard folders, see iter_photo_files) and compared against the persisted file
+    index by (size, mtime_ns, inode); only new or changed files are read and hashed, so
+    rescanning an unchanged library does no content reads. Hashing runs on a thread
+    pool of `workers` (default SCAN_HASH_WORKERS); results are applied in listing
+    order and committed in transactions of `batch_size` files (default SCAN_BATCH_SIZE).
+
+    `progress` is called after the listing and after every committed batch.
+    `should_stop` is checked after each hashed file; once it returns True the
+    files hashed so far are committed and the scan stops with `interrupted`
+    set. Committed files stay in the index, so the next scan resumes where this
+    one left off. `on_new_photos` receives the photos each
+    committed batch added. A complete scan drops files that are gone from the
+    index, and deletes a photo once no indexed file has its hash (its caption is
+    kept, see delete_photos). Nothing is removed if the folder is empty or more
+    than SCAN_MAX_REMOVED_FRACTION of the indexed files are gone, which is what
+    an unmounted or half-copied folder looks like.
+    """
+    started = time.perf_counter()
+    stats = ScanStats()
     photos_dir.mkdir(parents=True, exist_ok=True)
-    allowed_exts = {".jpg", ".jpeg", ".png", ".heic", ".webp", ".tif", ".tiff"}
-    for file in photos_dir.iterdir():
-        if not file.is_file():
+    index = get_file_index(db)
+    seen: set[str] = set()
+    to_hash: list[tuple[str, os.DirEntry[str], tuple[int, int, int]]] = []
+    # Hashes that may lose their last file: those of changed and removed paths
+    old_hashes: set[str] = set()
+    for path, entry in iter_photo_files(photos_dir):
+        seen.add(path)
+        st = entry.stat()
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        known = index.get(path)
+        if known is not None and known.signature == signature:
             continue
-        ext = file.suffix.lower()
-        if ext not in allowed_exts:
-            continue
-        with open(file, "rb") as f:
-            data = f.read()
-        sha256 = hashlib.sha256(data).hexdigest()
-        if get_photo_by_hash(db, sha256):
-            continue
-        import logging
+        if known is not None:
+            old_hashes.add(known.sha256_value)
+        to_hash.append((path, entry, signature))
+    stats.files_seen = len(seen)
+    removed = set(index) - seen
+    old_hashes.update(index[path].sha256_value for path in removed)
+    if progress:
+        progress(stats)
 
-        logger = logging.getLogger(__name__)
+    def flush(
+        batch: list[tuple[str, os.DirEntry[str], tuple[int, int, int], str]],
+    ) -> None:
+        existing = get_existing_hashes(db, {sha256 for _, _, _, sha256 in batch})
+        new_photos: dict[str, str] = {}
+        for _, entry, _, sha256 in batch:
+            if sha256 not in existing and sha256 not in new_photos:
+                new_photos[sha256] = entry.name
         try:
-            add_photo(db, sha256, file.name, caption=None)
+            bulk_add_photos(db, new_photos.items())
+            upsert_file_index_entries(
+                db, [(path, *sig, sha256) for path, _, sig, sha256 in batch]
+            )
             db.commit()
-            logger.info(f"Image created: {file} (sha256={sha256})")
         except Exception as e:
-            # If this is an IntegrityError, it's a duplicate; otherwise, reraise
-            from sqlalchemy.exc import IntegrityError
+            db.rollback()
+            logger.error(f"Error adding photos during scan of {photos_dir}: {e}")
+            raise
+        for sha256, name in new_photos.items():
+            logger.info(f"Image created: {photos_dir / name} (sha256={sha256})")
+        stats.files_added += len(new_photos)
+        if on_new_photos and new_photos:
+            on_new_photos(
+                [(sha256, name, False) for sha256, name in new_photos.items()]
+            )
+        if progress:
+            progress(stats)
 
-            if isinstance(e, IntegrityError):
-                logger.info(
-                    f"Duplicate image skipped during scan: {file} (sha256={sha256})"
-                )
-                db.rollback()
-            else:
-                logger.error(
-                    f"Error adding photo during scan: {file} (sha256={sha256}): {e}"
+    workers = workers or get_scan_hash_workers()
+    batch_size = batch_size or get_scan_batch_size()
+    batch: list[tuple[str, os.DirEntry[str], tuple[int, int, int], str]] = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # hashlib releases the GIL while hashing, so threads use all cores
+        digests = pool.map(hash_file, [Path(entry.path) for _, entry, _ in to_hash])
+        for (path, entry, signature), sha256 in zip(to_hash, digests):
+            stats.files_hashed += 1
+            stats.bytes_hashed += signature[0]
+            batch.append((path, entry, signature, sha256))
+            # Checked per file so a shutdown waits for one hash, not a batch
+            stopping = should_stop is not None and should_stop()
+            if len(batch) >= batch_size or stopping:
+                flush(batch)
+                batch = []
+            if stopping:
+                stats.interrupted = True
+                pool.shutdown(wait=False, cancel_futures=True)
+                break
+        if batch:
+            flush(batch)
+    if stats.interrupted:
+        pass
+    elif removed and not seen:
+        # An unmounted or emptied folder looks exactly like every photo deleted
+        logger.warning(
+            f"Photos folder {photos_dir} is empty; keeping the {len(removed)} "
+            "indexed files and their photos"
+        )
+    elif len(removed) > get_scan_max_removed_fraction() * len(index):
+        logger.warning(
+            f"{len(removed)} of {len(index)} indexed files are gone from "
+            f"{photos_dir}; not removing them (SCAN_MAX_REMOVED_FRACTION)"
+        )
+    else:
+        try:
+            delete_file_index_entries(db, removed)
+            db.flush()
+            # As in sync_photos_folder_paths, a photo goes once no file has its hash
+            orphaned = old_hashes - get_indexed_hashes(db, old_hashes)
+            delete_photos(db, orphaned)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error removing photos during scan of {photos_dir}: {e}")
+            raise
+        for sha256 in orphaned:
+            logger.info(f"Image removed: sha256={sha256}")
+    stats.elapsed = time.perf_counter() - started
+    logger.info(
+        f"Scan of {photos_dir} {'stopped' if stats.interrupted else 'finished'} "
+        f"in {stats.elapsed:.2f}s: "
+        f"{stats.files_seen} files seen, {stats.files_hashed} hashed "
+        f"({stats.files_per_second:.1f} files/s, {stats.mb_per_second:.1f} MB/s), "
+        f"{stats.files_added} added"
+    )
+    record_scan("full", stats)
+    return stats
+
+
+def sync_photos_folder_paths(
+    photos_dir: Path,
+    db: Any,
+    names: Iterable[str],
+    workers: Optional[int] = None,
+    on_new_photos: Optional[NewPhotosCallback] = None,
+) -> ScanStats:
+    """
+    Bring the DB in line with the current state of specific files in photos_dir.
+
+    Used by the folder watcher instead of a full scan. For each name, a file that
+    is new or changed is hashed and added; a file that is gone is dropped from the
+    index, and its photo row is deleted once no indexed file has that hash. A
+    rename (same inode and stat signature) reuses the old hash without reading the
+    file and moves the photo row to the new filename; a file edited in place keeps
+    its caption on the new hash. `on_new_photos` receives the added photos.
+    """
+    started = time.perf_counter()
+    stats = ScanStats()
+    names = {n for n in names if os.path.splitext(n)[1].lower() in SCAN_EXTS}
+    index = get_file_index_entries(db, names)
+    removed: dict[str, FileIndexEntry] = {}
+    changed: list[tuple[str, tuple[int, int, int]]] = []
+    for name in sorted(names):
+        try:
+            st = os.stat(photos_dir / name)
+        except FileNotFoundError:
+            if name in index:
+                removed[name] = index[name]
+            continue
+        if not stat.S_ISREG(st.st_mode):
+            continue
+        stats.files_seen += 1
+        signature = (st.st_size, st.st_mtime_ns, st.st_ino)
+        known = index.get(name)
+        if known is not None and known.signature == signature:
+            continue
+        changed.append((name, signature))
+
+    # Renamed files keep their stat signature, so their hash is already known
+    moved_from = {entry.signature: name for name, entry in removed.items()}
+    to_hash = [(n, sig) for n, sig in changed if sig not in moved_from]
+    with ThreadPoolExecutor(max_workers=workers or get_scan_hash_workers()) as pool:
+        digests = dict(
+            zip(
+                [n for n, _ in to_hash],
+                pool.map(hash_file, [photos_dir / n for n, _ in to_hash]),
+            )
+        )
+    stats.files_hashed = len(to_hash)
+    stats.bytes_hashed = sum(sig[0] for _, sig in to_hash)
+    results: list[tuple[str, tuple[int, int, int], str]] = []
+    renamed: dict[str, str] = {}  # old name -> new name
+    for name, signature in changed:
+        if name in digests:
+            results.append((name, signature, digests[name]))
+        else:
+            old_name = moved_from[signature]
+            renamed[old_name] = name
+            results.append((name, signature, removed[old_name].sha256_value))
+
+    # Hashes that may have lost their last file: removed paths and edited paths
+    old_hashes = {entry.sha256_value for entry in removed.values()}
+    old_hashes.update(
+        index[name].sha256_value for name, _, _ in results if name in index
+    )
+    new_hashes = {sha256 for _, _, sha256 in results}
+    added: NewPhotos = []
+    try:
+        delete_file_index_entries(db, removed)
+        upsert_file_index_entries(
+            db, [(name, *sig, sha256) for name, sig, sha256 in results]
+        )
+        db.flush()
+        photos = get_photos_by_hashes(db, old_hashes | new_hashes)
+        orphaned = old_hashes - get_indexed_hashes(db, old_hashes)
+        for name, _, sha256 in results:
+            photo = photos.get(sha256)
+            if photo is None:
+                # A file edited in place carries its caption over to the new content
+                old = index.get(name)
+                previous = photos.get(old.sha256_value) if old is not None else None
+                caption = (
+                    previous.caption_value
+                    if previous is not None
+                    and old is not None
+                    and old.sha256_value in orphaned
+                    else None
                 )
-                raise
+                photo = Photo(hash=sha256, filename=name, caption=caption)
+                db.add(photo)
+                photos[sha256] = photo
+                stats.files_added += 1
+                added.append((sha256, name, caption is not None))
+                logger.info(f"Image created: {photos_dir / name} (sha256={sha256})")
+            elif renamed.get(photo.filename_value) == name:
+                setattr(photo, "filename", name)
+                logger.info(f"Image renamed: {photos_dir / name} (sha256={sha256})")
+        delete_photos(db, orphaned)
+        for sha256 in orphaned:
+            logger.info(f"Image removed: sha256={sha256}")
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error syncing photos in {photos_dir}: {e}")
+        raise
+    if on_new_photos and added:
+        on_new_photos(added)
+    stats.elapsed = time.perf_counter() - started
+    record_scan("sync", stats)
+    return stats
+
+
+# Uploads are spooled next to the photos under this suffix, which the folder
+# scan and watcher ignore (see SCAN_EXTS)
+UPLOAD_SUFFIX = ".part"
+
 
+class ByteStream(Protocol):
+    def read(self, size: int = -1, /) -> bytes: ...
 
-def save_image_file(photos_dir: Path, filename: str, data: bytes) -> Path:
+
+def spool_upload(
+    photos_dir: Path, stream: ByteStream, chunk_size: int = HASH_CHUNK_SIZE
+) -> tuple[Path, str]:
+    """
+    Copy an upload stream into a temp file in photos_dir one chunk at a time,
+    hashing it on the way, so memory use does not grow with the file. Returns the
+    temp path and SHA-256; the caller moves the file into place with
+    place_upload or deletes it.
+    """
     photos_dir.mkdir(parents=True, exist_ok=True)
-    file_path = photos_dir / filename
-    with file_path.open("wb") as buffer:
-        buffer.write(data)
-    return file_path
+    fd, tmp_path = tempfile.mkstemp(
+        dir=photos_dir, prefix=".upload-", suffix=UPLOAD_SUFFIX
+    )
+    h = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            while chunk := stream.read(chunk_size):
+                h.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return Path(tmp_path), h.hexdigest()
+
+
+def photo_filename(name: str) -> tuple[str, Optional[str]]:
+    """
+    The photo filename for an uploaded or archived path, and the reason it
+    cannot be added (None if it can). Only the base name is kept, so a client
+    cannot pick a path outside the photos folder.
+    """
+    filename = PurePosixPath(name.replace("\\", "/")).name
+    if not filename or filename.startswith("."):
+        return filename, "Hidden or unnamed file."
+    if not _is_scanned(filename):
+        return filename, "Unsupported file type."
+    return filename, None
+
+
+def place_upload(tmp_path: Path, target: Path, layout: str) -> bool:
+    """
+    Move a file from spool_upload to target without ever replacing a file that
+    is already there: it is hard-linked in, so a name taken in the meantime makes
+    the link fail rather than get overwritten. Returns whether target was
+    created. In the flat layout an existing target is another photo, so
+    FileExistsError is raised and tmp_path is left to the caller; in the sharded
+    layout it holds the same bytes, so the upload is dropped.
+    """
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        try:
+            os.link(tmp_path, target)
+        except FileExistsError:
+            raise
+        except OSError:
+            # No hard links here (FAT, some network mounts)
+            _copy_exclusive(tmp_path, target)
+    except FileExistsError:
+        if layout == "flat":
+            raise
+        tmp_path.unlink()
+        return False
+    tmp_path.unlink()
+    return True
+
+
+def _copy_exclusive(source: Path, target: Path) -> None:
+    """
+    Copy source to a new file at target, raising FileExistsError if target
+    already exists. A half-written target is removed if the copy fails.
+    """
+    with source.open("rb") as src:
+        dst = target.open("xb")
+        try:
+            with dst:
+                shutil.copyfileobj(src, dst)
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
 
 
 def get_image_file_path(
     photos_dir: Path, sha256: str, ext: str, original_filename: Optional[str] = None
 ) -> Path:
-    # Use the original filename from the DB if provided, else fallback to old behavior
+    """
+    Where a photo's file is: its content-addressed path when that exists (see
+    photo_layout), else the original filename from the DB, else <sha256><ext>.
+    """
     import logging
 
     logger = logging.getLogger(__name__)
+    path = photos_dir / sharded_photo_path(sha256, ext)
+    if path.exists():
+        return path
     if original_filename:
         path = photos_dir / original_filename
         logger.info(f"get_image_file_path: checking {path} (original filename)")
@@ -11,40 +11,85 @@ from contextlib import asynccontextmanager as async_cm
 from typing import Any
 
 
-def create_app(photos_dir: Any = None) -> "FastAPI":
+def create_app(photos_dir: Any = None, db_path: Any = None) -> "FastAPI":
     from app.routes.photos import router as photos_router
     from app.routes.auth import router as auth_router
-    from app.db import get_db
-    from app.image_utils import scan_photos_folder_on_startup, LRUThumbnailCache
+    from app.routes.metrics import router as metrics_router
+    from app.metrics import MetricsMiddleware
+    from app.db import create_db_engine, create_sessionmaker, init_db
+    from app.image_utils import (
+        scan_photos_folder_on_startup,
+        DiskThumbnailCache,
+        SingleFlight,
+        create_thumbnail_cache,
+    )
+    from app.rescan_jobs import RescanJobManager
+    from app.thumbnail_pool import create_thumbnail_pool
+    from app.thumbnail_prewarm import (
+        ActivityMiddleware,
+        ActivityMonitor,
+        create_prewarmer,
+    )
+    from app.watcher import create_watcher
     from pathlib import Path
     import os
 
-    # Initialize thumbnail cache
-    max_mb = float(os.environ.get("THUMBNAIL_CACHE_MB", "100"))
-    thumbnail_cache = LRUThumbnailCache(int(max_mb * 1024 * 1024))
-
-    # Attach cache to app.state
-    # (app is not yet defined, so we'll do this after app creation below)
+    # One engine (and connection pool) per app, shared by every route. It does
+    # not connect until used, so importing app.main leaves the database alone.
+    db_engine = create_db_engine(db_path)
 
     @async_cm
     async def lifespan(app: Any):
-        db_gen = get_db(
-            session_maker=(
-                app.state.db_sessionmaker
-                if hasattr(app.state, "db_sessionmaker")
-                else None
-            )
+        init_db(db_engine)
+        rescan_jobs = app.state.rescan_jobs
+        prewarmer = app.state.thumbnail_prewarmer
+        on_new_photos = prewarmer.enqueue if prewarmer is not None else None
+        if prewarmer is not None:
+            prewarmer.start()
+        # A rescan interrupted by the last shutdown resumes in the background;
+        # otherwise scan synchronously so the library is current at startup.
+        resumed = rescan_jobs.resume_interrupted(
+            app.state.photos_dir, app.state.db_sessionmaker
+        )
+        if resumed is None:
+            db = app.state.db_sessionmaker()
+            try:
+                scan_photos_folder_on_startup(
+                    app.state.photos_dir, db, on_new_photos=on_new_photos
+                )
+            finally:
+                db.close()
+        watcher = create_watcher(
+            app.state.photos_dir, app.state.db_sessionmaker, on_new_photos
         )
-        db = next(db_gen)
+        if watcher is not None:
+            watcher.start()
+        app.state.watcher = watcher
         try:
-            scan_photos_folder_on_startup(app.state.photos_dir, db)
             yield
         finally:
-            db_gen.close()
+            if watcher is not None:
+                watcher.stop()
+            rescan_jobs.shutdown()
+            if prewarmer is not None:
+                prewarmer.stop()
+            app.state.thumbnail_pool.shutdown()
+            db_engine.dispose()
 
     logger = logging.getLogger("app.main")
     app = FastAPI(lifespan=lifespan)
-    app.state.thumbnail_cache = thumbnail_cache
+    # Coalesces concurrent misses for the same thumbnail (see get_or_create_thumbnail)
+    app.state.thumbnail_flights = SingleFlight()
+    app.state.thumbnail_pool = create_thumbnail_pool()
+    app.state.db_engine = db_engine
+    app.state.db_sessionmaker = create_sessionmaker(db_engine)
+    # Background thumbnail rendering for new photos yields to HTTP requests
+    activity = ActivityMonitor()
+    prewarmer = create_prewarmer(app.state, activity)
+    app.state.thumbnail_prewarmer = prewarmer
+    app.state.rescan_jobs = RescanJobManager(
+        on_new_photos=prewarmer.enqueue if prewarmer is not None else None
+    )
     logger.info("FastAPI app instantiated.")
 
     # Set the photos_dir on app.state (for both prod and test)
@@ -54,16 +99,57 @@ def create_app(photos_dir: Any = None) -> "FastAPI":
         app.state.photos_dir = photos_dir
     logger.info(f"Photos directory set to: {app.state.photos_dir}")
 
+    # Initialize thumbnail cache; the "shared" policy maps one pack file per
+    # photos folder into every worker process
+    max_mb = float(os.environ.get("THUMBNAIL_CACHE_MB", "100"))
+    app.state.thumbnail_cache = create_thumbnail_cache(
+        int(max_mb * 1024 * 1024), Path(app.state.photos_dir)
+    )
+
+    # Persistent thumbnail tier; kept outside the photos folder by default so the
+    # folder scan never mistakes thumbnails for photos
+    disk_cache_mb = float(os.environ.get("THUMBNAIL_DISK_CACHE_MB", "1024"))
+    if disk_cache_mb > 0:
+        thumbnail_dir = Path(
+            os.environ.get("THUMBNAIL_CACHE_DIR")
+            or Path(app.state.photos_dir).parent / "thumbnails"
+        )
+        max_age_days = os.environ.get("THUMBNAIL_DISK_CACHE_MAX_AGE_DAYS")
+        app.state.thumbnail_disk_cache = DiskThumbnailCache(
+            thumbnail_dir,
+            int(disk_cache_mb * 1024 * 1024),
+            max_age=float(max_age_days) * 86400 if max_age_days else None,
+        )
+    else:
+        app.state.thumbnail_disk_cache = None
+
+    # Display-size previews for the detail view, rendered once and kept on disk
+    preview_cache_mb = float(os.environ.get("PREVIEW_CACHE_MB", "10240"))
+    if preview_cache_mb > 0:
+        preview_dir = Path(
+            os.environ.get("PREVIEW_CACHE_DIR")
+            or Path(app.state.photos_dir).parent / "previews"
+        )
+        app.state.preview_cache = DiskThumbnailCache(
+            preview_dir, int(preview_cache_mb * 1024 * 1024)
+        )
+    else:
+        app.state.preview_cache = None
+
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["http://localhost:3000", "http://localhost:5173"],
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Next-Cursor"],
     )
+    app.add_middleware(ActivityMiddleware, monitor=activity)
+    app.add_middleware(MetricsMiddleware)
 
     app.include_router(photos_router)
     app.include_router(auth_router)
+    app.include_router(metrics_router)
 
     return app
 
@@ -0,0 +1,273 @@
+from typing import Any, Iterable, Optional
+import math
+import threading
+import time
+
+# Latency buckets in seconds, from cache hits to full-size decodes
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+SCAN_BUCKETS = (0.01, 0.1, 0.5, 1.0, 5.0, 15.0, 60.0, 300.0, 900.0, 3600.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Iterable[tuple[str, str]]) -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def format_family(
+    name: str,
+    kind: str,
+    help: str,
+    samples: Iterable[tuple[str, Iterable[tuple[str, str]], float]],
+) -> str:
+    """
+    One metric family in Prometheus text format. Samples are
+    (name suffix, labels, value).
+    """
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    for suffix, labels, value in samples:
+        lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.lock = threading.Lock()
+        self.values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            return self.values.get(key, 0.0)
+
+    def render(self) -> str:
+        with self.lock:
+            values = sorted(self.values.items())
+        return format_family(
+            self.name,
+            "counter",
+            self.help,
+            [("", zip(self.labelnames, key), value) for key, value in values],
+        )
+
+
+class Histogram:
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self.lock = threading.Lock()
+        # labels -> (per-bucket counts, sum)
+        self.values: dict[tuple[str, ...], tuple[list[int], float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            self.values[key] = (counts, total + value)
+
+    def count(self, **labels: str) -> int:
+        key = tuple(labels[name] for name in self.labelnames)
+        with self.lock:
+            counts, _ = self.values.get(key, ([0], 0.0))
+            return sum(counts)
+
+    def render(self) -> str:
+        with self.lock:
+            values = sorted((k, (list(c), s)) for k, (c, s) in self.values.items())
+        samples: list[tuple[str, Iterable[tuple[str, str]], float]] = []
+        for key, (counts, total) in values:
+            labels = list(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                le = "+Inf" if math.isinf(bound) else _format_value(bound)
+                samples.append(("_bucket", [*labels, ("le", le)], cumulative))
+            samples.append(("_sum", labels, total))
+            samples.append(("_count", labels, cumulative))
+        return format_family(self.name, "histogram", self.help, samples)
+
+
+# Process-wide metrics, recorded where the work happens
+THUMBNAIL_RENDER_SECONDS = Histogram(
+    "captioner_thumbnail_render_seconds",
+    "Time to render a thumbnail on a cache miss, by source image.",
+    ("source",),
+)
+SCAN_DURATION_SECONDS = Histogram(
+    "captioner_scan_duration_seconds",
+    "Duration of folder scans (full) and watcher syncs (sync).",
+    ("kind",),
+    buckets=SCAN_BUCKETS,
+)
+SCAN_FILES = Counter(
+    "captioner_scan_files_total",
+    "Files seen, hashed and added by folder scans and watcher syncs.",
+    ("kind", "result"),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "captioner_http_request_duration_seconds",
+    "HTTP request latency by method, route template and status code.",
+    ("method", "route", "status"),
+)
+PROCESS_METRICS = (
+    THUMBNAIL_RENDER_SECONDS,
+    SCAN_DURATION_SECONDS,
+    SCAN_FILES,
+    HTTP_REQUEST_SECONDS,
+)
+
+
+def record_scan(kind: str, stats: Any) -> None:
+    SCAN_DURATION_SECONDS.observe(stats.elapsed, kind=kind)
+    for result in ("seen", "hashed", "added"):
+        SCAN_FILES.inc(getattr(stats, f"files_{result}"), kind=kind, result=result)
+
+
+def _cache_families(state: Any) -> list[str]:
+    tiers = [("memory", getattr(state, "thumbnail_cache", None))]
+    tiers.append(("disk", getattr(state, "thumbnail_disk_cache", None)))
+    tiers.append(("preview", getattr(state, "preview_cache", None)))
+    tiers = [(tier, cache) for tier, cache in tiers if cache is not None]
+    families: list[str] = []
+    for name, kind, help, attr in (
+        ("hits_total", "counter", "Thumbnail cache lookups that hit.", "hits"),
+        ("misses_total", "counter", "Thumbnail cache lookups that missed.", "misses"),
+        ("evictions_total", "counter", "Thumbnails evicted.", "evictions"),
+        ("bytes", "gauge", "Bytes of thumbnails held.", "current_bytes"),
+        ("max_bytes", "gauge", "Configured size budget.", "max_bytes"),
+        ("entries", "gauge", "Thumbnails held.", "entries"),
+    ):
+        families.append(
+            format_family(
+                f"captioner_thumbnail_cache_{name}",
+                kind,
+                help,
+                [
+                    ("", [("tier", tier)], float(getattr(cache, attr)))
+                    for tier, cache in tiers
+                ],
+            )
+        )
+    return families
+
+
+def render_metrics(state: Optional[Any] = None) -> str:
+    """
+    All metrics in Prometheus text format: the process-wide ones, plus cache and
+    render-queue state read from the app's state at scrape time.
+    """
+    families = [metric.render() for metric in PROCESS_METRICS]
+    if state is not None:
+        families.extend(_cache_families(state))
+        flights = getattr(state, "thumbnail_flights", None)
+        if flights is not None:
+            families.append(
+                format_family(
+                    "captioner_thumbnail_flights_total",
+                    "counter",
+                    "Thumbnail cache misses that rendered (leader) or waited for "
+                    "an identical in-flight render (coalesced).",
+                    [
+                        ("", [("role", "leader")], flights.executed),
+                        ("", [("role", "coalesced")], flights.coalesced),
+                    ],
+                )
+            )
+        prewarmer = getattr(state, "thumbnail_prewarmer", None)
+        if prewarmer is not None:
+            families.append(
+                format_family(
+                    "captioner_thumbnail_prewarmed_total",
+                    "counter",
+                    "Thumbnails rendered ahead of time by the pre-warmer.",
+                    [("", [], prewarmer.warmed)],
+                )
+            )
+            families.append(
+                format_family(
+                    "captioner_thumbnail_prewarm_queue",
+                    "gauge",
+                    "Photos waiting to be pre-warmed.",
+                    [("", [], len(prewarmer.queue))],
+                )
+            )
+    return "".join(families)
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware observing HTTP_REQUEST_SECONDS for every request, labelled
+    with the matched route template rather than the raw path.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Any) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = scope.get("route")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=getattr(route, "path", "<unmatched>"),
+                status=str(status),
+            )
@@ -0,0 +1,146 @@
+"""
+One-time move of a flat photos folder into the sharded layout.
+
+Stop the server first: the folder watcher would otherwise see photos vanish from
+the top level before their new paths are indexed. Then run, from the backend
+directory:
+
+    python -m app.migrate_layout [--photos-dir DIR] [--db PATH] [--dry-run]
+
+and start the server with PHOTO_LAYOUT=sharded so new photos go there too.
+Photos keep their names and captions; only the files move.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Optional
+from app.crud import (
+    bulk_add_photos,
+    delete_file_index_entries,
+    get_file_index,
+    upsert_file_index_entries,
+)
+from app.image_utils import (
+    SCAN_EXTS,
+    get_scan_batch_size,
+    get_scan_hash_workers,
+    hash_file,
+)
+from app.photo_layout import sharded_photo_path
+import argparse
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class MigrationStats:
+    moved: int = 0
+    hashed: int = 0
+    # Same content already in the sharded layout; the flat copy is left alone
+    duplicates: int = 0
+
+
+def migrate_to_sharded(
+    photos_dir: Path,
+    db: Any,
+    batch_size: Optional[int] = None,
+    dry_run: bool = False,
+) -> MigrationStats:
+    """
+    Move every photo at the top level of photos_dir to its content-addressed
+    path, updating the file index a batch at a time. Hashes come from the file
+    index where the file is unchanged, so an indexed library is not re-read.
+    """
+    stats = MigrationStats()
+    index = get_file_index(db)
+    with os.scandir(photos_dir) as entries:
+        flat = [
+            (entry.name, entry)
+            for entry in entries
+            if entry.is_file() and os.path.splitext(entry.name)[1].lower() in SCAN_EXTS
+        ]
+    to_hash: list[Path] = []
+    known: dict[str, str] = {}
+    for path, entry in flat:
+        st = entry.stat()
+        indexed = index.get(path)
+        if indexed is not None and indexed.signature == (
+            st.st_size,
+            st.st_mtime_ns,
+            st.st_ino,
+        ):
+            known[path] = indexed.sha256_value
+        else:
+            to_hash.append(Path(entry.path))
+    with ThreadPoolExecutor(max_workers=get_scan_hash_workers()) as pool:
+        for file_path, sha256 in zip(to_hash, pool.map(hash_file, to_hash)):
+            known[file_path.name] = sha256
+    stats.hashed = len(to_hash)
+
+    batch_size = batch_size or get_scan_batch_size()
+    for start in range(0, len(flat), batch_size):
+        moved: list[str] = []
+        index_entries: list[tuple[str, int, int, int, str]] = []
+        photos: list[tuple[str, str]] = []
+        for name, _ in flat[start : start + batch_size]:
+            sha256 = known[name]
+            target = sharded_photo_path(sha256, Path(name).suffix)
+            if (photos_dir / target).exists():
+                stats.duplicates += 1
+                continue
+            stats.moved += 1
+            if dry_run:
+                continue
+            (photos_dir / target).parent.mkdir(parents=True, exist_ok=True)
+            os.replace(photos_dir / name, photos_dir / target)
+            st = os.stat(photos_dir / target)
+            moved.append(name)
+            index_entries.append(
+                (target, st.st_size, st.st_mtime_ns, st.st_ino, sha256)
+            )
+            photos.append((sha256, name))
+        if dry_run:
+            continue
+        # Photos that were never scanned get a row; existing rows are kept
+        bulk_add_photos(db, photos)
+        delete_file_index_entries(db, moved)
+        upsert_file_index_entries(db, index_entries)
+        db.commit()
+        logger.info(f"Moved {stats.moved} of {len(flat)} photos")
+    return stats
+
+
+def main(argv: Optional[list[str]] = None) -> None:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    parser = argparse.ArgumentParser(
+        description="Move a flat photos folder into the sharded layout."
+    )
+    parser.add_argument(
+        "--photos-dir",
+        type=Path,
+        default=Path(__file__).parent.parent / "photos",
+    )
+    parser.add_argument("--db", type=Path, default=None, help="default: DB_PATH")
+    parser.add_argument("--dry-run", action="store_true", help="report what would move")
+    args = parser.parse_args(argv)
+    engine = create_db_engine(args.db)
+    init_db(engine)
+    db = create_sessionmaker(engine)()
+    try:
+        stats = migrate_to_sharded(args.photos_dir, db, dry_run=args.dry_run)
+    finally:
+        db.close()
+        engine.dispose()
+    verb = "would move" if args.dry_run else "moved"
+    print(
+        f"{verb} {stats.moved} photos ({stats.hashed} hashed); "
+        f"{stats.duplicates} duplicates left in place"
+    )
+
+
+if __name__ == "__main__":
+    main()
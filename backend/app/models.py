@@ -1,4 +1,15 @@
-from sqlalchemy import Column, String, Text
+from sqlalchemy import (
+    DDL,
+    BigInteger,
+    Column,
+    Float,
+    Index,
+    Integer,
+    String,
+    Text,
+    event,
+    text,
+)
 from sqlalchemy.orm import declarative_base
 
 Base = declarative_base()
@@ -11,6 +22,30 @@ class Photo(Base):
     caption = Column(Text, nullable=True)
     # Add future metadata fields here as needed
 
+    # Keyset pagination indexes: one per sort key, plus partial indexes so the
+    # captioned/uncaptioned filters walk only matching rows.
+    __table_args__ = (
+        Index("ix_photos_filename_hash", "filename", "hash"),
+        Index(
+            "ix_photos_uncaptioned_filename_hash",
+            "filename",
+            "hash",
+            sqlite_where=text("caption IS NULL"),
+        ),
+        Index(
+            "ix_photos_captioned_filename_hash",
+            "filename",
+            "hash",
+            sqlite_where=text("caption IS NOT NULL"),
+        ),
+        Index(
+            "ix_photos_uncaptioned_hash", "hash", sqlite_where=text("caption IS NULL")
+        ),
+        Index(
+            "ix_photos_captioned_hash", "hash", sqlite_where=text("caption IS NOT NULL")
+        ),
+    )
+
     @property
     def hash_value(self) -> str:
         return self.__dict__["hash"]
@@ -22,3 +57,104 @@ class Photo(Base):
     @property
     def caption_value(self) -> str | None:
         return self.__dict__["caption"]
+
+
+# Full-text index of captions: an FTS5 table over photos.caption (external
+# content, so captions are not stored twice), kept in sync by triggers on every
+# insert, caption update and delete. Created with the photos table, and by
+# init_db for databases that predate it.
+CAPTION_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS photos_fts USING fts5("
+    "caption, content='photos', content_rowid='rowid', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    "CREATE TRIGGER IF NOT EXISTS photos_fts_insert AFTER INSERT ON photos "
+    "WHEN new.caption IS NOT NULL BEGIN "
+    "INSERT INTO photos_fts(rowid, caption) VALUES (new.rowid, new.caption); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS photos_fts_delete AFTER DELETE ON photos "
+    "WHEN old.caption IS NOT NULL BEGIN "
+    "INSERT INTO photos_fts(photos_fts, rowid, caption) "
+    "VALUES ('delete', old.rowid, old.caption); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS photos_fts_update AFTER UPDATE OF caption ON photos "
+    "BEGIN "
+    "INSERT INTO photos_fts(photos_fts, rowid, caption) "
+    "SELECT 'delete', old.rowid, old.caption WHERE old.caption IS NOT NULL; "
+    "INSERT INTO photos_fts(rowid, caption) "
+    "SELECT new.rowid, new.caption WHERE new.caption IS NOT NULL; "
+    "END",
+)
+for statement in CAPTION_SEARCH_DDL:
+    event.listen(Photo.__table__, "after_create", DDL(statement))
+
+
+class FileIndexEntry(Base):
+    """
+    Last known stat signature and content hash of a file in the photos folder.
+
+    Lets a rescan skip re-hashing files whose (size, mtime_ns, inode) are unchanged.
+    """
+
+    __tablename__: str = "file_index"
+    path = Column(String(1024), primary_key=True)  # relative to the photos folder
+    size = Column(BigInteger, nullable=False)
+    mtime_ns = Column(BigInteger, nullable=False)
+    inode = Column(BigInteger, nullable=False)
+    sha256 = Column(String(64), nullable=False, index=True)
+
+    @property
+    def signature(self) -> tuple[int, int, int]:
+        return (
+            self.__dict__["size"],
+            self.__dict__["mtime_ns"],
+            self.__dict__["inode"],
+        )
+
+    @property
+    def sha256_value(self) -> str:
+        return self.__dict__["sha256"]
+
+
+class RescanJob(Base):
+    """
+    A background folder rescan. Rows left "running" by a restart are resumed.
+    """
+
+    __tablename__: str = "rescan_jobs"
+    id = Column(String(32), primary_key=True)
+    status = Column(String(16), nullable=False, default="running")
+    files_seen = Column(Integer, nullable=False, default=0)
+    files_hashed = Column(Integer, nullable=False, default=0)
+    files_added = Column(Integer, nullable=False, default=0)
+    started_at = Column(Float(asdecimal=False), nullable=False)
+    finished_at = Column(Float(asdecimal=False), nullable=True)
+    error = Column(Text, nullable=True)
+
+
+class RemovedCaption(Base):
+    """
+    Caption of a photo whose files all left the photos folder. The photo row is
+    deleted, but if a file with the same content comes back, the restore trigger
+    gives the new row its caption again.
+    """
+
+    __tablename__: str = "removed_captions"
+    hash = Column(String(255), primary_key=True)
+    filename = Column(String(255))
+    caption = Column(Text, nullable=False)
+    removed_at = Column(Float(asdecimal=False), nullable=False)
+
+
+# Runs for every way a photo row is added (scan, upload, bulk ingest, watcher)
+RESTORE_CAPTION_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS photos_restore_caption AFTER INSERT ON photos "
+    "WHEN new.caption IS NULL "
+    "AND EXISTS (SELECT 1 FROM removed_captions WHERE hash = new.hash) BEGIN "
+    "UPDATE photos SET caption = "
+    "(SELECT caption FROM removed_captions WHERE hash = new.hash) "
+    "WHERE hash = new.hash; "
+    "DELETE FROM removed_captions WHERE hash = new.hash; "
+    "END"
+)
+# removed_captions is created after photos, so both exist by then
+event.listen(RemovedCaption.__table__, "after_create", DDL(RESTORE_CAPTION_DDL))
@@ -0,0 +1,40 @@
+from pathlib import Path, PurePosixPath
+from typing import Optional
+import os
+import string
+
+# "flat": photos_dir/<filename>, as uploaded. "sharded": content-addressed,
+# photos_dir/ab/cd/<sha256><ext>, so no directory grows past ~N/65536 entries
+PHOTO_LAYOUTS = ("flat", "sharded")
+HEX_DIGITS = set(string.hexdigits.lower())
+
+
+def get_photo_layout() -> str:
+    """
+    Layout new photos are written in, from PHOTO_LAYOUT. Reads understand both.
+    """
+    layout = os.environ.get("PHOTO_LAYOUT", "flat").lower()
+    if layout not in PHOTO_LAYOUTS:
+        raise ValueError(f"Unknown PHOTO_LAYOUT: {layout}")
+    return layout
+
+
+def sharded_photo_path(sha256: str, ext: str) -> str:
+    """
+    Content-addressed path of a photo, relative to photos_dir.
+    """
+    return str(PurePosixPath(sha256[:2], sha256[2:4], f"{sha256}{ext.lower()}"))
+
+
+def photo_storage_path(sha256: str, filename: str, layout: Optional[str] = None) -> str:
+    """
+    Where a new photo is stored, relative to photos_dir, in `layout` (default
+    PHOTO_LAYOUT). The photo row keeps `filename` as its name either way.
+    """
+    if (layout or get_photo_layout()) == "sharded":
+        return sharded_photo_path(sha256, Path(filename).suffix)
+    return filename
+
+
+def is_shard_dir(name: str) -> bool:
+    return len(name) == 2 and set(name) <= HEX_DIGITS
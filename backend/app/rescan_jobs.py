@@ -0,0 +1,173 @@
+from pathlib import Path
+from typing import Optional
+from sqlalchemy.orm import Session, sessionmaker
+from app.image_utils import (
+    NewPhotosCallback,
+    ScanStats,
+    scan_photos_folder_on_startup,
+)
+from app.models import RescanJob
+import logging
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Seconds shutdown() waits for a running job to reach a stopping point
+SHUTDOWN_TIMEOUT = 10.0
+
+
+class RescanJobManager:
+    """
+    Runs folder rescans on a background thread, one at a time.
+
+    Job progress is persisted in the rescan_jobs table after every committed scan
+    batch. A job that is still "running" when the process stops is picked up again
+    by resume_interrupted(); the scan's file index acts as the checkpoint, so files
+    hashed before the restart are not hashed again. Photos a job adds are passed
+    to `on_new_photos`.
+    """
+
+    def __init__(self, on_new_photos: Optional[NewPhotosCallback] = None) -> None:
+        self.on_new_photos = on_new_photos
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.active_job_id: Optional[str] = None
+
+    def start(
+        self, photos_dir: Path, session_maker: sessionmaker[Session]
+    ) -> tuple[str, bool]:
+        """
+        Start a rescan, or return the running one. Returns (job_id, started).
+        """
+        with self.lock:
+            if self.active_job_id is not None:
+                return self.active_job_id, False
+            job_id = uuid.uuid4().hex
+            with session_maker() as db:
+                db.add(RescanJob(id=job_id, status="running", started_at=time.time()))
+                db.commit()
+            self._launch(job_id, photos_dir, session_maker)
+            return job_id, True
+
+    def resume_interrupted(
+        self, photos_dir: Path, session_maker: sessionmaker[Session]
+    ) -> Optional[str]:
+        """
+        Resume the latest job left running by a previous process, if any.
+        """
+        with self.lock:
+            if self.active_job_id is not None:
+                return None
+            with session_maker() as db:
+                jobs = (
+                    db.query(RescanJob)
+                    .filter_by(status="running")
+                    .order_by(RescanJob.started_at.desc())
+                    .all()
+                )
+                if not jobs:
+                    return None
+                # Only one job can have been active; anything older is stale
+                for stale in jobs[1:]:
+                    setattr(stale, "status", "failed")
+                    setattr(stale, "error", "Superseded by a newer rescan.")
+                    setattr(stale, "finished_at", time.time())
+                db.commit()
+                job_id = str(jobs[0].id)
+            logger.info(f"Resuming interrupted rescan job {job_id}")
+            self._launch(job_id, photos_dir, session_maker)
+            return job_id
+
+    def get(
+        self, job_id: str, session_maker: sessionmaker[Session]
+    ) -> Optional[RescanJob]:
+        with session_maker() as db:
+            job = db.get(RescanJob, job_id)
+            if job is not None:
+                db.expunge(job)
+            return job
+
+    def shutdown(self, timeout: Optional[float] = SHUTDOWN_TIMEOUT) -> None:
+        """
+        Ask the running job to stop after the file it is hashing and wait for it,
+        at most `timeout` seconds.
+
+        The job stays "running" in the DB so the next startup resumes it. A job
+        still hashing a huge file when the timeout passes is left to the daemon
+        thread; whatever it had not committed is redone on resume.
+        """
+        self.stop_event.set()
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+            if thread.is_alive():
+                logger.warning(
+                    f"Rescan job {self.active_job_id} still running after "
+                    f"{timeout}s; it will resume on the next startup"
+                )
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        thread = self.thread
+        if thread is not None:
+            thread.join(timeout)
+
+    def _launch(
+        self, job_id: str, photos_dir: Path, session_maker: sessionmaker[Session]
+    ) -> None:
+        self.active_job_id = job_id
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run,
+            args=(job_id, photos_dir, session_maker),
+            name=f"rescan-{job_id[:8]}",
+            daemon=True,
+        )
+        self.thread.start()
+
+    def _run(
+        self, job_id: str, photos_dir: Path, session_maker: sessionmaker[Session]
+    ) -> None:
+        db = session_maker()
+        try:
+            job = db.get(RescanJob, job_id)
+            assert job is not None
+            # Counters from before a restart carry over into the resumed run
+            base_hashed = int(job.files_hashed)  # type: ignore[arg-type]
+            base_added = int(job.files_added)  # type: ignore[arg-type]
+
+            def progress(stats: ScanStats) -> None:
+                setattr(job, "files_seen", stats.files_seen)
+                setattr(job, "files_hashed", base_hashed + stats.files_hashed)
+                setattr(job, "files_added", base_added + stats.files_added)
+                db.commit()
+
+            try:
+                stats = scan_photos_folder_on_startup(
+                    photos_dir,
+                    db,
+                    progress=progress,
+                    should_stop=self.stop_event.is_set,
+                    on_new_photos=self.on_new_photos,
+                )
+            except Exception as e:
+                db.rollback()
+                logger.error(f"Rescan job {job_id} failed: {e}")
+                setattr(job, "status", "failed")
+                setattr(job, "error", str(e))
+                setattr(job, "finished_at", time.time())
+                db.commit()
+                return
+            if stats.interrupted:
+                logger.info(f"Rescan job {job_id} interrupted; will resume on startup")
+                return
+            progress(stats)
+            setattr(job, "status", "completed")
+            setattr(job, "finished_at", time.time())
+            db.commit()
+        finally:
+            db.close()
+            with self.lock:
+                self.active_job_id = None
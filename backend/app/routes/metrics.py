@@ -0,0 +1,15 @@
+from fastapi import APIRouter, Request
+from fastapi.responses import PlainTextResponse
+from app.metrics import render_metrics
+
+router = APIRouter()
+
+# Prometheus text exposition format
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@router.get("/metrics", operation_id="get_metrics", response_class=PlainTextResponse)
+def get_metrics(request: Request) -> PlainTextResponse:
+    return PlainTextResponse(
+        render_metrics(request.app.state), media_type=METRICS_MEDIA_TYPE
+    )
@@ -1,20 +1,80 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Body
-from fastapi.responses import FileResponse, Response
-from app.schemas import PhotoResponse
-from app.crud import add_photo, get_photo_by_hash, get_all_photos, update_photo_caption
-from app.db import get_db
+from fastapi import APIRouter, UploadFile, File, HTTPException, Body, Depends, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from app.schemas import (
+    BulkIngestResponse,
+    BulkIngestResult,
+    PhotoResponse,
+    RescanJobResponse,
+    RescanStartResponse,
+    ThumbnailBatchRequest,
+)
+from app.crud import (
+    add_photo,
+    get_photo_by_hash,
+    get_photos_by_hashes,
+    get_photos_page,
+    get_random_photo,
+    search_photos,
+    update_photo_caption,
+    upsert_file_index_entries,
+)
+from app.db import get_session
+from app.photo_layout import get_photo_layout, photo_storage_path
+from app.thumbnail_pool import ThumbnailPoolBusy
+from app.http_cache import cache_headers, if_none_match, make_etag, not_modified
 from app.image_utils import (
-    hash_image_bytes,
-    save_image_file,
+    PREVIEW_FORMATS,
+    THUMBNAIL_FORMATS,
+    get_preview_size,
+    get_thumbnail_sizes,
+    negotiate_thumbnail_format,
+    photo_filename,
+    place_upload,
+    spool_upload,
     get_image_file_path,
-    scan_photos_folder_on_startup,
 )
 from PIL import UnidentifiedImageError
 from pathlib import Path
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from typing import Any, AsyncIterator, Literal, Optional, Union, cast
+import asyncio
+import base64
+import json
 import mimetypes
+import os
+import struct
+import time
 
 router = APIRouter()
 
+THUMBNAIL_SIZE = 256
+# Thumbnails rendered at once for one batch request
+THUMBNAIL_BATCH_CONCURRENCY = 8
+THUMBNAIL_BATCH_MEDIA_TYPE = "application/vnd.captioner.thumbnails"
+# Files accepted in one multipart bulk ingest; larger sets go in an archive
+BULK_INGEST_MAX_FILES = 10_000
+TAR_MEDIA_TYPES = {
+    "application/x-tar",
+    "application/gzip",
+    "application/x-gzip",
+    "application/x-bzip2",
+    "application/x-xz",
+}
+ZIP_MEDIA_TYPES = {"application/zip", "application/x-zip-compressed"}
+
+
+class OriginalFileResponse(FileResponse):
+    """
+    FileResponse for original photos, often tens of MB: each chunk read is a
+    threadpool round trip, so chunks are 1 MB instead of 64 KB. Range requests
+    and, on servers that offer it, the zero-copy pathsend extension come from
+    FileResponse.
+    """
+
+    chunk_size = 1024 * 1024
+
 
 from fastapi import Request
 
@@ -25,22 +85,55 @@ from fastapi import Request
     status_code=201,
     operation_id="upload_photo",
 )
-def upload_photo(request: Request, file: UploadFile = File(...)) -> PhotoResponse:
-    photos_dir = request.app.state.photos_dir
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
-    contents = file.file.read()
-    sha256 = hash_image_bytes(contents)
-    filename = file.filename
-    assert filename is not None, "UploadFile filename is required"
-    existing = get_photo_by_hash(db, sha256)
-    if existing:
-        raise HTTPException(
-            status_code=409, detail="Photo with this hash already exists."
+def upload_photo(
+    request: Request,
+    file: UploadFile = File(...),
+    db: Session = Depends(get_session),
+) -> PhotoResponse:
+    photos_dir = Path(request.app.state.photos_dir)
+    filename, problem = photo_filename(file.filename or "")
+    if problem is not None:
+        raise HTTPException(status_code=400, detail=problem)
+    # Hash while spooling to disk; only the finished file is renamed into place
+    tmp_path, sha256 = spool_upload(photos_dir, file.file)
+    try:
+        existing = get_photo_by_hash(db, sha256)
+        if existing:
+            raise HTTPException(
+                status_code=409, detail="Photo with this hash already exists."
+            )
+        layout = get_photo_layout()
+        path = photo_storage_path(sha256, filename, layout)
+        target = photos_dir / path
+        try:
+            created = place_upload(tmp_path, target, layout)
+        except FileExistsError:
+            raise HTTPException(
+                status_code=409, detail="A file with this name already exists."
+            )
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+    try:
+        # Indexed in the same commit, so no scan or watcher sync hashes it again
+        st = target.stat()
+        upsert_file_index_entries(
+            db, [(path, st.st_size, st.st_mtime_ns, st.st_ino, sha256)]
         )
-    save_image_file(photos_dir, filename, contents)
-    photo = add_photo(db, sha256, filename, caption=None)
+        photo = add_photo(db, sha256, filename, caption=None)
+    except BaseException as e:
+        db.rollback()
+        if created:
+            target.unlink(missing_ok=True)
+        if isinstance(e, IntegrityError):
+            # The same bytes were uploaded under another name since the check
+            raise HTTPException(
+                status_code=409, detail="Photo with this hash already exists."
+            )
+        raise
+    prewarmer = getattr(request.app.state, "thumbnail_prewarmer", None)
+    if prewarmer is not None:
+        prewarmer.enqueue([(photo.hash_value, photo.filename_value, False)])
     return PhotoResponse(
         hash=photo.hash_value,
         filename=photo.filename_value,
@@ -48,38 +141,239 @@ def upload_photo(request: Request, file: UploadFile = File(...)) -> PhotoRespons
     )
 
 
+@router.post(
+    "/photos/bulk",
+    response_model=BulkIngestResponse,
+    operation_id="bulk_ingest_photos",
+)
+async def bulk_ingest_photos(
+    request: Request, db: Session = Depends(get_session)
+) -> BulkIngestResponse:
+    """
+    Add many photos in one request: a multipart form with any number of `files`
+    fields, or a tar (optionally compressed) or zip archive as the request body.
+    Rows are committed in batches of SCAN_BATCH_SIZE, and every file gets a
+    result: added, duplicate (hash already in the library) or rejected. An
+    archive damaged partway keeps what was read before the damage, and an error
+    result stands for the rest.
+    """
+    from app.bulk_ingest import ARCHIVE_ERRORS, BlockingBodyReader, BulkIngest
+    from starlette.datastructures import UploadFile as FormFile
+
+    content_type = request.headers.get("content-type", "").split(";")[0]
+    content_type = content_type.strip().lower()
+    prewarmer = getattr(request.app.state, "thumbnail_prewarmer", None)
+    ingest = BulkIngest(
+        Path(request.app.state.photos_dir),
+        db,
+        on_new_photos=prewarmer.enqueue if prewarmer is not None else None,
+    )
+
+    def run(add: Any, *args: Any) -> None:
+        add(*args)
+        ingest.flush()
+
+    try:
+        if content_type == "multipart/form-data":
+            async with request.form(
+                max_files=BULK_INGEST_MAX_FILES, max_fields=BULK_INGEST_MAX_FILES
+            ) as form:
+                files = [
+                    (part.filename or "", part.file)
+                    for part in form.getlist("files")
+                    if isinstance(part, FormFile)
+                ]
+                await run_in_threadpool(run, ingest.add_files, files)
+        elif content_type in TAR_MEDIA_TYPES or content_type in ZIP_MEDIA_TYPES:
+            add = ingest.add_tar if content_type in TAR_MEDIA_TYPES else ingest.add_zip
+            body = BlockingBodyReader(request.stream())
+            await run_in_threadpool(run, ingest.add_archive, add, body)
+        else:
+            raise HTTPException(
+                status_code=415,
+                detail="Send multipart/form-data with `files`, a tar or a zip archive.",
+            )
+    except ARCHIVE_ERRORS as e:
+        raise HTTPException(status_code=400, detail=f"Unreadable archive: {e}")
+    finally:
+        ingest.discard()
+    results = [BulkIngestResult(**vars(result)) for result in ingest.results]
+    return BulkIngestResponse(
+        added=sum(r.status == "added" for r in results),
+        duplicate=sum(r.status == "duplicate" for r in results),
+        rejected=sum(r.status == "rejected" for r in results),
+        error=sum(r.status == "error" for r in results),
+        results=results,
+    )
+
+
+def encode_cursor(sort: str, order: str, key: tuple[str, ...]) -> str:
+    raw = json.dumps([sort, order, *key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> tuple[str, ...]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        decoded: Any = json.loads(raw)
+        assert isinstance(decoded, list)
+        values: list[str] = []
+        for value in cast(list[Any], decoded):
+            assert isinstance(value, str)
+            values.append(value)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    key_length = 1 if sort == "hash" else 2
+    if values[:2] != [sort, order] or len(values) != 2 + key_length:
+        raise HTTPException(
+            status_code=400, detail="Cursor does not match sort and order."
+        )
+    return tuple(values[2:])
+
+
+def encode_search_cursor(q: str, key: tuple[float, int]) -> str:
+    raw = json.dumps(["search", q, *key]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_search_cursor(cursor: str, q: str) -> tuple[float, int]:
+    """
+    The (rank, rowid) key of a search cursor, which is only valid for the same q.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        decoded: Any = json.loads(raw)
+        assert isinstance(decoded, list)
+        kind, cursor_q, rank, rowid = cast(list[Any], decoded)
+        assert kind == "search" and isinstance(cursor_q, str)
+        assert isinstance(rank, (int, float)) and not isinstance(rank, bool)
+        assert isinstance(rowid, int) and not isinstance(rowid, bool)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+    if cursor_q != q:
+        raise HTTPException(status_code=400, detail="Cursor does not match q.")
+    return float(rank), rowid
+
+
 @router.get("/photos", response_model=list[PhotoResponse], operation_id="get_photos")
-def get_photos(request: Request) -> list[PhotoResponse]:
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
-    # Rescan folder to pick up new images (watcher removed)
-    scan_photos_folder_on_startup(request.app.state.photos_dir, db)
+def get_photos(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    captioned: Optional[bool] = None,
+    prefix: Optional[str] = None,
+    sort: Literal["filename", "hash"] = "filename",
+    order: Literal["asc", "desc"] = "asc",
+    db: Session = Depends(get_session),
+) -> list[PhotoResponse]:
+    """
+    List photos one page at a time. When more photos follow, the X-Next-Cursor
+    response header carries the cursor for the next page.
+    """
+    after = decode_cursor(cursor, sort, order) if cursor else None
+    photos, next_key = get_photos_page(
+        db,
+        limit,
+        sort=sort,
+        descending=order == "desc",
+        after=after,
+        captioned=captioned,
+        filename_prefix=prefix,
+    )
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(sort, order, next_key)
     return [
         PhotoResponse(
             hash=p.hash_value, filename=p.filename_value, caption=p.caption_value
         )
-        for p in get_all_photos(db)
+        for p in photos
     ]
 
 
-@router.post("/rescan", operation_id="rescan_photos")
-def rescan_photos(request: Request) -> dict[str, str]:
-    photos_dir = request.app.state.photos_dir
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
-    scan_photos_folder_on_startup(photos_dir, db)
-    return {"detail": "Rescan started."}
+@router.get(
+    "/photos/search", response_model=list[PhotoResponse], operation_id="search_photos"
+)
+def search_photos_endpoint(
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=500),
+    limit: int = Query(50, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_session),
+) -> list[PhotoResponse]:
+    """
+    Photos whose captions contain every word of `q` (the last one as a prefix),
+    best match first. Paged like GET /photos: X-Next-Cursor carries the cursor
+    for the next page, which is only valid with the same `q`.
+    """
+    after = decode_search_cursor(cursor, q) if cursor else None
+    photos, next_key = search_photos(db, q, limit, after=after)
+    if next_key is not None:
+        response.headers["X-Next-Cursor"] = encode_search_cursor(q, next_key)
+    return [
+        PhotoResponse(
+            hash=p.hash_value, filename=p.filename_value, caption=p.caption_value
+        )
+        for p in photos
+    ]
+
+
+@router.get(
+    "/photos/random", response_model=PhotoResponse, operation_id="get_random_photo"
+)
+def get_random_photo_endpoint(
+    uncaptioned: bool = False, db: Session = Depends(get_session)
+) -> PhotoResponse:
+    photo = get_random_photo(db, uncaptioned=uncaptioned)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    return PhotoResponse(
+        hash=photo.hash_value,
+        filename=photo.filename_value,
+        caption=photo.caption_value,
+    )
+
+
+@router.post(
+    "/rescan",
+    response_model=RescanStartResponse,
+    status_code=202,
+    operation_id="rescan_photos",
+)
+def rescan_photos(request: Request) -> RescanStartResponse:
+    job_id, started = request.app.state.rescan_jobs.start(
+        request.app.state.photos_dir, request.app.state.db_sessionmaker
+    )
+    detail = "Rescan started." if started else "Rescan already running."
+    return RescanStartResponse(detail=detail, job_id=job_id)
+
+
+@router.get(
+    "/rescan/{job_id}",
+    response_model=RescanJobResponse,
+    operation_id="get_rescan_job",
+)
+def get_rescan_job(request: Request, job_id: str) -> RescanJobResponse:
+    job = request.app.state.rescan_jobs.get(job_id, request.app.state.db_sessionmaker)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Rescan job not found.")
+    finished_at = job.finished_at if job.finished_at is not None else time.time()
+    return RescanJobResponse(
+        job_id=job.id,
+        status=job.status,
+        files_seen=job.files_seen,
+        files_hashed=job.files_hashed,
+        files_added=job.files_added,
+        elapsed=finished_at - job.started_at,
+        error=job.error,
+    )
 
 
 @router.get(
     "/photos/{hash}", response_model=PhotoResponse, operation_id="get_photo_by_hash"
 )
-def get_photo_by_hash_endpoint(request: Request, hash: str) -> PhotoResponse:
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
+def get_photo_by_hash_endpoint(
+    hash: str, db: Session = Depends(get_session)
+) -> PhotoResponse:
     photo = get_photo_by_hash(db, hash)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found.")
@@ -96,11 +390,10 @@ def get_photo_by_hash_endpoint(request: Request, hash: str) -> PhotoResponse:
     operation_id="patch_photo_caption",
 )
 def patch_photo_caption_route(
-    request: Request, hash: str, caption: str = Body(..., embed=True)
+    hash: str,
+    caption: str = Body(..., embed=True),
+    db: Session = Depends(get_session),
 ) -> PhotoResponse:
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
     photo = update_photo_caption(db, hash, caption)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found.")
@@ -112,11 +405,14 @@ def patch_photo_caption_route(
 
 
 @router.get("/photos/{hash}/image", operation_id="get_photo_image")
-def get_photo_image(request: Request, hash: str) -> FileResponse:
+def get_photo_image(
+    request: Request, hash: str, db: Session = Depends(get_session)
+) -> Response:
+    # The URL is content-addressed, so a matching validator needs no lookup at all
+    etag = make_etag(hash)
+    if if_none_match(request, etag):
+        return not_modified(etag)
     photos_dir = request.app.state.photos_dir
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
     photo = get_photo_by_hash(db, hash)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found.")
@@ -124,43 +420,304 @@ def get_photo_image(request: Request, hash: str) -> FileResponse:
     file_path = get_image_file_path(
         photos_dir, photo.hash_value, ext, photo.filename_value
     )
-    if not file_path.exists():
+    try:
+        # Passed on, so the response does not stat the file again
+        stat_result = os.stat(file_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Image file not found.")
     mimetype, _ = mimetypes.guess_type(str(file_path))
-    return FileResponse(
-        path=file_path, media_type=mimetype or "application/octet-stream"
+    return OriginalFileResponse(
+        path=file_path,
+        media_type=mimetype or "application/octet-stream",
+        headers=cache_headers(etag),
+        stat_result=stat_result,
     )
 
 
-@router.get("/photos/{hash}/thumbnail", operation_id="get_photo_thumbnail")
-def get_photo_thumbnail(request: Request, hash: str) -> Response:
-    from app.image_utils import get_or_create_thumbnail, LRUThumbnailCache
+async def load_preview(
+    state: Any, photo_hash: str, filename: str, fmt: str
+) -> Union[Path, bytes]:
+    """
+    Path of the photo's preview in the preview store (bytes if there is none),
+    rendering it on first use. As in load_thumbnail, the render runs in the
+    thumbnail worker processes and is awaited; with THUMBNAIL_WORKERS=0 it runs
+    in the threadpool.
+    """
+    from app.image_utils import get_or_create_preview, get_or_create_preview_async
 
-    photos_dir = request.app.state.photos_dir
-    session_maker = getattr(request.app.state, "db_sessionmaker", None)
-    db_gen = get_db(session_maker=session_maker)
-    db = next(db_gen)
-    photo = get_photo_by_hash(db, hash)
+    pool = getattr(state, "thumbnail_pool", None)
+    store = getattr(state, "preview_cache", None)
+    flights = getattr(state, "thumbnail_flights", None)
+    if pool is not None and pool.workers > 0:
+        return await get_or_create_preview_async(
+            state.photos_dir,
+            photo_hash,
+            filename,
+            store,
+            pool.submit,
+            get_preview_size(),
+            fmt,
+            flights=flights,
+        )
+    return await run_in_threadpool(
+        get_or_create_preview,
+        state.photos_dir,
+        photo_hash,
+        filename,
+        store,
+        get_preview_size(),
+        fmt,
+        flights=flights,
+        render=pool.render if pool is not None else None,
+    )
+
+
+@router.get("/photos/{hash}/preview", operation_id="get_photo_preview")
+async def get_photo_preview(
+    request: Request, hash: str, db: Session = Depends(get_session)
+) -> Response:
+    """
+    Display-size version of the photo (PREVIEW_SIZE long edge, WebP or
+    progressive JPEG by Accept) for the detail view, instead of the original.
+    """
+    fmt = negotiate_thumbnail_format(request.headers.get("accept"), PREVIEW_FORMATS)
+    etag = make_etag(hash, "preview", get_preview_size(), fmt)
+    if if_none_match(request, etag):
+        return not_modified(etag, vary="Accept")
+    photo = await run_in_threadpool(get_photo_by_hash, db, hash)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found.")
+    photo_hash, filename = photo.hash_value, photo.filename_value
+    # A full-size decode can take a while; don't hold a pooled connection for it
+    await run_in_threadpool(db.close)
+    try:
+        preview = await load_preview(request.app.state, photo_hash, filename, fmt)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Image file not found.")
+    except ThumbnailPoolBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Thumbnail queue is full; retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Preview error: {e}")
+    media_type = THUMBNAIL_FORMATS[fmt][1]
+    headers = cache_headers(etag, vary="Accept")
+    if isinstance(preview, Path):
+        return FileResponse(preview, media_type=media_type, headers=headers)
+    return Response(content=preview, media_type=media_type, headers=headers)
+
+
+def check_thumbnail_size(size: int) -> None:
+    sizes = get_thumbnail_sizes()
+    if size not in sizes:
+        raise HTTPException(
+            status_code=400,
+            detail="Unsupported thumbnail size; use one of "
+            + ", ".join(str(s) for s in sizes)
+            + ".",
+        )
+
+
+async def load_thumbnail(
+    state: Any, photo_hash: str, filename: str, size: int, fmt: str
+) -> bytes:
+    """
+    Thumbnail bytes from the app's cache tiers, rendering on a miss. The render
+    runs in the thumbnail worker processes and is awaited, so no threadpool
+    thread waits on it; with THUMBNAIL_WORKERS=0 it runs in the threadpool.
+    """
+    from app.image_utils import (
+        create_thumbnail_cache,
+        get_or_create_thumbnail,
+        get_or_create_thumbnail_async,
+    )
+
     # Get or create cache
-    cache = getattr(request.app.state, "thumbnail_cache", None)
+    cache = getattr(state, "thumbnail_cache", None)
     if cache is None:
-        import os
-
         max_mb = float(os.environ.get("THUMBNAIL_CACHE_MB", "100"))
-        cache = LRUThumbnailCache(int(max_mb * 1024 * 1024))
-        request.app.state.thumbnail_cache = cache
+        cache = create_thumbnail_cache(
+            int(max_mb * 1024 * 1024), Path(state.photos_dir)
+        )
+        state.thumbnail_cache = cache
+    pool = getattr(state, "thumbnail_pool", None)
+    disk_cache = getattr(state, "thumbnail_disk_cache", None)
+    flights = getattr(state, "thumbnail_flights", None)
+    if pool is not None and pool.workers > 0:
+        return await get_or_create_thumbnail_async(
+            state.photos_dir,
+            photo_hash,
+            filename,
+            cache,
+            pool.submit,
+            size,
+            disk_cache=disk_cache,
+            fmt=fmt,
+            flights=flights,
+        )
+    return await run_in_threadpool(
+        get_or_create_thumbnail,
+        state.photos_dir,
+        photo_hash,
+        filename,
+        cache,
+        size,
+        disk_cache=disk_cache,
+        fmt=fmt,
+        flights=flights,
+        render=pool.render if pool is not None else None,
+    )
+
+
+BATCH_FRAME_LENGTH = struct.Struct(">I")
+
+
+def encode_batch_frame(header: dict[str, Any], payload: bytes = b"") -> bytes:
+    """
+    One entry of a thumbnail batch: a 4-byte big-endian length and a JSON header,
+    then a 4-byte big-endian length and the thumbnail bytes.
+    """
+    raw = json.dumps(header).encode()
+    return (
+        BATCH_FRAME_LENGTH.pack(len(raw))
+        + raw
+        + BATCH_FRAME_LENGTH.pack(len(payload))
+        + payload
+    )
+
+
+@router.post(
+    "/photos/thumbnails",
+    operation_id="get_photo_thumbnails",
+    response_class=StreamingResponse,
+)
+async def get_photo_thumbnails(
+    request: Request,
+    batch: ThumbnailBatchRequest = Body(ThumbnailBatchRequest()),
+    size: int = Query(THUMBNAIL_SIZE, description="Long edge in pixels"),
+    db: Session = Depends(get_session),
+) -> StreamingResponse:
+    """
+    Stream the thumbnails of the given hashes, or of one page of GET /photos,
+    as length-prefixed frames (see encode_batch_frame) in completion order.
+
+    Each frame header has the hash, a status (200, 404, 500 or 503) and, for 200,
+    the content type and ETag. For pages, X-Next-Cursor is set as in GET /photos.
+    """
+    check_thumbnail_size(size)
+    fmt = negotiate_thumbnail_format(request.headers.get("accept"))
+    headers = {"Vary": "Accept"}
+    if batch.hashes is not None:
+        hashes = list(dict.fromkeys(batch.hashes))
+        photos = await run_in_threadpool(get_photos_by_hashes, db, hashes)
+        found = {h: photos[h].filename_value for h in hashes if h in photos}
+    else:
+        after = (
+            decode_cursor(batch.cursor, batch.sort, batch.order)
+            if batch.cursor
+            else None
+        )
+        page, next_key = await run_in_threadpool(
+            get_photos_page,
+            db,
+            batch.limit,
+            batch.sort,
+            batch.order == "desc",
+            after,
+            batch.captioned,
+            batch.prefix,
+        )
+        hashes = [p.hash_value for p in page]
+        found = {p.hash_value: p.filename_value for p in page}
+        if next_key is not None:
+            headers["X-Next-Cursor"] = encode_cursor(batch.sort, batch.order, next_key)
+    # The frames only need the filenames; free the connection while they render
+    await run_in_threadpool(db.close)
+    state = request.app.state
+    # Bounded so a large batch cannot take over the shared threadpool
+    limiter = asyncio.Semaphore(THUMBNAIL_BATCH_CONCURRENCY)
+
+    async def fetch(photo_hash: str) -> bytes:
+        header: dict[str, Any] = {"hash": photo_hash}
+        if photo_hash not in found:
+            return encode_batch_frame({**header, "status": 404})
+        try:
+            async with limiter:
+                thumb = await load_thumbnail(
+                    state, photo_hash, found[photo_hash], size, fmt
+                )
+        except FileNotFoundError:
+            return encode_batch_frame(
+                {**header, "status": 404, "detail": "Image file not found."}
+            )
+        except ThumbnailPoolBusy:
+            return encode_batch_frame({**header, "status": 503})
+        except Exception as e:
+            return encode_batch_frame({**header, "status": 500, "detail": str(e)})
+        return encode_batch_frame(
+            {
+                **header,
+                "status": 200,
+                "content_type": THUMBNAIL_FORMATS[fmt][1],
+                "etag": make_etag(photo_hash, size, fmt),
+            },
+            thumb,
+        )
+
+    async def frames() -> AsyncIterator[bytes]:
+        tasks = [asyncio.ensure_future(fetch(h)) for h in hashes]
+        try:
+            for next_frame in asyncio.as_completed(tasks):
+                yield await next_frame
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        frames(), media_type=THUMBNAIL_BATCH_MEDIA_TYPE, headers=headers
+    )
+
+
+@router.get("/photos/{hash}/thumbnail", operation_id="get_photo_thumbnail")
+async def get_photo_thumbnail(
+    request: Request,
+    hash: str,
+    size: int = Query(THUMBNAIL_SIZE, description="Long edge in pixels"),
+    db: Session = Depends(get_session),
+) -> Response:
+    check_thumbnail_size(size)
+    fmt = negotiate_thumbnail_format(request.headers.get("accept"))
+    etag = make_etag(hash, size, fmt)
+    if if_none_match(request, etag):
+        return not_modified(etag, vary="Accept")
+    photo = await run_in_threadpool(get_photo_by_hash, db, hash)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found.")
+    photo_hash, filename = photo.hash_value, photo.filename_value
+    # Hand the pooled connection back before a render that may take a while
+    await run_in_threadpool(db.close)
     try:
-        thumb_bytes = get_or_create_thumbnail(
-            photos_dir, photo.hash_value, photo.filename_value, cache
+        thumb_bytes = await load_thumbnail(
+            request.app.state, photo_hash, filename, size, fmt
         )
     except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Image file not found.")
+    except ThumbnailPoolBusy:
+        raise HTTPException(
+            status_code=503,
+            detail="Thumbnail queue is full; retry shortly.",
+            headers={"Retry-After": "1"},
+        )
     except UnidentifiedImageError as e:
         raise HTTPException(status_code=500, detail=f"Thumbnail error: {e}")
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Thumbnail error: {e}")
     from fastapi.responses import Response
 
-    return Response(content=thumb_bytes, media_type="image/jpeg")
+    return Response(
+        content=thumb_bytes,
+        media_type=THUMBNAIL_FORMATS[fmt][1],
+        headers=cache_headers(etag, vary="Accept"),
+    )
@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional
+from pydantic import BaseModel, Field
+from typing import Literal, Optional
 
 
 class LoginRequest(BaseModel):
@@ -10,3 +10,47 @@ class PhotoResponse(BaseModel):
     hash: str
     filename: str
     caption: Optional[str] = None
+
+
+class RescanStartResponse(BaseModel):
+    detail: str
+    job_id: str
+
+
+class RescanJobResponse(BaseModel):
+    job_id: str
+    status: str
+    files_seen: int
+    files_hashed: int
+    files_added: int
+    elapsed: float
+    error: Optional[str] = None
+
+
+class BulkIngestResult(BaseModel):
+    filename: str
+    status: Literal["added", "duplicate", "rejected", "error"]
+    hash: Optional[str] = None
+    detail: Optional[str] = None
+
+
+class BulkIngestResponse(BaseModel):
+    added: int
+    duplicate: int
+    rejected: int
+    error: int
+    results: list[BulkIngestResult]
+
+
+class ThumbnailBatchRequest(BaseModel):
+    """
+    Either explicit hashes, or a page of GET /photos (same cursor and filters).
+    """
+
+    hashes: Optional[list[str]] = Field(default=None, max_length=1000)
+    cursor: Optional[str] = None
+    limit: int = Field(default=100, ge=1, le=1000)
+    captioned: Optional[bool] = None
+    prefix: Optional[str] = None
+    sort: Literal["filename", "hash"] = "filename"
+    order: Literal["asc", "desc"] = "asc"
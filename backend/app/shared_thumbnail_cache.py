@@ -0,0 +1,281 @@
+from pathlib import Path
+from typing import Any, Optional
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+MAGIC = b"CAPTHMB1"
+# magic, index slots, data capacity, write position, entries stored
+HEADER = struct.Struct("<8sQQQQ")
+HEADER_BYTES = 64
+HEAD_OFFSET = 24
+PUTS_OFFSET = 32
+# key digest, log position + 1 (0 marks an empty slot), length
+SLOT = struct.Struct("<16sQI4x")
+POSITION = struct.Struct("<Q")
+# Slots probed per key; when all are live, the oldest of them is replaced
+MAX_PROBE = 8
+# A key's probe window, read with one unpack
+WINDOW = struct.Struct("<" + "16sQI4x" * MAX_PROBE)
+# A hit on an entry in the oldest quarter of the ring copies it to the front
+PROMOTE_FRACTION = 0.25
+
+
+class FileLock:
+    """
+    Exclusive lock across processes (flock on a shared file) and across the
+    threads of this one, which an flock on a shared descriptor does not give.
+    """
+
+    def __init__(self, fd: int) -> None:
+        self.fd = fd
+        self.thread_lock = threading.Lock()
+
+    def __enter__(self) -> None:
+        self.thread_lock.acquire()
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        except BaseException:
+            self.thread_lock.release()
+            raise
+
+    def __exit__(self, *exc: Any) -> None:
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        finally:
+            self.thread_lock.release()
+
+
+def default_shared_cache_path(photos_dir: Path) -> Path:
+    """
+    Pack file in shared memory (/dev/shm when available), named after the photos
+    folder so that separate libraries on one machine get separate caches.
+    """
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() else Path(tempfile.gettempdir())
+    folder = str(Path(photos_dir).resolve()).encode()
+    name = hashlib.blake2b(folder, digest_size=8).hexdigest()
+    return base / f"captioner-thumbnails-{name}.pack"
+
+
+class SharedThumbnailCache:
+    """
+    Thumbnail cache in a memory-mapped pack file, shared by every process that
+    opens the same path, so several uvicorn workers hold and render each
+    thumbnail once instead of once per worker.
+
+    The file holds a header, a fixed open-addressing index of key digests and a
+    ring buffer of thumbnail bytes. New entries are appended at the write
+    position, overwriting the oldest ones; a hit on an entry close to being
+    overwritten appends it again, so thumbnails in use survive wrap-around.
+    Access is serialised across processes by an flock on the file, and a read
+    copies the bytes out while holding it, so no other worker can overwrite a
+    thumbnail while it is being served.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        max_bytes: int = 100 * 1024 * 1024,
+        average_entry_bytes: int = 16 * 1024,
+    ) -> None:
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        # Twice as many slots as expected entries keeps probe chains short
+        wanted = max(64, 2 * max_bytes // average_entry_bytes)
+        self.slots = 1 << (wanted - 1).bit_length()
+        self.index_start = HEADER_BYTES
+        # Spare slots past the end, so probe windows never wrap
+        self.data_start = HEADER_BYTES + (self.slots + MAX_PROBE - 1) * SLOT.size
+        size = self.data_start + max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        expected = (MAGIC, self.slots, max_bytes)
+        while True:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            self.lock = FileLock(self.fd)
+            try:
+                with self.lock:
+                    if self._opened_file_replaced():
+                        os.close(self.fd)
+                        continue
+                    header = os.pread(self.fd, HEADER.size, 0)
+                    if (
+                        os.fstat(self.fd).st_size == size
+                        and len(header) == HEADER.size
+                        and HEADER.unpack(header)[:3] == expected
+                    ):
+                        self.map = mmap.mmap(self.fd, size)
+                        return
+                    # New file, or one laid out for another size that other
+                    # processes may still have mapped: shrinking it under them
+                    # would crash them with SIGBUS, so a fresh file takes its
+                    # place and they keep the old one until they exit
+                    self._replace_file(size, HEADER.pack(*expected, 0, 0))
+            except BaseException:
+                os.close(self.fd)
+                raise
+            os.close(self.fd)
+
+    def _opened_file_replaced(self) -> bool:
+        """
+        Whether self.fd no longer is the file at self.path, because another
+        process replaced it while this one waited for the lock.
+        """
+        try:
+            current = os.stat(self.path)
+        except FileNotFoundError:
+            return True
+        opened = os.fstat(self.fd)
+        return (current.st_dev, current.st_ino) != (opened.st_dev, opened.st_ino)
+
+    def _replace_file(self, size: int, header: bytes) -> None:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path.parent, prefix=f".{self.path.name}-", suffix=".tmp"
+        )
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, header, 0)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        finally:
+            os.close(fd)
+
+    def _read_counter(self, offset: int) -> int:
+        return POSITION.unpack_from(self.map, offset)[0]
+
+    def _write_counter(self, offset: int, value: int) -> None:
+        POSITION.pack_into(self.map, offset, value)
+
+    @staticmethod
+    def _digest(key: str) -> bytes:
+        return hashlib.blake2b(key.encode(), digest_size=16).digest()
+
+    def _window(self, digest: bytes) -> tuple[int, tuple[Any, ...]]:
+        """
+        First slot of the key's probe window, and the window's slot fields.
+        """
+        home = int.from_bytes(digest[:8], "little") & (self.slots - 1)
+        offset = self.index_start + home * SLOT.size
+        return home, WINDOW.unpack_from(self.map, offset)
+
+    def _live(self, stored: int, head: int) -> bool:
+        # Bytes older than one ring's length have been overwritten
+        return stored != 0 and stored - 1 >= head - self.max_bytes
+
+    def _find(self, digest: bytes, head: int) -> Optional[tuple[int, int, int]]:
+        home, fields = self._window(digest)
+        for i in range(MAX_PROBE):
+            if fields[3 * i] == digest:
+                stored, length = fields[3 * i + 1], fields[3 * i + 2]
+                if self._live(stored, head):
+                    return home + i, stored - 1, length
+        return None
+
+    def _free_slot(self, digest: bytes, head: int) -> int:
+        home, fields = self._window(digest)
+        stored = fields[1::3]
+        for i in range(MAX_PROBE):
+            if not self._live(stored[i], head):
+                return home + i
+        return home + stored.index(min(stored))
+
+    def _append(self, index: int, digest: bytes, value: bytes) -> None:
+        head = self._read_counter(HEAD_OFFSET)
+        offset = head % self.max_bytes
+        if offset + len(value) > self.max_bytes:
+            # Entries never wrap; skip the tail of the ring
+            head += self.max_bytes - offset
+            offset = 0
+        start = self.data_start + offset
+        self.map[start : start + len(value)] = value
+        SLOT.pack_into(
+            self.map,
+            self.index_start + index * SLOT.size,
+            digest,
+            head + 1,
+            len(value),
+        )
+        self._write_counter(HEAD_OFFSET, head + len(value))
+
+    def get(self, key: str) -> Optional[bytes]:
+        digest = self._digest(key)
+        with self.lock:
+            head = self._read_counter(HEAD_OFFSET)
+            found = self._find(digest, head)
+            if found is None:
+                self.misses += 1
+                return None
+            index, position, length = found
+            start = self.data_start + position % self.max_bytes
+            value = self.map[start : start + length]
+            if position < head - self.max_bytes * (1 - PROMOTE_FRACTION):
+                self._append(index, digest, value)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        digest = self._digest(key)
+        with self.lock:
+            head = self._read_counter(HEAD_OFFSET)
+            # Keys are content-addressed, so a copy stored by another worker
+            # is the same thumbnail
+            if self._find(digest, head) is not None:
+                return
+            self._append(self._free_slot(digest, head), digest, value)
+            self._write_counter(PUTS_OFFSET, self._read_counter(PUTS_OFFSET) + 1)
+
+    def __contains__(self, key: str) -> bool:
+        digest = self._digest(key)
+        with self.lock:
+            return self._find(digest, self._read_counter(HEAD_OFFSET)) is not None
+
+    def _usage(self) -> tuple[int, int, int]:
+        with self.lock:
+            head = self._read_counter(HEAD_OFFSET)
+            puts = self._read_counter(PUTS_OFFSET)
+            index = self.map[self.index_start : self.data_start]
+        entries = 0
+        used = 0
+        for _, stored, length in SLOT.iter_unpack(index):
+            if self._live(stored, head):
+                entries += 1
+                used += length
+        return entries, used, puts
+
+    @property
+    def entries(self) -> int:
+        return self._usage()[0]
+
+    @property
+    def current_bytes(self) -> int:
+        return self._usage()[1]
+
+    @property
+    def evictions(self) -> int:
+        """
+        Entries stored by any process and since overwritten, for all processes.
+        """
+        entries, _, puts = self._usage()
+        return puts - entries
+
+    def clear(self) -> None:
+        with self.lock:
+            self.map[self.index_start : self.data_start] = bytes(
+                self.data_start - self.index_start
+            )
+            self._write_counter(HEAD_OFFSET, 0)
+            self._write_counter(PUTS_OFFSET, 0)
+
+    def close(self) -> None:
+        self.map.close()
+        os.close(self.fd)
@@ -0,0 +1,137 @@
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Optional
+import logging
+import multiprocessing
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class ThumbnailPoolBusy(Exception):
+    """
+    Raised when the render queue is full; the caller should retry later.
+    """
+
+
+def _render_in_worker(
+    image_path: Path, max_size: int, fmt: str, **options: bool
+) -> bytes:
+    from app.image_utils import generate_thumbnail
+
+    return generate_thumbnail(image_path, max_size, fmt, **options)
+
+
+def get_thumbnail_workers() -> int:
+    default = min(4, os.cpu_count() or 1)
+    return max(0, int(os.environ.get("THUMBNAIL_WORKERS", default)))
+
+
+def get_thumbnail_queue_size(workers: int) -> int:
+    return max(1, int(os.environ.get("THUMBNAIL_QUEUE_SIZE", max(1, workers) * 8)))
+
+
+class ThumbnailPool:
+    """
+    Renders thumbnails in worker processes, so Pillow decodes neither hold the
+    server's GIL nor tie up the threadpool that serves cheap routes.
+
+    At most `queue_size` renders may be running or waiting at once; render()
+    raises ThumbnailPoolBusy beyond that instead of letting the backlog grow.
+    With workers=0, thumbnails are rendered in the calling thread.
+    The process pool is started on first use and restarted if a worker dies.
+    """
+
+    def __init__(self, workers: int, queue_size: int) -> None:
+        self.workers = workers
+        self.queue_size = queue_size
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.lock = threading.Lock()
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self.lock:
+            if self.executor is None:
+                # Forking a threaded server can deadlock the child; use a clean
+                # forkserver (or spawn) process instead
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    # Workers fork from a server that has already imported Pillow
+                    context.set_forkserver_preload(["app.image_utils"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=context
+                )
+            return self.executor
+
+    def submit(
+        self, image_path: Path, max_size: int, fmt: str, **options: bool
+    ) -> Future[bytes]:
+        """
+        Start a render like generate_thumbnail (passing on its keyword options)
+        and return its future, so that callers on the event loop can await it
+        (asyncio.wrap_future) without holding a thread. With workers=0 the
+        render runs in the calling thread and the future is already done.
+        """
+        from app import image_utils
+
+        if not self.slots.acquire(blocking=False):
+            raise ThumbnailPoolBusy("Thumbnail queue is full.")
+        if self.workers == 0:
+            future: Future[bytes] = Future()
+            try:
+                future.set_result(
+                    image_utils.generate_thumbnail(image_path, max_size, fmt, **options)
+                )
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.slots.release()
+            return future
+        try:
+            executor = self._get_executor()
+            future = executor.submit(
+                _render_in_worker, image_path, max_size, fmt, **options
+            )
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self._finished(executor, done))
+        return future
+
+    def _finished(self, executor: ProcessPoolExecutor, future: Future[bytes]) -> None:
+        self.slots.release()
+        if future.cancelled() or not isinstance(future.exception(), BrokenProcessPool):
+            return
+        logger.error("Thumbnail worker died; restarting the pool")
+        with self.lock:
+            if self.executor is executor:
+                self.executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def render(
+        self, image_path: Path, max_size: int, fmt: str, **options: bool
+    ) -> bytes:
+        """
+        Render like generate_thumbnail, passing on its keyword options, and
+        wait for the result. Blocks a thread; see submit.
+        """
+        return self.submit(image_path, max_size, fmt, **options).result()
+
+    def shutdown(self) -> None:
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def create_thumbnail_pool() -> ThumbnailPool:
+    """
+    Build the pool from THUMBNAIL_WORKERS (0 renders in-process) and
+    THUMBNAIL_QUEUE_SIZE.
+    """
+    workers = get_thumbnail_workers()
+    return ThumbnailPool(workers, get_thumbnail_queue_size(workers))
@@ -0,0 +1,211 @@
+from pathlib import Path
+from typing import Any, Optional
+from app.image_utils import (
+    NewPhotos,
+    get_or_create_thumbnail,
+    get_thumbnail_formats,
+    thumbnail_cache_key,
+)
+from app.thumbnail_pool import ThumbnailPoolBusy
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityMonitor:
+    """
+    Counts in-flight HTTP requests so background work can yield to them.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.active = 0
+        self.last_finished = 0.0
+
+    def started(self) -> None:
+        with self.lock:
+            self.active += 1
+
+    def finished(self) -> None:
+        with self.lock:
+            self.active -= 1
+            self.last_finished = time.monotonic()
+
+    def idle_for(self) -> float:
+        """
+        Seconds since the last request finished, or 0.0 while one is running.
+        """
+        with self.lock:
+            if self.active:
+                return 0.0
+            return time.monotonic() - self.last_finished
+
+
+class ActivityMiddleware:
+    """
+    ASGI middleware reporting every HTTP request to an ActivityMonitor.
+    """
+
+    def __init__(self, app: Any, monitor: ActivityMonitor) -> None:
+        self.app = app
+        self.monitor = monitor
+
+    async def __call__(self, scope: Any, receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        self.monitor.started()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.monitor.finished()
+
+
+class ThumbnailPrewarmer:
+    """
+    Renders thumbnails for newly added photos on a low-priority background thread.
+
+    Photos are taken uncaptioned first, then most recently queued first. Work
+    pauses until no request has been running for `idle_delay` seconds, and after
+    each render the thread sleeps long enough to keep its share of wall time at
+    `cpu_budget` (0-1). Thumbnails are written to the disk tier only when one
+    exists, so a large import does not push hot entries out of the memory cache.
+    """
+
+    def __init__(
+        self,
+        app_state: Any,
+        sizes: tuple[int, ...] = (256,),
+        cpu_budget: float = 0.25,
+        idle_delay: float = 1.0,
+        monitor: Optional[ActivityMonitor] = None,
+    ) -> None:
+        self.app_state = app_state
+        self.sizes = sizes
+        self.cpu_budget = cpu_budget
+        self.idle_delay = idle_delay
+        self.monitor = monitor or ActivityMonitor()
+        self.lock = threading.Lock()
+        self.wakeup = threading.Condition(self.lock)
+        # (captioned, -sequence, sha256, filename); heapq pops the smallest
+        self.queue: list[tuple[bool, int, str, str]] = []
+        self.queued: set[str] = set()
+        self.sequence = itertools.count()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.warmed = 0
+
+    def enqueue(self, photos: NewPhotos) -> None:
+        with self.lock:
+            for sha256, filename, captioned in photos:
+                if sha256 in self.queued:
+                    continue
+                self.queued.add(sha256)
+                heapq.heappush(
+                    self.queue, (captioned, -next(self.sequence), sha256, filename)
+                )
+            self.wakeup.notify()
+
+    def start(self) -> None:
+        self.stop_event.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="thumbnail-prewarm", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self.stop_event.set()
+        with self.lock:
+            self.wakeup.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+
+    def _next(self) -> Optional[tuple[str, str, bool]]:
+        with self.lock:
+            while not self.queue and not self.stop_event.is_set():
+                self.wakeup.wait()
+            if self.stop_event.is_set():
+                return None
+            captioned, _, sha256, filename = heapq.heappop(self.queue)
+            self.queued.discard(sha256)
+            return sha256, filename, captioned
+
+    def _wait_for_idle(self) -> bool:
+        while not self.stop_event.is_set():
+            idle = self.monitor.idle_for()
+            if idle >= self.idle_delay:
+                return True
+            self.stop_event.wait(self.idle_delay - idle if idle else self.idle_delay)
+        return False
+
+    def _run(self) -> None:
+        while (item := self._next()) is not None:
+            sha256, filename, captioned = item
+            for size in self.sizes:
+                if not self._wait_for_idle():
+                    return
+                started = time.perf_counter()
+                try:
+                    self.warm(sha256, filename, size)
+                except ThumbnailPoolBusy:
+                    # Foreground renders have the pool; try again later
+                    self.enqueue([(sha256, filename, captioned)])
+                    self.stop_event.wait(self.idle_delay)
+                    break
+                except Exception as e:
+                    logger.warning(f"Could not pre-warm thumbnail for {sha256}: {e}")
+                    break
+                spent = time.perf_counter() - started
+                self.stop_event.wait(spent * (1 - self.cpu_budget) / self.cpu_budget)
+
+    def warm(self, sha256: str, filename: str, size: int) -> bool:
+        """
+        Render one thumbnail into the cache unless it is already there.
+        """
+        state = self.app_state
+        fmt = get_thumbnail_formats()[0]
+        key = thumbnail_cache_key(sha256, size, fmt)
+        cache = state.thumbnail_cache
+        disk_cache = getattr(state, "thumbnail_disk_cache", None)
+        if key in cache or (disk_cache is not None and key in disk_cache):
+            return False
+        pool = getattr(state, "thumbnail_pool", None)
+        get_or_create_thumbnail(
+            Path(state.photos_dir),
+            sha256,
+            filename,
+            cache,
+            size,
+            disk_cache=disk_cache,
+            fmt=fmt,
+            flights=getattr(state, "thumbnail_flights", None),
+            render=pool.render if pool is not None else None,
+            store_in_memory=disk_cache is None,
+        )
+        self.warmed += 1
+        return True
+
+
+def create_prewarmer(
+    app_state: Any, monitor: ActivityMonitor
+) -> Optional[ThumbnailPrewarmer]:
+    """
+    Build a prewarmer from THUMBNAIL_PREWARM_CPU (share of wall time, 0 disables)
+    and THUMBNAIL_PREWARM_SIZES.
+    """
+    cpu_budget = float(os.environ.get("THUMBNAIL_PREWARM_CPU", "0.25"))
+    if cpu_budget <= 0:
+        return None
+    sizes = os.environ.get("THUMBNAIL_PREWARM_SIZES", "256")
+    return ThumbnailPrewarmer(
+        app_state,
+        sizes=tuple(int(size) for size in sizes.split(",") if size.strip()),
+        cpu_budget=min(cpu_budget, 1.0),
+        monitor=monitor,
+    )
@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from typing import Optional
+import threading
+
+MASK64 = (1 << 64) - 1
+# Odd 64-bit multipliers, one per sketch row
+SKETCH_SEEDS = (
+    0x9E3779B97F4A7C15,
+    0xC2B2AE3D27D4EB4F,
+    0x165667B19E3779F9,
+    0xD6E8FEB86659FD93,
+)
+# Byte value -> half of it, for aging sketch rows with bytes.translate
+HALVE = bytes(count >> 1 for count in range(256))
+# Each shard gets at least this much of the budget, so small caches use fewer shards
+MIN_SHARD_BYTES = 4 * 1024 * 1024
+
+
+class CountMinSketch:
+    """
+    Approximate access counts in fixed memory: 4-bit saturating counters in 4 rows.
+
+    Once `sample_size` increments have been recorded, every counter is halved, so
+    the sketch follows the recent popularity of keys rather than all-time counts.
+    Not thread-safe; each cache shard guards its own sketch.
+    """
+
+    def __init__(self, width: int) -> None:
+        self.bits = max(4, (width - 1).bit_length())
+        self.rows = [bytearray(1 << self.bits) for _ in SKETCH_SEEDS]
+        self.sample_size = 10 * (1 << self.bits)
+        self.additions = 0
+
+    def _indexes(self, key: str) -> tuple[int, ...]:
+        h = hash(key) & MASK64
+        shift = 64 - self.bits
+        return tuple(((h * seed) & MASK64) >> shift for seed in SKETCH_SEEDS)
+
+    def increment(self, key: str) -> None:
+        for row, i in zip(self.rows, self._indexes(key)):
+            if row[i] < 15:
+                row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._age()
+
+    def estimate(self, key: str) -> int:
+        return min(row[i] for row, i in zip(self.rows, self._indexes(key)))
+
+    def _age(self) -> None:
+        for row in self.rows:
+            row[:] = row.translate(HALVE)
+        self.additions //= 2
+
+
+class _Shard:
+    """
+    One lock's worth of the cache, laid out as in W-TinyLFU: new entries land in
+    a small LRU window; entries leaving the window must beat the main area's
+    eviction victim on estimated frequency to be admitted. The main area is a
+    segmented LRU (probation, then protected once hit again).
+    """
+
+    def __init__(self, max_bytes: int, window_ratio: float, sketch_width: int):
+        self.lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.window_max = max(1, int(max_bytes * window_ratio))
+        self.protected_max = int((max_bytes - self.window_max) * 0.8)
+        self.window: OrderedDict[str, bytes] = OrderedDict()
+        self.probation: OrderedDict[str, bytes] = OrderedDict()
+        self.protected: OrderedDict[str, bytes] = OrderedDict()
+        self.window_bytes = 0
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+        self.sketch = CountMinSketch(sketch_width)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @property
+    def current_bytes(self) -> int:
+        return self.window_bytes + self.probation_bytes + self.protected_bytes
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            self.sketch.increment(key)
+            if key in self.window:
+                self.window.move_to_end(key)
+                value = self.window[key]
+            elif key in self.protected:
+                self.protected.move_to_end(key)
+                value = self.protected[key]
+            elif key in self.probation:
+                value = self.probation.pop(key)
+                self.probation_bytes -= len(value)
+                self._protect(key, value)
+            else:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def _protect(self, key: str, value: bytes) -> None:
+        self.protected[key] = value
+        self.protected_bytes += len(value)
+        while self.protected_bytes > self.protected_max and len(self.protected) > 1:
+            demoted, demoted_value = self.protected.popitem(last=False)
+            self.protected_bytes -= len(demoted_value)
+            self.probation[demoted] = demoted_value
+            self.probation_bytes += len(demoted_value)
+
+    def _discard(self, key: str) -> None:
+        for area, attr in (
+            (self.window, "window_bytes"),
+            (self.probation, "probation_bytes"),
+            (self.protected, "protected_bytes"),
+        ):
+            if key in area:
+                setattr(self, attr, getattr(self, attr) - len(area.pop(key)))
+                return
+
+    def put(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            self._discard(key)
+            self.window[key] = value
+            self.window_bytes += len(value)
+            while self.window_bytes > self.window_max and len(self.window) > 1:
+                candidate, candidate_value = self.window.popitem(last=False)
+                self.window_bytes -= len(candidate_value)
+                self._admit(candidate, candidate_value)
+            # A single oversized window entry can still push the total over budget
+            while self.current_bytes > self.max_bytes:
+                self._evict_one()
+
+    def _admit(self, key: str, value: bytes) -> None:
+        frequency = self.sketch.estimate(key)
+        # Make room in the main area, but only by evicting less popular entries
+        while self.current_bytes + len(value) > self.max_bytes:
+            area = self.probation or self.protected
+            if not area:
+                break
+            victim = next(iter(area))
+            if frequency <= self.sketch.estimate(victim):
+                self.evictions += 1  # the candidate loses
+                return
+            self._discard(victim)
+            self.evictions += 1
+        self.probation[key] = value
+        self.probation_bytes += len(value)
+
+    def _evict_one(self) -> None:
+        area = self.probation or self.protected or self.window
+        self._discard(next(iter(area)))
+        self.evictions += 1
+
+    def __contains__(self, key: str) -> bool:
+        with self.lock:
+            return key in self.window or key in self.probation or key in self.protected
+
+    def __len__(self) -> int:
+        with self.lock:
+            return len(self.window) + len(self.probation) + len(self.protected)
+
+    def clear(self) -> None:
+        with self.lock:
+            for area in (self.window, self.probation, self.protected):
+                area.clear()
+            self.window_bytes = self.probation_bytes = self.protected_bytes = 0
+
+
+class ShardedTinyLFUCache:
+    """
+    Thumbnail cache with the same interface as LRUThumbnailCache, built for many
+    concurrent requests and scan-heavy access patterns.
+
+    Keys are spread over `shards` independently locked segments by hash, so
+    lookups for different thumbnails rarely wait on each other. Each shard uses
+    a W-TinyLFU-style policy: a one-off sweep through the library cannot push
+    out thumbnails that are requested repeatedly, because new entries are only
+    admitted over more popular ones.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = 100 * 1024 * 1024,
+        shards: int = 16,
+        window_ratio: float = 0.01,
+        average_entry_bytes: int = 16 * 1024,
+    ) -> None:
+        # Power of two, and no more shards than the budget can sensibly split into
+        shards = max(1, min(shards, max_bytes // MIN_SHARD_BYTES))
+        shards = 1 << (shards.bit_length() - 1)
+        self.max_bytes = max_bytes
+        shard_bytes = max_bytes // shards
+        # Room to count several times the number of entries a shard can hold
+        sketch_width = max(16, 4 * shard_bytes // average_entry_bytes)
+        self.shards = [
+            _Shard(shard_bytes, window_ratio, sketch_width) for _ in range(shards)
+        ]
+
+    def _shard(self, key: str) -> _Shard:
+        return self.shards[hash(key) & (len(self.shards) - 1)]
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self._shard(key).get(key)
+
+    def put(self, key: str, value: bytes) -> None:
+        self._shard(key).put(key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._shard(key)
+
+    def clear(self) -> None:
+        for shard in self.shards:
+            shard.clear()
+
+    @property
+    def current_bytes(self) -> int:
+        return sum(shard.current_bytes for shard in self.shards)
+
+    @property
+    def entries(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    @property
+    def hits(self) -> int:
+        return sum(shard.hits for shard in self.shards)
+
+    @property
+    def misses(self) -> int:
+        return sum(shard.misses for shard in self.shards)
+
+    @property
+    def evictions(self) -> int:
+        return sum(shard.evictions for shard in self.shards)
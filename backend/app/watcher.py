@@ -0,0 +1,361 @@
+from pathlib import Path, PurePosixPath
+from typing import Optional, Protocol
+from sqlalchemy.orm import Session, sessionmaker
+from app.image_utils import (
+    NewPhotosCallback,
+    iter_photo_files,
+    scan_photos_folder_on_startup,
+    sync_photos_folder_paths,
+)
+from app.photo_layout import is_shard_dir
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# From <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (
+    IN_MODIFY
+    | IN_ATTRIB
+    | IN_CLOSE_WRITE
+    | IN_MOVED_FROM
+    | IN_MOVED_TO
+    | IN_CREATE
+    | IN_DELETE
+    | IN_DELETE_SELF
+    | IN_MOVE_SELF
+)
+EVENT_HEADER = struct.Struct("iIII")
+
+# Returned by a backend instead of names when it lost track of the folder
+RESCAN = None
+
+
+class WatchBackend(Protocol):
+    def poll(self, timeout: float) -> Optional[set[str]]:
+        """
+        Wait up to timeout seconds; return changed file paths relative to the
+        photos folder, or RESCAN.
+        """
+        ...
+
+    def wake(self) -> None:
+        """
+        Make a blocked poll() return early.
+        """
+        ...
+
+    def close(self) -> None: ...
+
+
+class InotifyBackend:
+    """
+    Linux inotify on the photos folder and its shard folders (ab/ and ab/cd/, see
+    iter_photo_files), called through libc with ctypes. Shard folders created
+    later are watched as they appear.
+    """
+
+    def __init__(self, photos_dir: Path) -> None:
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError("libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available")
+        self.libc = libc
+        self.photos_dir = photos_dir
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        # Watch descriptor -> watched folder relative to photos_dir ("" is the top)
+        self.watches: dict[int, str] = {}
+        try:
+            self._watch("")
+        except OSError:
+            os.close(self.fd)
+            raise
+        self.wake_r, self.wake_w = os.pipe()
+
+    def _watch(self, folder: str) -> set[str]:
+        """
+        Watch folder and the shard folders below it. Returns the image files
+        already in them, which may have arrived before the watches did.
+        """
+        path = self.photos_dir / folder
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            if folder and error == errno.ENOENT:
+                return set()  # Removed again before it could be watched
+            raise OSError(error, f"inotify_add_watch failed for {path}")
+        self.watches[wd] = folder
+        depth = len(PurePosixPath(folder).parts)
+        names: set[str] = set()
+        try:
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    name = f"{folder}/{entry.name}" if folder else entry.name
+                    if depth < 2 and is_shard_dir(entry.name) and entry.is_dir():
+                        names |= self._watch(name)
+                    elif depth != 1:
+                        names.add(name)
+        except FileNotFoundError:
+            pass
+        return names
+
+    def poll(self, timeout: float) -> Optional[set[str]]:
+        readable, _, _ = select.select([self.fd, self.wake_r], [], [], timeout)
+        if self.fd not in readable:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        names: set[str] = set()
+        offset = 0
+        while offset + EVENT_HEADER.size <= len(data):
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+            offset += EVENT_HEADER.size
+            raw_name = data[offset : offset + length].rstrip(b"\0")
+            offset += length
+            if mask & IN_Q_OVERFLOW:
+                return RESCAN
+            folder = self.watches.get(wd)
+            if mask & IN_IGNORED:
+                self.watches.pop(wd, None)
+            if folder == "" and mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                return RESCAN
+            if mask & IN_MOVE_SELF:
+                # A shard folder moved away took its files along unreported
+                return RESCAN
+            if folder is None or not raw_name:
+                continue
+            name = os.fsdecode(raw_name)
+            path = f"{folder}/{name}" if folder else name
+            depth = len(PurePosixPath(folder).parts)
+            if mask & IN_ISDIR:
+                if (
+                    mask & (IN_CREATE | IN_MOVED_TO)
+                    and depth < 2
+                    and is_shard_dir(name)
+                ):
+                    names |= self._watch(path)
+            elif depth != 1:
+                names.add(path)
+        return names
+
+    def wake(self) -> None:
+        os.write(self.wake_w, b"\0")
+
+    def close(self) -> None:
+        for fd in (self.fd, self.wake_r, self.wake_w):
+            os.close(fd)
+
+
+class PollingBackend:
+    """
+    Portable fallback: diff (size, mtime_ns, inode) snapshots of the folder and
+    its shard folders.
+
+    Only os.scandir metadata is read; file contents are never touched.
+    """
+
+    def __init__(
+        self,
+        photos_dir: Path,
+        interval: float,
+        stop_event: Optional[threading.Event] = None,
+    ) -> None:
+        self.photos_dir = photos_dir
+        self.interval = interval
+        self.stop_event = stop_event or threading.Event()
+        self.snapshot = self._snapshot()
+        self.next_poll = time.monotonic() + interval
+
+    def _snapshot(self) -> dict[str, tuple[int, int, int]]:
+        snapshot: dict[str, tuple[int, int, int]] = {}
+        try:
+            for name, entry in iter_photo_files(self.photos_dir):
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    continue
+                snapshot[name] = (st.st_size, st.st_mtime_ns, st.st_ino)
+        except FileNotFoundError:
+            pass
+        return snapshot
+
+    def poll(self, timeout: float) -> Optional[set[str]]:
+        wait = min(timeout, max(0.0, self.next_poll - time.monotonic()))
+        if self.stop_event.wait(wait) or time.monotonic() < self.next_poll:
+            return set()
+        self.next_poll = time.monotonic() + self.interval
+        current = self._snapshot()
+        previous, self.snapshot = self.snapshot, current
+        return {
+            name
+            for name in previous.keys() | current.keys()
+            if previous.get(name) != current.get(name)
+        }
+
+    def wake(self) -> None:
+        self.stop_event.set()
+
+    def close(self) -> None:
+        pass
+
+
+class PhotoWatcher:
+    """
+    Keeps the photos table in sync with the photos folder on a background thread.
+
+    Changed names are collected until the folder has been quiet for `debounce`
+    seconds (or `max_delay` has passed since the first change), then synced with
+    sync_photos_folder_paths. If the backend loses events, a full scan runs instead.
+    `mode` is "auto" (inotify, else polling), "inotify" or "poll". Photos the
+    watcher adds are passed to `on_new_photos`.
+    """
+
+    def __init__(
+        self,
+        photos_dir: Path,
+        session_maker: sessionmaker[Session],
+        mode: str = "auto",
+        debounce: float = 0.5,
+        max_delay: float = 5.0,
+        poll_interval: float = 1.0,
+        on_new_photos: Optional[NewPhotosCallback] = None,
+    ) -> None:
+        self.photos_dir = photos_dir
+        self.on_new_photos = on_new_photos
+        self.session_maker = session_maker
+        self.mode = mode
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.backend: Optional[WatchBackend] = None
+
+    def _create_backend(self) -> WatchBackend:
+        if self.mode in ("auto", "inotify"):
+            try:
+                return InotifyBackend(self.photos_dir)
+            except (OSError, AttributeError) as e:
+                if self.mode == "inotify":
+                    raise
+                logger.info(f"inotify unavailable ({e}); falling back to polling")
+        return PollingBackend(self.photos_dir, self.poll_interval, self.stop_event)
+
+    def start(self) -> None:
+        self.photos_dir.mkdir(parents=True, exist_ok=True)
+        self.stop_event.clear()
+        self.backend = self._create_backend()
+        logger.info(f"Watching {self.photos_dir} with {type(self.backend).__name__}")
+        self.thread = threading.Thread(
+            target=self._run, args=(self.backend,), name="photo-watcher", daemon=True
+        )
+        self.thread.start()
+
+    def stop(self, timeout: Optional[float] = 5.0) -> None:
+        self.stop_event.set()
+        if self.backend is not None:
+            self.backend.wake()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        if self.backend is not None:
+            self.backend.close()
+            self.backend = None
+
+    def _run(self, backend: WatchBackend) -> None:
+        pending: set[str] = set()
+        needs_rescan = False
+        first_change = last_change = 0.0
+        while not self.stop_event.is_set():
+            timeout = self.debounce if (pending or needs_rescan) else 0.5
+            try:
+                changes = backend.poll(timeout)
+            except Exception as e:
+                logger.error(f"Folder watcher error: {e}")
+                changes = RESCAN
+                self.stop_event.wait(self.poll_interval)
+            now = time.monotonic()
+            if changes is None or changes:
+                if not pending and not needs_rescan:
+                    first_change = now
+                last_change = now
+                if changes is None:
+                    needs_rescan = True
+                else:
+                    pending |= changes
+            if not pending and not needs_rescan:
+                continue
+            if (
+                now - last_change < self.debounce
+                and now - first_change < self.max_delay
+            ):
+                continue
+            self._apply(pending, needs_rescan)
+            pending = set()
+            needs_rescan = False
+
+    def _apply(self, names: set[str], full_rescan: bool) -> None:
+        db = self.session_maker()
+        try:
+            if full_rescan:
+                scan_photos_folder_on_startup(
+                    self.photos_dir, db, on_new_photos=self.on_new_photos
+                )
+            else:
+                sync_photos_folder_paths(
+                    self.photos_dir, db, names, on_new_photos=self.on_new_photos
+                )
+        except Exception as e:
+            logger.error(f"Folder watcher failed to sync {self.photos_dir}: {e}")
+        finally:
+            db.close()
+
+
+def create_watcher(
+    photos_dir: Path,
+    session_maker: sessionmaker[Session],
+    on_new_photos: Optional[NewPhotosCallback] = None,
+) -> Optional[PhotoWatcher]:
+    """
+    Build a watcher from PHOTO_WATCHER (auto, inotify, poll or off),
+    WATCHER_DEBOUNCE_MS and WATCHER_POLL_INTERVAL_MS.
+    """
+    mode = os.environ.get("PHOTO_WATCHER", "auto").lower()
+    if mode == "off":
+        return None
+    return PhotoWatcher(
+        photos_dir,
+        session_maker,
+        mode=mode,
+        debounce=int(os.environ.get("WATCHER_DEBOUNCE_MS", "500")) / 1000,
+        poll_interval=int(os.environ.get("WATCHER_POLL_INTERVAL_MS", "1000")) / 1000,
+        on_new_photos=on_new_photos,
+    )
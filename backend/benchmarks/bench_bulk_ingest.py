@@ -0,0 +1,82 @@
+"""
+Time to add a shoot of small photos one POST /photos at a time vs. in one
+POST /photos/bulk (multipart batch, and streamed tar).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_bulk_ingest [photos]
+"""
+
+import io
+import os
+import sys
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from fastapi.testclient import TestClient
+
+from app.main import create_app
+
+PHOTO_BYTES = 200 * 1024
+
+
+def make_photos(count: int) -> list[tuple[str, bytes]]:
+    return [(f"shoot_{i:05d}.jpg", os.urandom(PHOTO_BYTES)) for i in range(count)]
+
+
+def one_by_one(client: TestClient, photos: list[tuple[str, bytes]]) -> None:
+    for name, data in photos:
+        client.post("/photos", files={"file": (name, data, "image/jpeg")})
+
+
+def multipart(client: TestClient, photos: list[tuple[str, bytes]]) -> None:
+    files = [("files", (name, data, "image/jpeg")) for name, data in photos]
+    client.post("/photos/bulk", files=files)
+
+
+def tar_stream(client: TestClient, photos: list[tuple[str, bytes]]) -> None:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        for name, data in photos:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+    client.post(
+        "/photos/bulk",
+        content=buffer.getvalue(),
+        headers={"content-type": "application/x-tar"},
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    photos = make_photos(count)
+    os.environ["PHOTO_WATCHER"] = "off"
+    os.environ["THUMBNAIL_PREWARM_CPU"] = "0"
+    runs: list[tuple[str, Callable[[TestClient, list[tuple[str, bytes]]], None]]] = [
+        ("POST /photos x N", one_by_one),
+        ("bulk multipart", multipart),
+        ("bulk tar stream", tar_stream),
+    ]
+    print(f"{count} photos of {PHOTO_BYTES // 1024} KB")
+    for name, ingest in runs:
+        with tempfile.TemporaryDirectory() as tmp:
+            photos_dir = Path(tmp) / "photos"
+            photos_dir.mkdir()
+            app = create_app(photos_dir=photos_dir, db_path=Path(tmp) / "bench.db")
+            with TestClient(app) as client:
+                started = time.perf_counter()
+                ingest(client, photos)
+                elapsed = time.perf_counter() - started
+                added = len(client.get("/photos?limit=1000").json())
+            print(
+                f"{name:<18} {elapsed:6.2f}s  {count / elapsed:7.0f} photos/s  "
+                f"({added} listed)"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Caption search over a large library: the FTS5 index (first page of 50, and a
+page deep into the results) vs. loading every photo and filtering in Python,
+which is what clients had to do before GET /photos/search.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_caption_search [photos]
+"""
+
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from sqlalchemy import text
+
+from app.crud import get_all_photos, search_photos
+from app.db import create_db_engine, create_sessionmaker, init_db
+
+PAGE = 50
+
+
+def make_words(count: int) -> list[str]:
+    rng = random.Random(1)
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return sorted(
+        {"".join(rng.choices(letters, k=rng.randint(3, 9))) for _ in range(count)}
+    )
+
+
+def timed(fn: Callable[[], Any], repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = random.Random(2)
+    words = make_words(5000)
+    # Zipf-like: a few words appear in many captions, most in very few
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(Path(tmp) / "photos.db")
+        init_db(engine)
+        started = time.perf_counter()
+        with engine.begin() as connection:
+            for start in range(0, count, 10_000):
+                rows = [
+                    {
+                        "hash": f"{i:064x}",
+                        "filename": f"IMG_{i:07d}.jpg",
+                        "caption": " ".join(rng.choices(words, weights, k=10)),
+                    }
+                    for i in range(start, min(count, start + 10_000))
+                ]
+                connection.execute(
+                    text("INSERT INTO photos VALUES (:hash, :filename, :caption)"),
+                    rows,
+                )
+        print(
+            f"{count} captions indexed by the triggers in "
+            f"{time.perf_counter() - started:.1f} s"
+        )
+
+        db = create_sessionmaker(engine)()
+        queries = {
+            "rare word": words[-1],
+            "mid word": words[200],
+            "two words": f"{words[5]} {words[300]}",
+            "prefix": words[100][:2],
+            "common word": words[0],
+        }
+        for label, query in queries.items():
+            photos, after = search_photos(db, query, PAGE)
+            matches = db.execute(
+                text("SELECT count(*) FROM photos_fts WHERE photos_fts MATCH :q"),
+                {"q": f'"{query.split()[0]}"*' if label == "prefix" else query},
+            ).scalar_one()
+            first = timed(lambda: search_photos(db, query, PAGE))
+            deep = (
+                timed(lambda: search_photos(db, query, PAGE, after=after))
+                if after
+                else first
+            )
+            print(
+                f"{label:<12} {matches:>8} matches: first page {first * 1000:7.2f} ms, "
+                f"second page {deep * 1000:7.2f} ms"
+            )
+
+        def client_side() -> list[Any]:
+            needle = words[-1]
+            return [p for p in get_all_photos(db) if needle in (p.caption_value or "")]
+
+        print(f"load all and filter: {timed(client_side, repeat=1) * 1000:.0f} ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
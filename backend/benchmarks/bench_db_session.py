@@ -0,0 +1,73 @@
+"""
+Per-request DB overhead: a fresh engine per request vs. one shared engine.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_db_session [iterations]
+"""
+
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db import create_db_engine, create_sessionmaker, init_db
+from app.models import Base
+
+
+def per_request_engine(db_path: Path) -> None:
+    # What get_db() used to do on every request without an injected sessionmaker
+    engine = create_engine(
+        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
+    )
+    session_maker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = session_maker()
+    try:
+        db.execute(text("SELECT hash FROM photos LIMIT 1")).fetchall()
+    finally:
+        db.close()
+    engine.dispose()
+
+
+def timed(label: str, iterations: int, fn: Callable[[], None]) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    elapsed = time.perf_counter() - start
+    per_request_us = elapsed / iterations * 1e6
+    print(f"{label:<28} {per_request_us:10.1f} us/request")
+    return per_request_us
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        engine = create_db_engine(db_path)
+        init_db(engine)
+        session_maker = create_sessionmaker(engine)
+
+        def shared_engine() -> None:
+            db = session_maker()
+            try:
+                db.execute(text("SELECT hash FROM photos LIMIT 1")).fetchall()
+            finally:
+                db.close()
+
+        before = timed(
+            "before: engine per request",
+            iterations,
+            lambda: per_request_engine(db_path),
+        )
+        after = timed("after: shared pooled engine", iterations, shared_engine)
+        print(f"speedup: {before / after:.1f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
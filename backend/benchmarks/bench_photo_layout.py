@@ -0,0 +1,66 @@
+"""
+Flat vs. sharded photos folder: time to create a library, to rescan it once it
+is indexed (list + stat every file), and to stat random photos by path, as the
+image route does.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_photo_layout [photos]
+"""
+
+import hashlib
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from app.db import create_db_engine, create_sessionmaker, init_db
+from app.image_utils import scan_photos_folder_on_startup
+from app.photo_layout import photo_storage_path
+
+LOOKUPS = 20_000
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    hashes = [hashlib.sha256(b"%d" % i).hexdigest() for i in range(count)]
+    print(f"{count} photos")
+    for layout in ("flat", "sharded"):
+        with tempfile.TemporaryDirectory() as tmp:
+            photos_dir = Path(tmp) / "photos"
+            photos_dir.mkdir()
+            started = time.perf_counter()
+            paths: list[str] = []
+            for i, sha256 in enumerate(hashes):
+                path = photo_storage_path(sha256, f"IMG_{i:06d}.jpg", layout)
+                (photos_dir / path).parent.mkdir(parents=True, exist_ok=True)
+                (photos_dir / path).write_bytes(b"%d" % i)
+                paths.append(path)
+            created = time.perf_counter() - started
+
+            engine = create_db_engine(Path(tmp) / "photos.db")
+            init_db(engine)
+            db = create_sessionmaker(engine)()
+            scan_photos_folder_on_startup(photos_dir, db)
+            started = time.perf_counter()
+            stats = scan_photos_folder_on_startup(photos_dir, db)
+            rescan = time.perf_counter() - started
+            assert stats.files_hashed == 0
+            db.close()
+            engine.dispose()
+
+            sample = random.sample(paths, min(LOOKUPS, count))
+            started = time.perf_counter()
+            for path in sample:
+                os.stat(photos_dir / path)
+            lookup = (time.perf_counter() - started) / len(sample)
+            print(
+                f"{layout:>8}: create {created:6.2f} s, indexed rescan {rescan:6.2f} s, "
+                f"stat {lookup * 1e6:5.1f} µs"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Detail-view cost of a large TIFF original: bytes sent and time to serve the
+original (64 KB vs. 1 MB response chunks, and a 1 MB Range), vs. rendering
+its preview once and serving it from the preview store.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_photo_preview [width height]
+"""
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+from PIL import Image
+from starlette.responses import FileResponse
+
+from app.image_utils import DiskThumbnailCache, get_or_create_preview
+from app.routes.photos import OriginalFileResponse
+
+
+def serve(response: FileResponse, range_header: Optional[str] = None) -> int:
+    """
+    Run a file response against an in-memory ASGI server; return body bytes.
+    """
+    headers = [(b"range", range_header.encode())] if range_header else []
+    scope: dict[str, Any] = {
+        "type": "http",
+        "method": "GET",
+        "headers": headers,
+        "asgi": {"spec_version": "2.4"},
+    }
+    sent = 0
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.disconnect"}
+
+    async def send(message: dict[str, Any]) -> None:
+        nonlocal sent
+        sent += len(message.get("body", b""))
+
+    asyncio.run(response(scope, receive, send))
+    return sent
+
+
+def timed(label: str, fn: Any) -> None:
+    started = time.perf_counter()
+    sent = fn()
+    elapsed = time.perf_counter() - started
+    print(f"{label:<34} {sent / 1e6:8.2f} MB {elapsed * 1000:9.1f} ms")
+
+
+def main() -> None:
+    width, height = (
+        (int(v) for v in sys.argv[1:3]) if len(sys.argv) > 2 else (6000, 4000)
+    )
+    with tempfile.TemporaryDirectory() as tmp:
+        photos_dir = Path(tmp) / "photos"
+        photos_dir.mkdir()
+        original = photos_dir / "big.tif"
+        # Noise keeps the preview about as large as a real photo's
+        Image.effect_noise((width, height), 48).convert("RGB").save(original)
+        store = DiskThumbnailCache(Path(tmp) / "previews")
+        print(f"{width}x{height} TIFF, {original.stat().st_size / 1e6:.1f} MB")
+
+        timed("original, 64 KB chunks", lambda: serve(FileResponse(original)))
+        timed("original, 1 MB chunks", lambda: serve(OriginalFileResponse(original)))
+        timed(
+            "original, 1 MB range",
+            lambda: serve(OriginalFileResponse(original), "bytes=-1048576"),
+        )
+
+        def preview() -> int:
+            path = get_or_create_preview(photos_dir, "0" * 64, "big.tif", store)
+            assert isinstance(path, Path)
+            return serve(FileResponse(path))
+
+        timed("preview, first request (render)", preview)
+        timed("preview, from the store", preview)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Random-photo lookup at scale: ORDER BY RANDOM() vs. drawing rowids (with a
+random offset as the fallback when draws keep missing).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_random_photo [rows] [lookups]
+"""
+
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+from sqlalchemy import func, text
+
+from app.crud import bulk_add_photos, get_random_photo
+from app.db import create_db_engine, create_sessionmaker, init_db
+from app.models import Photo
+
+
+def timed(label: str, lookups: int, fn: Callable[[], object]) -> float:
+    start = time.perf_counter()
+    for _ in range(lookups):
+        fn()
+    per_lookup_ms = (time.perf_counter() - start) / lookups * 1000
+    print(f"{label:<36} {per_lookup_ms:10.3f} ms/lookup")
+    return per_lookup_ms
+
+
+def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_db_engine(Path(tmp) / "bench.db")
+        init_db(engine)
+        session_maker = create_sessionmaker(engine)
+        with session_maker() as db:
+            print(f"Inserting {rows} photos...")
+            for start in range(0, rows, 50_000):
+                batch = range(start, min(rows, start + 50_000))
+                bulk_add_photos(db, ((os.urandom(32).hex(), f"{i}.jpg") for i in batch))
+                db.commit()
+            # Caption 90% of the library, so uncaptioned photos are sparse
+            db.execute(text("UPDATE photos SET caption = 'x' WHERE rowid % 10 != 0"))
+            db.commit()
+
+            before = timed(
+                "before: ORDER BY RANDOM()",
+                lookups,
+                lambda: db.query(Photo).order_by(func.random()).first(),
+            )
+            timed(
+                "before: uncaptioned ORDER BY RANDOM()",
+                lookups,
+                lambda: db.query(Photo)
+                .filter(Photo.caption.is_(None))
+                .order_by(func.random())
+                .first(),
+            )
+            after = timed(
+                "after: rowid draw", lookups * 100, lambda: get_random_photo(db)
+            )
+            timed(
+                "after: uncaptioned rowid draw",
+                lookups * 100,
+                lambda: get_random_photo(db, uncaptioned=True),
+            )
+            print(f"speedup: {before / after:.0f}x")
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Thumbnail renders and cache memory across several server worker processes,
+each with its own LRUThumbnailCache vs. one SharedThumbnailCache pack file.
+
+One Zipf-distributed browsing trace is dealt round-robin to the workers, as a
+load balancer would; a cache miss counts as a render and stores the thumbnail.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_shared_thumbnail_cache [workers] [requests]
+"""
+
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from app.image_utils import LRUThumbnailCache
+from app.shared_thumbnail_cache import SharedThumbnailCache
+from benchmarks.bench_thumbnail_cache import zipf_trace
+
+THUMB_BYTES = 16 * 1024
+CACHE_BYTES = 2_000 * THUMB_BYTES
+VALUE = b"\0" * THUMB_BYTES
+
+
+def worker(policy: str, budget: int, path: str, trace: list[str], results: Any) -> None:
+    if policy == "shared":
+        cache: Any = SharedThumbnailCache(Path(path), budget)
+    else:
+        cache = LRUThumbnailCache(budget)
+    renders = 0
+    started = time.perf_counter()
+    for key in trace:
+        if cache.get(key) is None:
+            renders += 1
+            cache.put(key, VALUE)
+    elapsed = time.perf_counter() - started
+    results.put((renders, cache.current_bytes, elapsed / len(trace)))
+
+
+def main() -> None:
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    requests = int(sys.argv[2]) if len(sys.argv) > 2 else 400_000
+    trace = zipf_trace(requests)
+    context = multiprocessing.get_context("fork")
+    print(f"{requests} requests over {workers} workers")
+    print(f"{'cache':<14} {'renders':>8} {'cache memory':>13} {'per request':>12}")
+    runs = [
+        ("private", "private", CACHE_BYTES),
+        ("shared", "shared", CACHE_BYTES),
+        # The memory the private caches use between them, in one shared cache
+        (f"shared x{workers}", "shared", workers * CACHE_BYTES),
+    ]
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, policy, budget in runs:
+            results = context.Queue()
+            processes = [
+                context.Process(
+                    target=worker,
+                    args=(
+                        policy,
+                        budget,
+                        f"{tmp}/{label}.pack",
+                        trace[i::workers],
+                        results,
+                    ),
+                )
+                for i in range(workers)
+            ]
+            for process in processes:
+                process.start()
+            stats = [results.get() for _ in processes]
+            for process in processes:
+                process.join()
+            renders = sum(r for r, _, _ in stats)
+            # The pack file is mapped by every worker but stored once
+            memory = stats[0][1] if policy == "shared" else sum(b for _, b, _ in stats)
+            latency = sum(t for _, _, t in stats) / len(stats)
+            print(
+                f"{label:<14} {renders:8d} {memory / 2**20:10.1f} MB "
+                f"{latency * 1e6:9.1f} us"
+            )
+
+
+if __name__ == "__main__":
+    main()
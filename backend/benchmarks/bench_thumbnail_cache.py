@@ -0,0 +1,131 @@
+"""
+Hit ratio and lock contention of the in-memory thumbnail caches on synthetic
+traces: a Zipf-distributed browsing trace, and the same trace interleaved with
+sequential sweeps through the whole library (e.g. scrolling the full grid).
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_thumbnail_cache [requests] [threads]
+"""
+
+import bisect
+import random
+import sys
+import threading
+import time
+from itertools import accumulate
+from typing import Any, Callable
+
+from app.image_utils import LRUThumbnailCache
+from app.tinylfu import ShardedTinyLFUCache
+
+LIBRARY = 50_000
+THUMB_BYTES = 16 * 1024
+CACHE_BYTES = 2_000 * THUMB_BYTES  # room for 4% of the library
+VALUE = b"\0" * THUMB_BYTES
+
+
+class CountingLock:
+    """
+    A lock that counts acquisitions that had to wait for another thread.
+    """
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.acquisitions = 0
+        self.contended = 0
+
+    def __enter__(self) -> None:
+        self.acquisitions += 1
+        if not self.lock.acquire(blocking=False):
+            self.contended += 1
+            self.lock.acquire()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.lock.release()
+
+
+def zipf_trace(requests: int, s: float = 0.9, seed: int = 1) -> list[str]:
+    rng = random.Random(seed)
+    cumulative = list(accumulate(1 / (rank**s) for rank in range(1, LIBRARY + 1)))
+    total = cumulative[-1]
+    # Popular photos are not the first ones in filename order
+    names = [f"photo-{i}" for i in range(LIBRARY)]
+    rng.shuffle(names)
+    return [
+        names[bisect.bisect_left(cumulative, rng.random() * total)]
+        for _ in range(requests)
+    ]
+
+
+def scan_trace(requests: int) -> list[str]:
+    trace = zipf_trace(requests)
+    sweep = [f"photo-{i}" for i in range(LIBRARY)]
+    # Two full sweeps spliced into the browsing trace
+    third = len(trace) // 3
+    return trace[:third] + sweep + trace[third : 2 * third] + sweep + trace[2 * third :]
+
+
+def replay(cache: Any, trace: list[str], threads: int) -> float:
+    def run(part: list[str]) -> None:
+        for key in part:
+            if cache.get(key) is None:
+                cache.put(key, VALUE)
+
+    workers = [
+        threading.Thread(target=run, args=(trace[i::threads],)) for i in range(threads)
+    ]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - started
+
+
+def instrument(cache: Any) -> list[CountingLock]:
+    if isinstance(cache, ShardedTinyLFUCache):
+        targets: list[Any] = list(cache.shards)
+    else:
+        targets = [cache]
+    locks = []
+    for target in targets:
+        target.lock = CountingLock()
+        locks.append(target.lock)
+    return locks
+
+
+def main() -> None:
+    requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300_000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    # Short switch interval so threads actually interleave inside the caches
+    sys.setswitchinterval(1e-5)
+    caches: dict[str, Callable[[], Any]] = {
+        "lru": lambda: LRUThumbnailCache(CACHE_BYTES),
+        "tinylfu x1": lambda: ShardedTinyLFUCache(CACHE_BYTES, shards=1),
+        "tinylfu x16": lambda: ShardedTinyLFUCache(CACHE_BYTES, shards=16),
+    }
+    print(
+        f"{LIBRARY} photos, cache holds {CACHE_BYTES // THUMB_BYTES}, {threads} threads"
+    )
+    print(f"{'trace':<6} {'cache':<12} {'hit ratio':>9} {'contended':>10} {'time':>8}")
+    for trace_name, trace in (
+        ("zipf", zipf_trace(requests)),
+        ("scan", scan_trace(requests)),
+    ):
+        for name, factory in caches.items():
+            cache = factory()
+            locks = instrument(cache)
+            elapsed = replay(cache, trace, threads)
+            hit_ratio = cache.hits / (cache.hits + cache.misses)
+            contended = sum(lock.contended for lock in locks) / sum(
+                lock.acquisitions for lock in locks
+            )
+            print(
+                f"{trace_name:<6} {name:<12} {hit_ratio:9.1%} "
+                f"{contended:10.2%} {elapsed:7.2f}s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Thumbnail decode time and peak RSS: full decode + convert vs. the fast path
+(JPEG draft mode, reduce(), embedded EXIF thumbnails).
+
+Each measurement runs in a fresh process so peak RSS is not shared between runs.
+Peak RSS is the increase of the process high-water mark over the decode.
+Run from the backend directory:
+
+    python -m benchmarks.bench_thumbnail_decode [repeats]
+"""
+
+import io
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from PIL import Image
+
+from app.image_utils import generate_thumbnail
+
+
+def full_decode_thumbnail(image_path: Path, max_size: int = 256) -> bytes:
+    # generate_thumbnail before the fast path
+    with Image.open(image_path) as img:
+        img = img.convert("RGB")
+        img.thumbnail((max_size, max_size))
+        buf = io.BytesIO()
+        img.save(buf, format="JPEG", quality=85)
+        return buf.getvalue()
+
+
+def peak_rss_kb() -> int:
+    # VmHWM is per address space; ru_maxrss can carry over the parent's peak
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure(method: str, path: str, repeats: int, results: Any) -> None:
+    fn = full_decode_thumbnail if method == "before" else generate_thumbnail
+    rss_before = peak_rss_kb()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn(Path(path))
+    elapsed = (time.perf_counter() - start) / repeats
+    results.put((elapsed, (peak_rss_kb() - rss_before) / 1024))
+
+
+def make_images(tmp: Path) -> dict[str, Path]:
+    # Gradients rather than flat colours so the encoders do real work
+    gradient = Image.linear_gradient("L").resize((6000, 4000))
+    rgb = Image.merge("RGB", (gradient, gradient.rotate(90, expand=False), gradient))
+    images = {
+        "24 MP JPEG": tmp / "large.jpg",
+        "24 MP PNG": tmp / "large.png",
+        "24 MP TIFF": tmp / "large.tif",
+    }
+    rgb.save(images["24 MP JPEG"], quality=90)
+    rgb.save(images["24 MP PNG"], compress_level=1)
+    rgb.save(images["24 MP TIFF"])
+    return images
+
+
+def main() -> None:
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+    ctx = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        images = make_images(Path(tmp))
+        print(f"{'image':<12} {'path':<7} {'time/thumb':>12} {'peak RSS +':>12}")
+        for label, path in images.items():
+            for method in ("before", "after"):
+                results = ctx.Queue()
+                proc = ctx.Process(
+                    target=measure, args=(method, str(path), repeats, results)
+                )
+                proc.start()
+                elapsed, rss_mb = results.get()
+                proc.join()
+                print(
+                    f"{label:<12} {method:<7} {elapsed * 1000:>9.1f} ms "
+                    f"{rss_mb:>9.1f} MB"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Caption PATCH latency while a cold grid of thumbnails loads, with thumbnails
+rendered in-process (THUMBNAIL_WORKERS=0) vs. in the worker process pool.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_thumbnail_pool [photos] [workers]
+"""
+
+import io
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.main import create_app
+
+GRID_CLIENTS = 16
+
+
+def make_photos(photos_dir: Path, count: int) -> None:
+    for i in range(count):
+        img = Image.effect_mandelbrot((3000, 2000), (-2 + i * 0.01, -1, 1, 1), 60)
+        img.convert("RGB").save(photos_dir / f"photo_{i:04d}.jpg", quality=90)
+
+
+def run(photos_dir: Path, db_path: Path, workers: int) -> None:
+    os.environ["THUMBNAIL_WORKERS"] = str(workers)
+    os.environ["THUMBNAIL_QUEUE_SIZE"] = "1000"
+    os.environ["THUMBNAIL_DISK_CACHE_MB"] = "0"
+    os.environ["PHOTO_WATCHER"] = "off"
+    app = create_app(photos_dir=photos_dir, db_path=db_path)
+    with TestClient(app) as client:
+        hashes = [p["hash"] for p in client.get("/photos?limit=1000").json()]
+        # Warm the worker processes so process start-up is not measured
+        client.get(f"/photos/{hashes[0]}/thumbnail?size=128")
+        done = threading.Event()
+        latencies: list[float] = []
+
+        def patch_captions() -> None:
+            i = 0
+            while not done.is_set():
+                start = time.perf_counter()
+                client.patch(
+                    f"/photos/{hashes[i % len(hashes)]}/caption",
+                    json={"caption": f"caption {i}"},
+                )
+                latencies.append((time.perf_counter() - start) * 1000)
+                i += 1
+                time.sleep(0.005)
+
+        patcher = threading.Thread(target=patch_captions)
+        patcher.start()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(GRID_CLIENTS) as pool:
+            list(pool.map(lambda h: client.get(f"/photos/{h}/thumbnail"), hashes))
+        grid_s = time.perf_counter() - start
+        done.set()
+        patcher.join()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    label = "in-process" if workers == 0 else f"{workers} worker processes"
+    print(
+        f"{label:<22} grid {len(hashes) / grid_s:7.1f} thumbs/s   "
+        f"PATCH p50 {statistics.median(latencies):7.1f} ms   p99 {p99:7.1f} ms"
+    )
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as tmp:
+        photos_dir = Path(tmp) / "photos"
+        photos_dir.mkdir()
+        make_photos(photos_dir, count)
+        for n in (0, workers):
+            run(photos_dir, Path(tmp) / f"bench-{n}.db", n)
+
+
+if __name__ == "__main__":
+    main()
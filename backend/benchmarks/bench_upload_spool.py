@@ -0,0 +1,60 @@
+"""
+Peak Python memory while ingesting one large upload: reading it whole, hashing
+and writing it (the old upload path) vs. spool_upload.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_upload_spool [megabytes]
+"""
+
+import hashlib
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+
+from app.image_utils import spool_upload
+
+
+def read_whole(photos_dir: Path, source: Path) -> None:
+    with source.open("rb") as stream:
+        contents = stream.read()
+    hashlib.sha256(contents).hexdigest()
+    (photos_dir / "upload.bin").write_bytes(contents)
+
+
+def spooled(photos_dir: Path, source: Path) -> None:
+    with source.open("rb") as stream:
+        tmp_path, _ = spool_upload(photos_dir, stream)
+    os.replace(tmp_path, photos_dir / "upload.bin")
+
+
+def main() -> None:
+    megabytes = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(tmp) / "source.bin"
+        with source.open("wb") as f:
+            for _ in range(megabytes):
+                f.write(os.urandom(1024 * 1024))
+        photos_dir = Path(tmp) / "photos"
+        photos_dir.mkdir()
+        runs: list[tuple[str, Callable[[Path, Path], None]]] = [
+            ("read whole", read_whole),
+            ("spool_upload", spooled),
+        ]
+        print(f"{megabytes} MB upload")
+        for name, ingest in runs:
+            tracemalloc.start()
+            started = time.perf_counter()
+            ingest(photos_dir, source)
+            elapsed = time.perf_counter() - started
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            print(f"{name:<13} peak {peak / 2**20:8.1f} MB   {elapsed:6.2f}s")
+
+
+if __name__ == "__main__":
+    main()
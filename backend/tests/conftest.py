@@ -1,11 +1,14 @@
 import pytest
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session
 from app.main import create_app
-from typing import Generator
+from typing import Callable, Generator, Optional
 from pathlib import Path
+import io
+import mimetypes
 import shutil
+import time
 from fastapi.testclient import TestClient
+from PIL import Image
 
 
 @pytest.fixture(scope="function")
@@ -22,17 +25,65 @@ def test_app(
     tmp_path: Path, temp_photos_dir: Path
 ) -> Generator[TestClient, None, None]:
     db_path = tmp_path / "test.db"
-    engine = create_engine(
-        f"sqlite:///{db_path}", connect_args={"check_same_thread": False}
-    )
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    from app.db import Base
-
-    Base.metadata.create_all(bind=engine)
-    app = create_app(photos_dir=temp_photos_dir)
-    app.state.db_sessionmaker = TestingSessionLocal
+    app = create_app(photos_dir=temp_photos_dir, db_path=db_path)
     with TestClient(app) as client:
         yield client
     # Only delete the DB after the app context is fully closed
     if db_path.exists():
         db_path.unlink()
+
+
+@pytest.fixture(scope="function")
+def db_session(tmp_path: Path) -> Generator[Session, None, None]:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    engine = create_db_engine(tmp_path / "session.db")
+    init_db(engine)
+    session = create_sessionmaker(engine)()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+@pytest.fixture(scope="function")
+def upload_image(test_app: TestClient) -> Callable[..., str]:
+    """
+    Upload through POST /photos and return the hash: a solid `color` image of
+    `size`, or `image` if given, saved in the format of `name`'s extension.
+    """
+
+    def upload(
+        name: str = "photo.png",
+        size: tuple[int, int] = (640, 480),
+        color: tuple[int, int, int] = (10, 120, 200),
+        image: Optional[Image.Image] = None,
+    ) -> str:
+        buf = io.BytesIO()
+        fmt = Image.registered_extensions()[Path(name).suffix.lower()]
+        (image or Image.new("RGB", size, color)).save(buf, format=fmt)
+        content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        resp = test_app.post(
+            "/photos", files={"file": (name, buf.getvalue(), content_type)}
+        )
+        assert resp.status_code == 201
+        return resp.json()["hash"]
+
+    return upload
+
+
+@pytest.fixture(scope="function")
+def wait_until() -> Callable[..., bool]:
+    """
+    Poll `condition` until it holds or `timeout` seconds pass; returns whether
+    it held, for use as `assert wait_until(...)`.
+    """
+
+    def wait(condition: Callable[[], bool], timeout: float = 10.0) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return True
+            time.sleep(0.02)
+        return condition()
+
+    return wait
@@ -0,0 +1,198 @@
+from pathlib import Path
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.bulk_ingest import BulkIngest
+from app.crud import get_all_photos, get_file_index
+from typing import Any, Literal
+import gzip
+import hashlib
+import io
+import pytest
+import tarfile
+import zipfile
+
+
+def make_tar(
+    entries: dict[str, bytes], mode: Literal["w", "w:gz", "w:bz2", "w:xz"] = "w"
+) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode=mode) as archive:
+        folder = tarfile.TarInfo("shoot")
+        folder.type = tarfile.DIRTYPE
+        archive.addfile(folder)
+        for name, data in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo("shoot/link.jpg")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "a.jpg"
+        archive.addfile(link)
+    return buffer.getvalue()
+
+
+def statuses(body: dict[str, Any]) -> dict[str, str]:
+    return {r["filename"]: r["status"] for r in body["results"]}
+
+
+def test_multipart_batch(test_app: TestClient, temp_photos_dir: Path) -> None:
+    files = [
+        ("files", ("a.jpg", b"photo-a", "image/jpeg")),
+        ("files", ("b.png", b"photo-b", "image/png")),
+        ("files", ("copy-of-a.jpg", b"photo-a", "image/jpeg")),
+        ("files", ("notes.txt", b"text", "text/plain")),
+    ]
+    resp = test_app.post("/photos/bulk", files=files)
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["added"], body["duplicate"], body["rejected"]) == (2, 1, 1)
+    assert statuses(body) == {
+        "a.jpg": "added",
+        "b.png": "added",
+        "copy-of-a.jpg": "duplicate",
+        "notes.txt": "rejected",
+    }
+    assert body["results"][0]["hash"] == hashlib.sha256(b"photo-a").hexdigest()
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["a.jpg", "b.png"]
+    photos = test_app.get("/photos").json()
+    assert {p["filename"] for p in photos} == {"a.jpg", "b.png"}
+
+
+def test_streamed_tar(test_app: TestClient, temp_photos_dir: Path) -> None:
+    test_app.post("/photos", files={"file": ("old.jpg", b"old", "image/jpeg")})
+    archive = make_tar(
+        {
+            "shoot/a.jpg": b"photo-a",
+            "shoot/b.tif": b"photo-b",
+            "shoot/again.jpg": b"old",
+            "shoot/._a.jpg": b"resource fork",
+        },
+        mode="w:gz",
+    )
+    resp = test_app.post(
+        "/photos/bulk", content=archive, headers={"content-type": "application/gzip"}
+    )
+    assert resp.status_code == 200
+    assert statuses(resp.json()) == {
+        "a.jpg": "added",
+        "b.tif": "added",
+        "again.jpg": "duplicate",
+        "shoot/._a.jpg": "rejected",
+        "shoot/link.jpg": "rejected",
+    }
+    assert (temp_photos_dir / "b.tif").read_bytes() == b"photo-b"
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == [
+        "a.jpg",
+        "b.tif",
+        "old.jpg",
+    ]
+
+
+def test_zip_archive(test_app: TestClient, temp_photos_dir: Path) -> None:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("shoot/", b"")
+        archive.writestr("shoot/a.webp", b"photo-a")
+        archive.writestr("shoot/readme.md", b"text")
+    resp = test_app.post(
+        "/photos/bulk",
+        content=buffer.getvalue(),
+        headers={"content-type": "application/zip"},
+    )
+    assert resp.status_code == 200
+    assert statuses(resp.json()) == {"a.webp": "added", "shoot/readme.md": "rejected"}
+    assert (temp_photos_dir / "a.webp").read_bytes() == b"photo-a"
+
+
+def test_existing_filename_is_not_overwritten(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    (temp_photos_dir / "a.jpg").write_bytes(b"someone else's photo")
+    resp = test_app.post(
+        "/photos/bulk", files=[("files", ("a.jpg", b"photo-a", "image/jpeg"))]
+    )
+    result = resp.json()["results"][0]
+    assert result["status"] == "rejected" and "exists" in result["detail"]
+    assert (temp_photos_dir / "a.jpg").read_bytes() == b"someone else's photo"
+
+
+def test_bad_requests_leave_no_files(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    resp = test_app.post(
+        "/photos/bulk", content=b"{}", headers={"content-type": "application/json"}
+    )
+    assert resp.status_code == 415
+    resp = test_app.post(
+        "/photos/bulk",
+        content=b"not an archive" * 100,
+        headers={"content-type": "application/x-tar"},
+    )
+    assert resp.status_code == 400
+    assert list(temp_photos_dir.iterdir()) == []
+
+
+def test_truncated_archive_keeps_what_was_read(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    resp = test_app.post(
+        "/photos/bulk",
+        # Cut off inside the second file's data
+        content=make_tar({"a.jpg": b"photo-a", "b.jpg": b"b" * 2048})[:2600],
+        headers={"content-type": "application/x-tar"},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["added"], body["error"]) == (1, 1)
+    assert statuses(body) == {"a.jpg": "added", "": "error"}
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["a.jpg"]
+
+
+def test_gzip_stream_cut_between_entries_is_reported(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    # Cut right after a.jpg's data, where b.jpg's header would start, then
+    # compress: the gzip stream itself is intact
+    tar = make_tar({"a.jpg": b"photo-a", "b.jpg": b"photo-b"})[: 3 * 512]
+    resp = test_app.post(
+        "/photos/bulk",
+        content=gzip.compress(tar),
+        headers={"content-type": "application/gzip"},
+    )
+    assert resp.status_code == 200
+    body = resp.json()
+    assert statuses(body) == {"a.jpg": "added", "": "error"}
+    assert "truncated" in body["results"][-1]["detail"]
+
+
+def test_rows_are_committed_in_batches(
+    db_session: Session, temp_photos_dir: Path
+) -> None:
+    batches: list[int] = []
+    ingest = BulkIngest(
+        temp_photos_dir,
+        db_session,
+        batch_size=2,
+        on_new_photos=lambda photos: batches.append(len(photos)),
+    )
+    ingest.add_tar(io.BytesIO(make_tar({f"{i}.jpg": b"%d" % i for i in range(5)})))
+    ingest.flush()
+    assert batches == [2, 2, 1]
+    assert len(get_all_photos(db_session)) == 5
+    # Indexed, so the folder watcher does not hash them again
+    assert set(get_file_index(db_session)) == {f"{i}.jpg" for i in range(5)}
+
+
+def test_failed_commit_removes_the_batch_files(
+    db_session: Session, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken_commit() -> None:
+        raise OSError("disk full")
+
+    ingest = BulkIngest(temp_photos_dir, db_session, batch_size=10)
+    ingest.add_tar(io.BytesIO(make_tar({"a.jpg": b"photo-a", "b.jpg": b"photo-b"})))
+    monkeypatch.setattr(db_session, "commit", broken_commit)
+    with pytest.raises(OSError):
+        ingest.flush()
+    assert list(temp_photos_dir.iterdir()) == []
+    assert get_all_photos(db_session) == []
@@ -0,0 +1,145 @@
+from typing import Any
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import Session
+from pathlib import Path
+from app.crud import (
+    bulk_add_photos,
+    caption_search_query,
+    delete_photos,
+    search_photos,
+    update_photo_caption,
+)
+
+
+def seed(db: Session, captions: list[str]) -> list[str]:
+    hashes = [f"{i:064x}" for i in range(len(captions))]
+    bulk_add_photos(db, [(h, f"img_{i}.jpg") for i, h in enumerate(hashes)])
+    db.commit()
+    for hash, caption in zip(hashes, captions):
+        update_photo_caption(db, hash, caption)
+    return hashes
+
+
+def found(db: Session, query: str) -> list[str]:
+    return [p.hash_value for p in search_photos(db, query, 100)[0]]
+
+
+def test_query_words_are_literal() -> None:
+    assert caption_search_query('dog AND "beach') == '"dog" "AND" "beach"*'
+    assert caption_search_query("  -*( ") is None
+
+
+def test_index_follows_caption_changes(db_session: Session) -> None:
+    a, b, c = seed(db_session, ["A dog on the beach", "Two dogs", ""])
+    assert sorted(found(db_session, "dog")) == [a, b]
+    assert found(db_session, "beach dog") == [a]
+    assert found(db_session, "DOG beach") == [a]
+    # Diacritics and case are folded
+    update_photo_caption(db_session, c, "Café au lait")
+    assert found(db_session, "cafe") == [c]
+    update_photo_caption(db_session, a, "A cat")
+    assert found(db_session, "beach") == []
+    update_photo_caption(db_session, b, " ")
+    assert found(db_session, "dogs") == []
+    delete_photos(db_session, [c])
+    db_session.commit()
+    assert found(db_session, "cafe") == []
+    assert found(db_session, "cat") == [a]
+
+
+def test_best_match_first_and_pages(db_session: Session) -> None:
+    captions = [f"sunset number {i}" for i in range(9)]
+    captions[4] = "sunset sunset sunset"
+    hashes = seed(db_session, captions)
+    page, after = search_photos(db_session, "sunset", 4)
+    assert page[0].hash_value == hashes[4]
+    seen = [p.hash_value for p in page]
+    while after is not None:
+        page, after = search_photos(db_session, "sunset", 4, after=after)
+        seen.extend(p.hash_value for p in page)
+    assert sorted(seen) == sorted(hashes)
+
+
+def test_existing_database_is_indexed(tmp_path: Path) -> None:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    db_path = tmp_path / "old.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    with engine.begin() as connection:
+        connection.execute(
+            text(
+                "CREATE TABLE photos (hash VARCHAR(255) PRIMARY KEY, "
+                "filename VARCHAR(255), caption TEXT)"
+            )
+        )
+        connection.execute(
+            text("INSERT INTO photos VALUES ('abc', 'a.jpg', 'old caption')")
+        )
+    engine.dispose()
+
+    engine = create_db_engine(db_path)
+    init_db(engine)
+    init_db(engine)
+    with create_sessionmaker(engine)() as db:
+        assert found(db, "old") == ["abc"]
+    engine.dispose()
+
+
+def test_index_is_rebuilt_after_rowids_change(tmp_path: Path) -> None:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    engine = create_db_engine(tmp_path / "renumbered.db")
+    init_db(engine)
+    session_maker = create_sessionmaker(engine)
+    with session_maker() as db:
+        dog, cat = seed(db, ["a dog", "a cat"])
+    # What VACUUM may do, and a dump and restore does, to a table without an
+    # INTEGER PRIMARY KEY; no trigger tells the index
+    with engine.begin() as connection:
+        connection.execute(
+            text("UPDATE photos SET rowid = rowid + 1 WHERE hash = :cat"), {"cat": cat}
+        )
+        connection.execute(
+            text("UPDATE photos SET rowid = rowid - 1 WHERE hash = :dog"), {"dog": dog}
+        )
+    with session_maker() as db:
+        assert found(db, "dog") != [dog]
+    init_db(engine)
+    with session_maker() as db:
+        assert found(db, "dog") == [dog]
+        assert found(db, "cat") == [cat]
+    engine.dispose()
+
+
+def test_search_endpoint(test_app: TestClient) -> None:
+    with test_app.app.state.db_sessionmaker() as db:  # type: ignore[attr-defined]
+        seed(db, [f"red kite {i}" for i in range(5)] + ["blue tit"])
+    items: list[dict[str, Any]] = []
+    cursor = None
+    while True:
+        params = {"q": "red", "limit": 2, **({"cursor": cursor} if cursor else {})}
+        resp = test_app.get("/photos/search", params=params)
+        assert resp.status_code == 200
+        items.extend(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    assert len(items) == 5
+    assert all(item["caption"].startswith("red kite") for item in items)
+    assert test_app.get("/photos/search", params={"q": "ti"}).json()[0]["caption"] == (
+        "blue tit"
+    )
+
+    resp = test_app.get("/photos/search", params={"q": "red", "limit": 2})
+    cursor = resp.headers["X-Next-Cursor"]
+    resp = test_app.get("/photos/search", params={"q": "kite", "cursor": cursor})
+    assert resp.status_code == 400
+    # Search and listing cursors are not interchangeable
+    resp = test_app.get("/photos", params={"cursor": cursor})
+    assert resp.status_code == 400
+    listing = test_app.get("/photos", params={"limit": 1}).headers["X-Next-Cursor"]
+    resp = test_app.get("/photos/search", params={"q": "red", "cursor": listing})
+    assert resp.status_code == 400
+    assert test_app.get("/photos/search", params={"q": ""}).status_code == 422
+    assert test_app.get("/photos/search", params={"q": "?!"}).json() == []
@@ -0,0 +1,67 @@
+from pathlib import Path
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from app.db import (
+    DATA_VERSION,
+    Base,
+    create_db_engine,
+    create_sessionmaker,
+    init_db,
+)
+from app.main import create_app
+
+
+def test_engine_applies_sqlite_pragmas(tmp_path: Path) -> None:
+    engine = create_db_engine(tmp_path / "pragmas.db")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        # synchronous=NORMAL is reported as 1
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1
+        assert conn.execute(text("PRAGMA cache_size")).scalar() == -64 * 1024
+    engine.dispose()
+
+
+def test_app_shares_one_engine_and_closes_sessions(tmp_path: Path) -> None:
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    app = create_app(photos_dir=photos_dir, db_path=tmp_path / "shared.db")
+    engine = app.state.db_engine
+    assert app.state.db_sessionmaker.kw["bind"] is engine
+    with TestClient(app) as client:
+        for _ in range(20):
+            assert client.get("/photos").status_code == 200
+        # Every request session was returned to the pool
+        assert engine.pool.checkedout() == 0
+
+
+def test_init_db_creates_tables(tmp_path: Path) -> None:
+    engine = create_db_engine(tmp_path / "init.db")
+    init_db(engine)
+    session_maker = create_sessionmaker(engine)
+    with session_maker() as session:
+        assert session.execute(text("SELECT COUNT(*) FROM photos")).scalar() == 0
+    engine.dispose()
+
+
+def test_init_db_clears_blank_captions_once(tmp_path: Path) -> None:
+    engine = create_db_engine(tmp_path / "blank.db")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            text(
+                "INSERT INTO photos (hash, filename, caption) VALUES "
+                "('a', 'a.jpg', '  '), ('b', 'b.jpg', ''), ('c', 'c.jpg', 'kept')"
+            )
+        )
+    init_db(engine)
+    with engine.begin() as conn:
+        captions = dict(conn.execute(text("SELECT hash, caption FROM photos")).all())
+        assert captions == {"a": None, "b": None, "c": "kept"}
+        assert conn.execute(text("PRAGMA user_version")).scalar() == DATA_VERSION
+        # Not repeated on later starts
+        conn.execute(text("UPDATE photos SET caption = ' ' WHERE hash = 'a'"))
+    init_db(engine)
+    with engine.connect() as conn:
+        caption = conn.execute(text("SELECT caption FROM photos WHERE hash = 'a'"))
+        assert caption.scalar() == " "
+    engine.dispose()
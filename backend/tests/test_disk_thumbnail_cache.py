@@ -0,0 +1,99 @@
+import io
+import os
+import time
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import (
+    DiskThumbnailCache,
+    get_thumbnail_path,
+    thumbnail_cache_key,
+)
+
+
+def test_put_get_and_atomic_write(tmp_path: Path) -> None:
+    cache = DiskThumbnailCache(tmp_path / "thumbs", max_bytes=1000)
+    assert cache.get("missing") is None
+    cache.put("abc", b"thumbnail-bytes")
+    assert cache.get("abc") == b"thumbnail-bytes"
+    assert get_thumbnail_path(tmp_path / "thumbs", "abc").read_bytes() == (
+        b"thumbnail-bytes"
+    )
+    # Only the final file is left behind, no temp files
+    assert os.listdir(tmp_path / "thumbs") == ["abc.thumb"]
+    cache.put("abc", b"new")
+    assert cache.get("abc") == b"new"
+    assert cache.current_bytes == 3
+
+
+def test_size_cap_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = DiskThumbnailCache(tmp_path, max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"5678")
+    assert cache.get("a") == b"1234"  # a is now more recent than b
+    cache.put("c", b"9012")
+    assert cache.get("b") is None
+    assert not get_thumbnail_path(tmp_path, "b").exists()
+    assert cache.get("a") == b"1234" and cache.get("c") == b"9012"
+    cache.put("too-big", b"x" * 11)
+    assert cache.get("too-big") is None
+    cache.clear()
+    assert cache.current_bytes == 0 and os.listdir(tmp_path) == []
+
+
+def test_index_is_reloaded_in_lru_order(tmp_path: Path) -> None:
+    cache = DiskThumbnailCache(tmp_path, max_bytes=100)
+    for key in ("old", "mid", "new"):
+        cache.put(key, b"12345")
+    now = time.time()
+    for age, key in ((300, "old"), (200, "mid"), (100, "new")):
+        os.utime(get_thumbnail_path(tmp_path, key), (now - age, now - age))
+    stale_tmp = tmp_path / "crashed.tmp"
+    stale_tmp.write_bytes(b"partial")
+    os.utime(stale_tmp, (now - 7200, now - 7200))
+
+    reloaded = DiskThumbnailCache(tmp_path, max_bytes=10)
+    # Over the new cap on load: the oldest entry goes first
+    assert list(reloaded.index) == ["mid", "new"]
+    assert reloaded.current_bytes == 10
+    assert not stale_tmp.exists()
+
+
+def test_max_age_drops_stale_entries(tmp_path: Path) -> None:
+    cache = DiskThumbnailCache(tmp_path, max_bytes=100, max_age=60)
+    cache.put("fresh", b"1")
+    cache.put("stale", b"2")
+    cache.index["stale"] = (1, time.time() - 120)
+    assert cache.get("stale") is None
+    assert cache.get("fresh") == b"1"
+
+
+def test_thumbnail_survives_restart_via_disk_tier(
+    tmp_path: Path, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app.main import create_app
+
+    monkeypatch.setenv("THUMBNAIL_CACHE_DIR", str(tmp_path / "thumbcache"))
+    buf = io.BytesIO()
+    Image.new("RGB", (400, 300), (1, 2, 3)).save(buf, format="PNG")
+    app = create_app(photos_dir=temp_photos_dir, db_path=tmp_path / "disk.db")
+    with TestClient(app) as client:
+        hash = client.post(
+            "/photos", files={"file": ("disk.png", buf.getvalue(), "image/png")}
+        ).json()["hash"]
+        first = client.get(f"/photos/{hash}/thumbnail").content
+    key = thumbnail_cache_key(hash, 256)
+    assert get_thumbnail_path(tmp_path / "thumbcache", key).exists()
+    assert not any(p.name.endswith(".thumb") for p in temp_photos_dir.iterdir())
+
+    # A fresh app has an empty memory cache but must not decode the image again
+    monkeypatch.setattr(
+        "app.image_utils.generate_thumbnail",
+        lambda *a, **kw: (_ for _ in ()).throw(AssertionError("decoded")),  # type: ignore
+    )
+    app2 = create_app(photos_dir=temp_photos_dir, db_path=tmp_path / "disk.db")
+    with TestClient(app2) as client:
+        resp = client.get(f"/photos/{hash}/thumbnail")
+        assert resp.status_code == 200
+        assert resp.content == first
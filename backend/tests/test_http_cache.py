@@ -0,0 +1,57 @@
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+@pytest.mark.parametrize(
+    "suffix, etag_suffix", [("image", ""), ("thumbnail", "-256-jpeg")]
+)
+def test_content_addressed_responses_are_immutable(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    suffix: str,
+    etag_suffix: str,
+) -> None:
+    hash = upload_image("cached.png", (300, 200), (10, 20, 30))
+    resp = test_app.get(f"/photos/{hash}/{suffix}")
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == f'"{hash}{etag_suffix}"'
+    assert resp.headers["cache-control"] == IMMUTABLE
+
+    revalidate = test_app.get(
+        f"/photos/{hash}/{suffix}", headers={"If-None-Match": resp.headers["etag"]}
+    )
+    assert revalidate.status_code == 304
+    assert revalidate.content == b""
+    assert revalidate.headers["etag"] == resp.headers["etag"]
+    assert revalidate.headers["cache-control"] == IMMUTABLE
+
+    # Weak and list forms match too; a different tag does not
+    weak = test_app.get(
+        f"/photos/{hash}/{suffix}",
+        headers={"If-None-Match": f'"other", W/{resp.headers["etag"]}'},
+    )
+    assert weak.status_code == 304
+    other = test_app.get(
+        f"/photos/{hash}/{suffix}", headers={"If-None-Match": '"other"'}
+    )
+    assert other.status_code == 200
+
+
+def test_not_modified_skips_db_and_decode(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    hash = upload_image("cached.png", (300, 200), (10, 20, 30))
+
+    def fail(*args: object, **kwargs: object) -> None:
+        raise AssertionError("should not be called on a 304")
+
+    monkeypatch.setattr("app.routes.photos.get_photo_by_hash", fail)
+    monkeypatch.setattr("app.image_utils.get_or_create_thumbnail", fail)
+    for suffix, etag in (("image", f'"{hash}"'), ("thumbnail", f'"{hash}-256-jpeg"')):
+        resp = test_app.get(f"/photos/{hash}/{suffix}", headers={"If-None-Match": etag})
+        assert resp.status_code == 304
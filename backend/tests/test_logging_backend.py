@@ -5,9 +5,6 @@ import logging
 from pathlib import Path
 from fastapi.testclient import TestClient
 from app.main import create_app
-from app.db import Base
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
 from typing import Any
 import pytest
 from pytest import MonkeyPatch
@@ -124,9 +121,6 @@ def test_logging_image_scan(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
 
     # Setup temp DB
     db_fd, db_path = tempfile.mkstemp()
-    engine = create_engine(f"sqlite:///{db_path}")
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.create_all(bind=engine)
 
     # Re-initialize logging so it uses the temp log dir
     from app.logging_config import setup_logging
@@ -140,8 +134,7 @@ def test_logging_image_scan(tmp_path: Path, monkeypatch: MonkeyPatch) -> None:
     importlib.reload(image_utils)
 
     # Create app with temp dirs
-    app = create_app(photos_dir=photos_dir)
-    app.state.db_sessionmaker = TestingSessionLocal
+    app = create_app(photos_dir=photos_dir, db_path=db_path)
     with TestClient(app):
         pass  # triggers scan on startup
 
@@ -0,0 +1,106 @@
+import io
+import re
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import LRUThumbnailCache
+from app.metrics import (
+    HTTP_REQUEST_SECONDS,
+    SCAN_FILES,
+    THUMBNAIL_RENDER_SECONDS,
+    Counter,
+    Histogram,
+)
+
+
+def sample(text: str, name: str, **labels: str) -> float:
+    """
+    Value of one sample in Prometheus text output (labels must match exactly).
+    """
+    label_text = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    pattern = re.escape(name + (f"{{{label_text}}}" if labels else "")) + r" (\S+)"
+    match = re.search(r"^" + pattern + r"$", text, re.MULTILINE)
+    assert match, f"{name} {labels} not in metrics"
+    return float(match.group(1))
+
+
+def test_counter_and_histogram_text_format() -> None:
+    counter = Counter("demo_total", "A demo counter.", ("kind",))
+    counter.inc(kind='quo"te')
+    counter.inc(2, kind='quo"te')
+    assert counter.render() == (
+        "# HELP demo_total A demo counter.\n"
+        "# TYPE demo_total counter\n"
+        'demo_total{kind="quo\\"te"} 3\n'
+    )
+    histogram = Histogram("demo_seconds", "A demo histogram.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 3.0):
+        histogram.observe(value)
+    assert histogram.render().splitlines()[2:] == [
+        'demo_seconds_bucket{le="0.1"} 1',
+        'demo_seconds_bucket{le="1"} 3',
+        'demo_seconds_bucket{le="+Inf"} 4',
+        "demo_seconds_sum 4.25",
+        "demo_seconds_count 4",
+    ]
+
+
+def test_lru_cache_counts_hits_misses_and_evictions() -> None:
+    cache = LRUThumbnailCache(max_bytes=10)
+    assert cache.get("a") is None
+    cache.put("a", b"12345")
+    cache.put("b", b"12345")
+    assert cache.get("a") == b"12345"
+    cache.put("c", b"12345")  # evicts b
+    assert (cache.hits, cache.misses, cache.evictions, cache.entries) == (1, 1, 1, 2)
+
+
+def test_metrics_endpoint(test_app: TestClient) -> None:
+    rendered_before = THUMBNAIL_RENDER_SECONDS.count(source="original")
+    route = "/photos/{hash}/thumbnail"
+    requests_before = HTTP_REQUEST_SECONDS.count(
+        method="GET", route=route, status="200"
+    )
+    buf = io.BytesIO()
+    Image.new("RGB", (400, 300), (7, 7, 7)).save(buf, format="PNG")
+    hash = test_app.post(
+        "/photos", files={"file": ("m.png", buf.getvalue(), "image/png")}
+    ).json()["hash"]
+    for _ in range(3):
+        assert test_app.get(f"/photos/{hash}/thumbnail").status_code == 200
+
+    resp = test_app.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain; version=0.0.4")
+    text = resp.text
+    assert sample(text, "captioner_thumbnail_cache_hits_total", tier="memory") == 2
+    assert sample(text, "captioner_thumbnail_cache_misses_total", tier="memory") >= 1
+    assert sample(text, "captioner_thumbnail_cache_entries", tier="memory") >= 1
+    assert sample(text, "captioner_thumbnail_cache_bytes", tier="memory") > 0
+    assert sample(text, "captioner_thumbnail_cache_max_bytes", tier="disk") > 0
+    assert sample(text, "captioner_thumbnail_flights_total", role="leader") == 1
+    assert THUMBNAIL_RENDER_SECONDS.count(source="original") == rendered_before + 1
+    assert (
+        HTTP_REQUEST_SECONDS.count(method="GET", route=route, status="200")
+        == requests_before + 3
+    )
+    assert (
+        sample(
+            text,
+            "captioner_http_request_duration_seconds_count",
+            method="GET",
+            route=route,
+            status="200",
+        )
+        >= 3
+    )
+    # The startup scan of the (empty) folder is recorded too
+    assert 'captioner_scan_duration_seconds_count{kind="full"}' in text
+    assert SCAN_FILES.value(kind="full", result="seen") >= 0
+
+
+def test_unmatched_routes_share_one_label(test_app: TestClient) -> None:
+    before = HTTP_REQUEST_SECONDS.count(method="GET", route="<unmatched>", status="404")
+    test_app.get("/no/such/path")
+    test_app.get("/another/missing/path")
+    after = HTTP_REQUEST_SECONDS.count(method="GET", route="<unmatched>", status="404")
+    assert after == before + 2
@@ -0,0 +1,105 @@
+import hashlib
+import pytest
+from pathlib import Path
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+from app.crud import get_all_photos, get_file_index, update_photo_caption
+from app.image_utils import get_image_file_path, scan_photos_folder_on_startup
+from app.migrate_layout import migrate_to_sharded
+from app.photo_layout import get_photo_layout, photo_storage_path, sharded_photo_path
+
+
+def sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_storage_paths(monkeypatch: pytest.MonkeyPatch) -> None:
+    digest = sha(b"photo")
+    assert (
+        sharded_photo_path(digest, ".JPG") == f"{digest[:2]}/{digest[2:4]}/{digest}.jpg"
+    )
+    assert photo_storage_path(digest, "a.jpg", "flat") == "a.jpg"
+    monkeypatch.setenv("PHOTO_LAYOUT", "sharded")
+    assert photo_storage_path(digest, "a.jpg") == sharded_photo_path(digest, ".jpg")
+    monkeypatch.setenv("PHOTO_LAYOUT", "nested")
+    with pytest.raises(ValueError):
+        get_photo_layout()
+
+
+def test_sharded_upload(
+    test_app: TestClient, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("PHOTO_LAYOUT", "sharded")
+    resp = test_app.post("/photos", files={"file": ("a.jpg", b"photo-a", "image/jpeg")})
+    assert resp.status_code == 201
+    assert resp.json()["filename"] == "a.jpg"
+    path = sharded_photo_path(sha(b"photo-a"), ".jpg")
+    assert (temp_photos_dir / path).read_bytes() == b"photo-a"
+    assert not (temp_photos_dir / "a.jpg").exists()
+    image = test_app.get(f"/photos/{sha(b'photo-a')}/image")
+    assert image.status_code == 200 and image.content == b"photo-a"
+
+
+def test_sharded_bulk_ingest_keeps_same_names(
+    test_app: TestClient, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("PHOTO_LAYOUT", "sharded")
+    files = [
+        ("files", ("IMG_0001.jpg", b"card-1", "image/jpeg")),
+        ("files", ("IMG_0001.jpg", b"card-2", "image/jpeg")),
+    ]
+    body = test_app.post("/photos/bulk", files=files).json()
+    assert body["added"] == 2
+    for data in (b"card-1", b"card-2"):
+        assert (temp_photos_dir / sharded_photo_path(sha(data), ".jpg")).exists()
+
+
+def test_scan_indexes_shard_folders(tmp_path: Path, db_session: Session) -> None:
+    photos_dir = tmp_path / "photos"
+    path = photos_dir / sharded_photo_path(sha(b"sharded"), ".png")
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"sharded")
+    (photos_dir / "flat.jpg").write_bytes(b"flat")
+    # Not a shard folder, so not scanned
+    (photos_dir / "exports").mkdir()
+    (photos_dir / "exports" / "b.jpg").write_bytes(b"export")
+    stats = scan_photos_folder_on_startup(photos_dir, db_session)
+    assert stats.files_added == 2
+    relative = str(path.relative_to(photos_dir))
+    assert set(get_file_index(db_session)) == {"flat.jpg", relative}
+    assert get_image_file_path(photos_dir, sha(b"sharded"), ".png") == path
+
+    stats = scan_photos_folder_on_startup(photos_dir, db_session)
+    assert stats.files_hashed == 0
+
+
+def test_migrate_to_sharded(tmp_path: Path, db_session: Session) -> None:
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "a.jpg").write_bytes(b"photo-a")
+    (photos_dir / "b.PNG").write_bytes(b"photo-b")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    update_photo_caption(db_session, sha(b"photo-a"), "a caption")
+    # Added after the scan, so not yet indexed
+    (photos_dir / "c.jpg").write_bytes(b"photo-c")
+
+    stats = migrate_to_sharded(photos_dir, db_session, dry_run=True)
+    assert (stats.moved, stats.hashed) == (3, 1)
+    assert sorted(p.name for p in photos_dir.iterdir()) == ["a.jpg", "b.PNG", "c.jpg"]
+
+    stats = migrate_to_sharded(photos_dir, db_session, batch_size=2)
+    assert (stats.moved, stats.hashed, stats.duplicates) == (3, 1, 0)
+    expected = {
+        sharded_photo_path(sha(b"photo-a"), ".jpg"),
+        sharded_photo_path(sha(b"photo-b"), ".png"),
+        sharded_photo_path(sha(b"photo-c"), ".jpg"),
+    }
+    assert set(get_file_index(db_session)) == expected
+    assert all((photos_dir / path).is_file() for path in expected)
+    photos = {p.filename_value: p for p in get_all_photos(db_session)}
+    assert set(photos) == {"a.jpg", "b.PNG", "c.jpg"}
+    assert photos["a.jpg"].caption_value == "a caption"
+    # Nothing left to hash or remove on the next start
+    stats = scan_photos_folder_on_startup(photos_dir, db_session)
+    assert (stats.files_hashed, stats.files_added) == (0, 0)
+    assert len(get_all_photos(db_session)) == 3
@@ -0,0 +1,121 @@
+import asyncio
+import io
+import threading
+from concurrent.futures import Future
+import pytest
+from pathlib import Path
+from typing import Callable
+from fastapi.testclient import TestClient
+from PIL import Image
+
+
+def test_preview_is_display_sized_progressive_jpeg(
+    test_app: TestClient, upload_image: Callable[..., str], tmp_path: Path
+) -> None:
+    photo_hash = upload_image("big.tif", (3000, 2000), (200, 120, 40))
+    resp = test_app.get(f"/photos/{photo_hash}/preview")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
+    assert "Accept" in resp.headers["vary"]
+    with Image.open(io.BytesIO(resp.content)) as img:
+        assert img.size == (2048, 1365)
+        assert img.info.get("progressive")
+    assert len(list((tmp_path / "previews").glob("*.thumb"))) == 1
+
+    # Stored on disk: later requests are served from there
+    again = test_app.get(f"/photos/{photo_hash}/preview")
+    assert again.content == resp.content
+    store = getattr(test_app.app, "state").preview_cache
+    assert (store.hits, store.misses) == (1, 1)
+    etag = resp.headers["etag"]
+    resp = test_app.get(
+        f"/photos/{photo_hash}/preview", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+
+
+def test_preview_format_and_size(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("PREVIEW_SIZE", "1024")
+    photo_hash = upload_image("big.tif", (800, 600), (200, 120, 40))
+    resp = test_app.get(
+        f"/photos/{photo_hash}/preview",
+        headers={"Accept": "image/avif,image/webp,*/*"},
+    )
+    # AVIF is never chosen for previews
+    assert resp.headers["content-type"] == "image/webp"
+    with Image.open(io.BytesIO(resp.content)) as img:
+        # Smaller originals are not upscaled
+        assert img.size == (800, 600)
+    assert test_app.get("/photos/unknown/preview").status_code == 404
+
+
+def test_preview_render_does_not_hold_a_connection(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    photo_hash = upload_image("big.tif", (400, 300), (200, 120, 40))
+    render: Future[bytes] = Future()
+    submitted = threading.Event()
+    on_event_loop: list[bool] = []
+
+    def submit(path: Path, max_size: int, fmt: str, **options: bool) -> Future[bytes]:
+        assert options == {"progressive": True}
+        try:
+            asyncio.get_running_loop()
+            on_event_loop.append(True)
+        except RuntimeError:
+            on_event_loop.append(False)
+        submitted.set()
+        return render
+
+    state = getattr(test_app.app, "state")
+    monkeypatch.setattr(state.thumbnail_pool, "workers", 1)
+    monkeypatch.setattr(state.thumbnail_pool, "submit", submit)
+    responses: list[int] = []
+    request = threading.Thread(
+        target=lambda: responses.append(
+            test_app.get(f"/photos/{photo_hash}/preview").status_code
+        )
+    )
+    request.start()
+    try:
+        assert submitted.wait(5)
+        assert state.db_sessionmaker.kw["bind"].pool.checkedout() == 0
+    finally:
+        render.set_result(b"preview")
+        request.join(5)
+    assert responses == [200]
+    # Submitted and awaited on the event loop, not from a threadpool thread
+    assert on_event_loop == [True]
+
+
+def test_original_supports_range_requests(test_app: TestClient) -> None:
+    data = bytes(range(256)) * 4096
+    photo_hash = test_app.post(
+        "/photos", files={"file": ("a.jpg", data, "image/jpeg")}
+    ).json()["hash"]
+    url = f"/photos/{photo_hash}/image"
+    full = test_app.get(url)
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.content == data
+
+    resp = test_app.get(url, headers={"Range": "bytes=1000-1999"})
+    assert resp.status_code == 206
+    assert resp.headers["content-range"] == f"bytes 1000-1999/{len(data)}"
+    assert resp.content == data[1000:2000]
+    resp = test_app.get(url, headers={"Range": "bytes=-100"})
+    assert resp.content == data[-100:]
+
+    # A stale validator gets the whole file
+    etag = full.headers["etag"]
+    resp = test_app.get(url, headers={"Range": "bytes=0-9", "If-Range": etag})
+    assert resp.status_code == 206
+    resp = test_app.get(url, headers={"Range": "bytes=0-9", "If-Range": '"other"'})
+    assert resp.status_code == 200 and len(resp.content) == len(data)
+    resp = test_app.get(url, headers={"Range": f"bytes={len(data)}-"})
+    assert resp.status_code == 416
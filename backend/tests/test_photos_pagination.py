@@ -0,0 +1,97 @@
+from typing import Any
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app.crud import bulk_add_photos, update_photo_caption
+
+
+def seed(client: TestClient, count: int) -> list[tuple[str, str]]:
+    rows = [(f"{i:064x}", f"img_{(i * 7) % count:03d}.jpg") for i in range(count)]
+    with client.app.state.db_sessionmaker() as db:  # type: ignore[attr-defined]
+        bulk_add_photos(db, rows)
+        db.commit()
+        for hash, _ in rows[::3]:
+            update_photo_caption(db, hash, f"caption {hash[-3:]}")
+    return rows
+
+
+def walk(client: TestClient, **params: Any) -> list[dict[str, Any]]:
+    items: list[dict[str, Any]] = []
+    cursor = None
+    while True:
+        query = dict(params, **({"cursor": cursor} if cursor else {}))
+        resp = client.get("/photos", params=query)
+        assert resp.status_code == 200
+        items.extend(resp.json())
+        cursor = resp.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return items
+
+
+def test_pages_cover_library_in_filename_order(test_app: TestClient) -> None:
+    rows = seed(test_app, 25)
+    first = test_app.get("/photos", params={"limit": 10})
+    assert len(first.json()) == 10
+    assert "X-Next-Cursor" in first.headers
+    items = walk(test_app, limit=10)
+    assert len(items) == 25
+    keys = [(p["filename"], p["hash"]) for p in items]
+    assert keys == sorted((f, h) for h, f in rows)
+    desc = walk(test_app, limit=7, order="desc")
+    assert [(p["filename"], p["hash"]) for p in desc] == keys[::-1]
+
+
+def test_sort_by_hash_and_filters(test_app: TestClient) -> None:
+    rows = seed(test_app, 25)
+    by_hash = walk(test_app, limit=4, sort="hash")
+    assert [p["hash"] for p in by_hash] == sorted(h for h, _ in rows)
+    captioned = walk(test_app, limit=4, captioned=True)
+    assert len(captioned) == 9 and all(p["caption"] for p in captioned)
+    uncaptioned = walk(test_app, limit=4, sort="hash", captioned=False)
+    assert len(uncaptioned) == 16 and all(p["caption"] is None for p in uncaptioned)
+    prefixed = walk(test_app, limit=3, prefix="img_01")
+    assert sorted(p["filename"] for p in prefixed) == [
+        f"img_{i:03d}.jpg" for i in range(10, 20)
+    ]
+
+
+def test_blank_caption_counts_as_uncaptioned(test_app: TestClient) -> None:
+    rows = seed(test_app, 3)
+    resp = test_app.patch(f"/photos/{rows[0][0]}/caption", json={"caption": "  "})
+    assert resp.json()["caption"] is None
+    assert len(walk(test_app, captioned=False)) == 3
+
+
+def test_invalid_cursor(test_app: TestClient) -> None:
+    seed(test_app, 5)
+    assert test_app.get("/photos", params={"cursor": "!!!"}).status_code == 400
+    cursor = test_app.get("/photos", params={"limit": 2}).headers["X-Next-Cursor"]
+    resp = test_app.get("/photos", params={"cursor": cursor, "sort": "hash"})
+    assert resp.status_code == 400
+    assert test_app.get("/photos", params={"limit": 0}).status_code == 422
+
+
+@pytest.mark.parametrize(
+    "where, order_by",
+    [
+        ("", "filename, hash"),
+        ("caption IS NULL AND", "filename, hash"),
+        ("caption IS NOT NULL AND", "filename, hash"),
+        ("caption IS NULL AND", "hash"),
+        ("caption IS NOT NULL AND", "hash"),
+    ],
+)
+def test_page_queries_use_an_index(
+    db_session: Session, where: str, order_by: str
+) -> None:
+    key = "(filename, hash) > ('a', 'b')" if "," in order_by else "hash > 'b'"
+    plan = db_session.execute(
+        text(
+            f"EXPLAIN QUERY PLAN SELECT * FROM photos WHERE {where} {key} "
+            f"ORDER BY {order_by} LIMIT 101"
+        )
+    ).fetchall()
+    details = " ".join(str(row[-1]) for row in plan)
+    assert "USING INDEX" in details or "USING COVERING INDEX" in details
+    assert "TEMP B-TREE" not in details
@@ -0,0 +1,70 @@
+from collections import Counter
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from app import crud
+from app.crud import (
+    bulk_add_photos,
+    delete_photos,
+    get_random_photo,
+    update_photo_caption,
+)
+from app.image_utils import hash_image_bytes
+
+
+def test_random_photo_404_when_empty(test_app: TestClient) -> None:
+    resp = test_app.get("/photos/random")
+    assert resp.status_code == 404
+    assert resp.json() == {"detail": "Photo not found."}
+
+
+def test_random_photo_returns_a_photo(test_app: TestClient) -> None:
+    upload = test_app.post(
+        "/photos", files={"file": ("only.jpeg", b"only-photo", "image/jpeg")}
+    ).json()
+    resp = test_app.get("/photos/random")
+    assert resp.status_code == 200
+    assert resp.json() == upload
+
+
+def test_random_photo_uncaptioned_filter(test_app: TestClient) -> None:
+    with test_app.app.state.db_sessionmaker() as db:  # type: ignore[attr-defined]
+        bulk_add_photos(db, [(f"{i:064x}", f"{i}.jpg") for i in range(1, 21)])
+        db.commit()
+        for i in range(1, 20):
+            update_photo_caption(db, f"{i:064x}", "done")
+    for _ in range(10):
+        resp = test_app.get("/photos/random", params={"uncaptioned": "true"})
+        assert resp.json()["filename"] == "20.jpg"
+
+
+def test_random_photo_is_uniform_over_real_hashes(
+    db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    # Real digests leave uneven gaps between neighbouring hashes
+    hashes = [hash_image_bytes(b"%d" % i) for i in range(12)]
+    bulk_add_photos(db_session, [(h, f"{i}.jpg") for i, h in enumerate(hashes)])
+    db_session.commit()
+    # Deleted rows leave gaps in the rowids too
+    delete_photos(db_session, hashes[8:11])
+    db_session.commit()
+    kept = {f"{i}.jpg" for i in [*range(8), 11]}
+    draws = 1800
+    for tries in (crud.RANDOM_PHOTO_TRIES, 0):
+        # 0 tries goes straight to the offset fallback
+        monkeypatch.setattr(crud, "RANDOM_PHOTO_TRIES", tries)
+        seen = Counter(
+            get_random_photo(db_session).filename_value  # type: ignore[union-attr]
+            for _ in range(draws)
+        )
+        assert set(seen) == kept
+        # 200 each expected; a fair pick stays well within +-80 (about 6 sigma)
+        assert all(abs(n - draws / len(kept)) < 80 for n in seen.values()), seen
+
+
+def test_random_photo_looks_up_rowids_by_key(db_session: Session) -> None:
+    plan = db_session.execute(
+        text("EXPLAIN QUERY PLAN SELECT * FROM photos WHERE rowid = 5")
+    ).fetchall()
+    assert "INTEGER PRIMARY KEY" in " ".join(str(row[-1]) for row in plan)
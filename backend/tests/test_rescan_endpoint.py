@@ -1,19 +1,38 @@
+import threading
+import time
+import uuid
 from pathlib import Path
+from typing import Any
+import pytest
 from fastapi.testclient import TestClient
 
 
+def wait_for_job(client: TestClient, job_id: str, timeout: float = 5.0) -> Any:
+    deadline = time.monotonic() + timeout
+    while True:
+        job = client.get(f"/rescan/{job_id}").json()
+        if job["status"] != "running" or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
 def test_rescan_endpoint_adds_new_image(
     test_app: TestClient, temp_photos_dir: Path
 ) -> None:
     # Place a new image in the folder
-    import uuid
-
     img_path = temp_photos_dir / "test1.jpg"
     img_path.write_bytes(b"fakeimagedata1_" + uuid.uuid4().hex.encode())
     # Call rescan endpoint
     resp = test_app.post("/rescan")
-    assert resp.status_code == 200
-    assert resp.json() == {"detail": "Rescan started."}
+    assert resp.status_code == 202
+    body = resp.json()
+    assert body["detail"] == "Rescan started."
+    job = wait_for_job(test_app, body["job_id"])
+    assert job["status"] == "completed"
+    assert job["files_seen"] == 1
+    assert job["files_hashed"] == 1
+    assert job["files_added"] == 1
+    assert job["elapsed"] >= 0
     # Check that the image is now in /photos
     photos = test_app.get("/photos").json()
     assert any(p["filename"] == "test1.jpg" for p in photos)
@@ -22,16 +41,143 @@ def test_rescan_endpoint_adds_new_image(
 def test_rescan_endpoint_idempotent(
     test_app: TestClient, temp_photos_dir: Path
 ) -> None:
-    import uuid
-
     img_path = temp_photos_dir / "test2.png"
     img_path.write_bytes(b"fakeimagedata2_" + uuid.uuid4().hex.encode())
     # First rescan
     resp1 = test_app.post("/rescan")
-    assert resp1.status_code == 200
+    assert resp1.status_code == 202
+    wait_for_job(test_app, resp1.json()["job_id"])
     # Second rescan (should not duplicate)
     resp2 = test_app.post("/rescan")
-    assert resp2.status_code == 200
+    assert resp2.status_code == 202
+    job = wait_for_job(test_app, resp2.json()["job_id"])
+    assert job["files_added"] == 0
     photos = test_app.get("/photos").json()
     filenames = [p["filename"] for p in photos]
     assert filenames.count("test2.png") == 1
+
+
+def test_rescan_job_404(test_app: TestClient) -> None:
+    resp = test_app.get("/rescan/doesnotexist")
+    assert resp.status_code == 404
+
+
+def test_rescan_coalesces_duplicate_triggers(
+    test_app: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app.image_utils import ScanStats
+
+    release = threading.Event()
+
+    def blocking_scan(*args: Any, **kwargs: Any) -> ScanStats:
+        release.wait(5)
+        return ScanStats()
+
+    monkeypatch.setattr("app.rescan_jobs.scan_photos_folder_on_startup", blocking_scan)
+    first = test_app.post("/rescan").json()
+    second = test_app.post("/rescan").json()
+    assert second == {"detail": "Rescan already running.", "job_id": first["job_id"]}
+    assert test_app.get(f"/rescan/{first['job_id']}").json()["status"] == "running"
+    release.set()
+    assert wait_for_job(test_app, first["job_id"])["status"] == "completed"
+    third = test_app.post("/rescan").json()
+    assert third["job_id"] != first["job_id"]
+
+
+def test_rescan_job_failure_is_reported(
+    test_app: TestClient, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def failing_scan(*args: Any, **kwargs: Any) -> None:
+        raise RuntimeError("disk on fire")
+
+    monkeypatch.setattr("app.rescan_jobs.scan_photos_folder_on_startup", failing_scan)
+    job_id = test_app.post("/rescan").json()["job_id"]
+    job = wait_for_job(test_app, job_id)
+    assert job["status"] == "failed"
+    assert job["error"] == "disk on fire"
+
+
+def test_interrupted_rescan_resumes_on_startup(
+    tmp_path: Path, temp_photos_dir: Path
+) -> None:
+    from app.crud import get_all_photos
+    from app.db import init_db
+    from app.main import create_app
+    from app.models import RescanJob
+
+    for i in range(6):
+        (temp_photos_dir / f"img{i}.jpg").write_bytes(f"resume{i}".encode())
+    app = create_app(photos_dir=temp_photos_dir, db_path=tmp_path / "resume.db")
+    # The job is recorded before startup, which is what creates the tables
+    init_db(app.state.db_engine)
+    session_maker = app.state.db_sessionmaker
+    # Simulate a job that committed its first batch before the server died
+    from app.image_utils import scan_photos_folder_on_startup
+
+    with session_maker() as db:
+        # Asked to stop while hashing the second file
+        checks = iter([False, True])
+        stats = scan_photos_folder_on_startup(
+            temp_photos_dir, db, batch_size=10, should_stop=lambda: next(checks)
+        )
+        assert stats.interrupted and stats.files_added == 2
+        db.add(
+            RescanJob(
+                id="interrupted",
+                status="running",
+                files_hashed=2,
+                files_added=2,
+                started_at=time.time() - 10,
+            )
+        )
+        db.commit()
+
+    with TestClient(app) as client:
+        job = wait_for_job(client, "interrupted")
+        assert job["status"] == "completed"
+        assert job["files_seen"] == 6
+        # Only the four files after the checkpoint were hashed again
+        assert job["files_hashed"] == 6
+        assert job["files_added"] == 6
+        assert job["elapsed"] >= 10
+    with session_maker() as db:
+        assert len(get_all_photos(db)) == 6
+
+
+def test_shutdown_stops_after_the_current_file(
+    tmp_path: Path, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app import image_utils
+    from app.db import create_db_engine, create_sessionmaker, init_db
+    from app.rescan_jobs import RescanJobManager
+
+    for i in range(5):
+        (temp_photos_dir / f"img{i}.jpg").write_bytes(f"stop{i}".encode())
+    hashing = threading.Event()
+    release = threading.Event()
+    real_hash_file = image_utils.hash_file
+
+    def slow_hash_file(path: Path) -> str:
+        hashing.set()
+        release.wait(5)
+        return real_hash_file(path)
+
+    monkeypatch.setattr("app.image_utils.hash_file", slow_hash_file)
+    monkeypatch.setenv("SCAN_HASH_WORKERS", "1")
+    engine = create_db_engine(tmp_path / "stop.db")
+    init_db(engine)
+    session_maker = create_sessionmaker(engine)
+    jobs = RescanJobManager()
+    job_id, _ = jobs.start(temp_photos_dir, session_maker)
+    assert hashing.wait(5)
+    started = time.monotonic()
+    # The file being hashed does not finish in time; shutdown returns anyway
+    jobs.shutdown(timeout=0.2)
+    assert time.monotonic() - started < 1
+    release.set()
+    jobs.wait(5)
+    job = jobs.get(job_id, session_maker)
+    assert job is not None and str(job.status) == "running"
+    # Stopped after that file rather than at the end of a 500-file batch
+    assert (job.files_hashed, job.files_added) == (1, 1)
+    engine.dispose()
@@ -7,19 +7,12 @@ def test_detects_new_image_file_at_runtime(temp_photos_dir: Path) -> None:
     Start the app, then drop a new image file into photos/, poll /photos, and assert it is added to the DB.
     """
     from app.main import create_app
-    from app.db import Base
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
     import tempfile
     from fastapi.testclient import TestClient
     import os
 
     db_fd, db_path = tempfile.mkstemp()
-    engine = create_engine(f"sqlite:///{db_path}")
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.create_all(bind=engine)
-    app = create_app(photos_dir=temp_photos_dir)
-    app.state.db_sessionmaker = TestingSessionLocal
+    app = create_app(photos_dir=temp_photos_dir, db_path=db_path)
     with TestClient(app) as client:
         img_path = temp_photos_dir / "runtime1.jpg"
         img_path.write_bytes(b"runtimeimg1")
@@ -36,19 +36,12 @@ def test_scan_images_at_startup(temp_photos_dir: Path) -> None:
 
     # Now instantiate the app/TestClient so the scan sees the file
     from app.main import create_app
-    from app.db import Base
-    from sqlalchemy import create_engine
-    from sqlalchemy.orm import sessionmaker
     import tempfile
     from fastapi.testclient import TestClient
     import os
 
     db_fd, db_path = tempfile.mkstemp()
-    engine = create_engine(f"sqlite:///{db_path}")
-    TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-    Base.metadata.create_all(bind=engine)
-    app = create_app(photos_dir=temp_photos_dir)
-    app.state.db_sessionmaker = TestingSessionLocal
+    app = create_app(photos_dir=temp_photos_dir, db_path=db_path)
     with TestClient(app) as client:
         resp = client.get("/photos")
         assert resp.status_code == 200
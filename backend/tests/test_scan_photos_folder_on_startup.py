@@ -1,76 +1,254 @@
+import os
 import pytest
 from pathlib import Path
-
-
-class DummyDB:
-    def rollback(self):
-        self.rolled_back = True
+from sqlalchemy.orm import Session
+from app.crud import (
+    get_all_photos,
+    get_file_index,
+    get_photo_by_hash,
+    update_photo_caption,
+)
+from app.image_utils import hash_image_bytes
+from app.models import RemovedCaption
 
 
 def test_scan_photos_folder_on_startup_non_integrity_error(
-    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+    tmp_path: Path,
+    db_session: Session,
+    monkeypatch: pytest.MonkeyPatch,
+    caplog: pytest.LogCaptureFixture,
 ) -> None:
-    # Create a dummy image file
-    img_path = tmp_path / "test.png"
-    img_path.write_bytes(b"fakeimg")
-    # Patch add_photo to raise a ValueError (not IntegrityError)
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "test.png").write_bytes(b"fakeimg")
+    # Patch the bulk insert to raise a ValueError
     monkeypatch.setattr(
-        "app.image_utils.add_photo",
-        lambda db, sha, fn, caption=None: (_ for _ in ()).throw(ValueError("fail!")),  # type: ignore
+        "app.image_utils.bulk_add_photos",
+        lambda db, photos: (_ for _ in ()).throw(ValueError("fail!")),  # type: ignore
     )
-    # Patch get_photo_by_hash to always return None
-    monkeypatch.setattr("app.image_utils.get_photo_by_hash", lambda db, sha: None)  # type: ignore
     caplog.set_level("ERROR")
-    with pytest.raises(ValueError):
-        from app.image_utils import scan_photos_folder_on_startup
+    from app.image_utils import scan_photos_folder_on_startup
 
-        scan_photos_folder_on_startup(tmp_path, object())
+    with pytest.raises(ValueError):
+        scan_photos_folder_on_startup(photos_dir, db_session)
     assert any(
-        "Error adding photo during scan" in r.getMessage() for r in caplog.records
+        "Error adding photos during scan" in r.getMessage() for r in caplog.records
     )
+    # The failed batch was rolled back, index included
+    assert get_file_index(db_session) == {}
 
 
 def test_scan_photos_folder_on_startup(
-    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, caplog: pytest.LogCaptureFixture
+    tmp_path: Path, db_session: Session, caplog: pytest.LogCaptureFixture
 ) -> None:
-    # Create a dummy image file
-    img_path = tmp_path / "image1.jpg"
-    img_path.write_bytes(b"fake data")
-    # Patch get_image_file_path to return our image
-    monkeypatch.setattr(
-        "app.image_utils.get_image_file_path",
-        lambda db, sha, fn, caption=None: img_path,  # type: ignore
-    )
-    # Patch add_photo to do nothing
-    monkeypatch.setattr(
-        "app.crud.add_photo",
-        lambda db, sha, fn, caption=None: None,  # type: ignore
-    )
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "image1.jpg").write_bytes(b"fake data")
     caplog.set_level("INFO")
     from app.image_utils import scan_photos_folder_on_startup
 
-    class MockQuery:
-        def filter_by(self, **kwargs):
-            return self
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert any("Image created:" in r.getMessage() for r in caplog.records)
+    assert [p.filename_value for p in get_all_photos(db_session)] == ["image1.jpg"]
+    assert set(get_file_index(db_session)) == {"image1.jpg"}
 
-        def first(self):
-            return None
 
-    class MockDB:
-        def query(self, *args, **kwargs):
-            return MockQuery()
+def test_rescan_skips_unchanged_files(
+    tmp_path: Path, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app import image_utils
 
-        def add(self, obj):
-            pass
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "a.jpg").write_bytes(b"aaa")
+    (photos_dir / "b.png").write_bytes(b"bbb")
+    image_utils.scan_photos_folder_on_startup(photos_dir, db_session)
 
-        def commit(self):
-            pass
+    opened: list[str] = []
+    real_open = open
 
-        def refresh(self, obj):
-            pass
+    def tracking_open(file: object, *args: object, **kwargs: object):  # type: ignore
+        opened.append(str(file))
+        return real_open(file, *args, **kwargs)  # type: ignore
 
-        def rollback(self):
-            pass
+    monkeypatch.setattr("builtins.open", tracking_open)
+    image_utils.scan_photos_folder_on_startup(photos_dir, db_session)
+    assert not any(path.startswith(str(photos_dir)) for path in opened)
 
-    scan_photos_folder_on_startup(tmp_path, MockDB())
-    assert any("Image created:" in r.getMessage() for r in caplog.records)
+    # A changed file is re-hashed and picked up as a new photo
+    (photos_dir / "b.png").write_bytes(b"bbb-edited")
+    st = (photos_dir / "b.png").stat()
+    os.utime(photos_dir / "b.png", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    image_utils.scan_photos_folder_on_startup(photos_dir, db_session)
+    assert opened == [str(photos_dir / "b.png")]
+    # No file has the old content any more, so its photo is gone
+    photos = {p.hash_value for p in get_all_photos(db_session)}
+    assert photos == {hash_image_bytes(b"aaa"), hash_image_bytes(b"bbb-edited")}
+
+
+def test_rescan_forgets_deleted_files(tmp_path: Path, db_session: Session) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "gone.jpg").write_bytes(b"gone")
+    (photos_dir / "kept.jpg").write_bytes(b"kept")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert "gone.jpg" in get_file_index(db_session)
+    (photos_dir / "gone.jpg").unlink()
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert set(get_file_index(db_session)) == {"kept.jpg"}
+    assert [p.filename_value for p in get_all_photos(db_session)] == ["kept.jpg"]
+
+
+def test_rescan_of_empty_or_missing_folder_removes_nothing(
+    tmp_path: Path, db_session: Session, caplog: pytest.LogCaptureFixture
+) -> None:
+    import shutil
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "a.jpg").write_bytes(b"a")
+    (photos_dir / "b.jpg").write_bytes(b"b")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    update_photo_caption(db_session, hash_image_bytes(b"a"), "a caption")
+    # e.g. a network share that is not mounted yet
+    shutil.rmtree(photos_dir)
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    # The scan recreated it empty; scanning that is no different
+    assert photos_dir.is_dir()
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert set(get_file_index(db_session)) == {"a.jpg", "b.jpg"}
+    assert len(get_all_photos(db_session)) == 2
+    assert "is empty" in caplog.text
+
+
+def test_rescan_keeps_photos_when_most_files_are_gone(
+    tmp_path: Path, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    for i in range(4):
+        (photos_dir / f"{i}.jpg").write_bytes(b"%d" % i)
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    for i in range(3):
+        (photos_dir / f"{i}.jpg").unlink()
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert len(get_all_photos(db_session)) == 4
+    # Accepted once the limit is raised
+    monkeypatch.setenv("SCAN_MAX_REMOVED_FRACTION", "1")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert [p.filename_value for p in get_all_photos(db_session)] == ["3.jpg"]
+
+
+def test_caption_comes_back_with_the_file(tmp_path: Path, db_session: Session) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "keep.jpg").write_bytes(b"keep")
+    (photos_dir / "away.jpg").write_bytes(b"away")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    update_photo_caption(db_session, hash_image_bytes(b"away"), "moved out")
+    (photos_dir / "away.jpg").rename(tmp_path / "away.jpg")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    assert get_photo_by_hash(db_session, hash_image_bytes(b"away")) is None
+    (tmp_path / "away.jpg").rename(photos_dir / "back.jpg")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    photo = get_photo_by_hash(db_session, hash_image_bytes(b"away"))
+    assert photo is not None and photo.caption_value == "moved out"
+    assert db_session.query(RemovedCaption).count() == 0
+
+
+def test_rescan_keeps_photos_that_still_have_a_file(
+    tmp_path: Path, db_session: Session
+) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    (photos_dir / "a.jpg").write_bytes(b"same")
+    (photos_dir / "copy.jpg").write_bytes(b"same")
+    (photos_dir / "edited.jpg").write_bytes(b"before")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    (photos_dir / "a.jpg").unlink()
+    (photos_dir / "edited.jpg").write_bytes(b"after edit")
+    scan_photos_folder_on_startup(photos_dir, db_session)
+    # The copy keeps the shared photo; the edit replaces the old content's row
+    photos = {p.hash_value for p in get_all_photos(db_session)}
+    assert photos == {hash_image_bytes(b"same"), hash_image_bytes(b"after edit")}
+    assert set(get_file_index(db_session)) == {"copy.jpg", "edited.jpg"}
+
+
+def test_hash_file_reads_in_bounded_chunks(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import hashlib
+    import io
+    from app.image_utils import hash_file
+
+    data = os.urandom(300_000)
+    path = tmp_path / "big.tif"
+    path.write_bytes(data)
+    reads: list[int] = []
+    real_read = io.BufferedReader.read
+
+    class TrackingReader(io.BufferedReader):
+        def read(self, size: int | None = -1) -> bytes:
+            reads.append(-1 if size is None else size)
+            return real_read(self, size)
+
+    real_open = open
+    monkeypatch.setattr(
+        "builtins.open",
+        lambda f, mode="r", *a, **kw: TrackingReader(real_open(f, "rb", buffering=0)),  # type: ignore
+    )
+    assert hash_file(path, chunk_size=64 * 1024) == hashlib.sha256(data).hexdigest()
+    assert reads and all(0 < size <= 64 * 1024 for size in reads)
+
+
+def test_scan_reports_throughput_with_parallel_workers(
+    tmp_path: Path, db_session: Session
+) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    for i in range(12):
+        (photos_dir / f"img{i:02d}.jpg").write_bytes(os.urandom(1000 + i))
+    stats = scan_photos_folder_on_startup(photos_dir, db_session, workers=4)
+    assert stats.files_seen == stats.files_hashed == stats.files_added == 12
+    assert stats.bytes_hashed == sum(1000 + i for i in range(12))
+    assert stats.elapsed > 0 and stats.files_per_second > 0
+    assert stats.mb_per_second > 0
+    assert len(get_all_photos(db_session)) == 12
+    # Nothing changed, so a second scan hashes nothing
+    again = scan_photos_folder_on_startup(photos_dir, db_session, workers=4)
+    assert (again.files_seen, again.files_hashed, again.files_added) == (12, 0, 0)
+
+
+def test_scan_commits_in_batches_and_skips_duplicate_content(
+    tmp_path: Path, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app.image_utils import scan_photos_folder_on_startup
+
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    for i in range(5):
+        (photos_dir / f"img{i}.jpg").write_bytes(f"content{i}".encode())
+    (photos_dir / "copy.jpg").write_bytes(b"content0")
+    commits: list[int] = []
+    real_commit = db_session.commit
+    monkeypatch.setattr(
+        db_session, "commit", lambda: (commits.append(1), real_commit())[1]
+    )
+    stats = scan_photos_folder_on_startup(photos_dir, db_session, batch_size=2)
+    # 6 files in batches of 2, plus the final index-pruning commit
+    assert len(commits) == 4
+    assert stats.files_hashed == 6
+    assert stats.files_added == 5
+    assert len(get_all_photos(db_session)) == 5
+    assert len(get_file_index(db_session)) == 6
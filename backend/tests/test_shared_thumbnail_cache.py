@@ -0,0 +1,113 @@
+import multiprocessing
+from pathlib import Path
+import pytest
+from app import image_utils
+from app.shared_thumbnail_cache import SharedThumbnailCache
+
+KB = 1024
+
+
+def test_get_put_contains_and_clear(tmp_path: Path) -> None:
+    cache = SharedThumbnailCache(tmp_path / "thumbs.pack", max_bytes=64 * KB)
+    assert cache.get("a") is None
+    cache.put("a", b"1" * KB)
+    assert "a" in cache and "b" not in cache
+    assert cache.get("a") == b"1" * KB
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert (cache.entries, cache.current_bytes) == (1, KB)
+    cache.put("huge", b"x" * 65 * KB)
+    assert "huge" not in cache
+    cache.clear()
+    assert cache.get("a") is None and cache.entries == 0
+    cache.close()
+
+
+def test_ring_overwrites_oldest_entries(tmp_path: Path) -> None:
+    cache = SharedThumbnailCache(tmp_path / "thumbs.pack", max_bytes=10 * KB)
+    for i in range(15):
+        cache.put(f"k{i}", bytes([i]) * KB)
+    assert [f"k{i}" in cache for i in range(15)] == [False] * 5 + [True] * 10
+    assert cache.get("k14") == bytes([14]) * KB
+    assert (cache.entries, cache.evictions) == (10, 5)
+    cache.close()
+
+
+def test_hit_on_oldest_entry_keeps_it(tmp_path: Path) -> None:
+    cache = SharedThumbnailCache(tmp_path / "thumbs.pack", max_bytes=10 * KB)
+    for i in range(10):
+        cache.put(f"k{i}", bytes([i]) * KB)
+    # k0 is next to be overwritten; the hit moves it to the front of the ring
+    assert cache.get("k0") == b"\0" * KB
+    for i in range(10, 15):
+        cache.put(f"k{i}", bytes([i]) * KB)
+    assert cache.get("k0") == b"\0" * KB
+    assert "k1" not in cache
+    cache.close()
+
+
+def _put_from_other_process(path: Path) -> None:
+    cache = SharedThumbnailCache(path, max_bytes=64 * KB)
+    cache.put("from-child", b"c" * KB)
+    cache.close()
+
+
+def test_entries_are_shared_between_processes(tmp_path: Path) -> None:
+    path = tmp_path / "thumbs.pack"
+    first = SharedThumbnailCache(path, max_bytes=64 * KB)
+    second = SharedThumbnailCache(path, max_bytes=64 * KB)
+    first.put("a", b"a" * KB)
+    assert second.get("a") == b"a" * KB
+    # A duplicate put from another worker is not stored twice
+    second.put("a", b"a" * KB)
+    assert first.entries == 1 and first.evictions == 0
+    child = multiprocessing.get_context("fork").Process(
+        target=_put_from_other_process, args=(path,)
+    )
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    assert first.get("from-child") == b"c" * KB
+    first.close()
+    second.close()
+
+
+def test_file_for_another_size_is_reset(tmp_path: Path) -> None:
+    path = tmp_path / "thumbs.pack"
+    cache = SharedThumbnailCache(path, max_bytes=64 * KB)
+    cache.put("a", b"a" * KB)
+    cache.close()
+    reopened = SharedThumbnailCache(path, max_bytes=64 * KB)
+    assert reopened.get("a") == b"a" * KB
+    reopened.close()
+    resized = SharedThumbnailCache(path, max_bytes=128 * KB)
+    assert resized.get("a") is None
+    resized.close()
+
+
+def test_resizing_leaves_mapped_file_intact(tmp_path: Path) -> None:
+    path = tmp_path / "thumbs.pack"
+    old = SharedThumbnailCache(path, max_bytes=128 * KB)
+    old.put("a", b"a" * KB)
+    # A worker started with a smaller cache while the old one is still running
+    new = SharedThumbnailCache(path, max_bytes=64 * KB)
+    new.put("b", b"b" * KB)
+    # The old worker's mapping is untouched (truncating it would raise SIGBUS)
+    assert old.get("a") == b"a" * KB
+    old.put("c", b"c" * 100 * KB)
+    assert old.get("c") == b"c" * 100 * KB
+    joined = SharedThumbnailCache(path, max_bytes=64 * KB)
+    assert joined.get("b") == b"b" * KB and joined.get("a") is None
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["thumbs.pack"]
+    for cache in (old, new, joined):
+        cache.close()
+
+
+def test_shared_policy_from_env(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("THUMBNAIL_CACHE_POLICY", "shared")
+    monkeypatch.setenv("THUMBNAIL_SHARED_CACHE_PATH", str(tmp_path / "thumbs.pack"))
+    cache = image_utils.create_thumbnail_cache(64 * KB)
+    assert isinstance(cache, SharedThumbnailCache)
+    assert cache.path == tmp_path / "thumbs.pack"
+    cache.close()
@@ -0,0 +1,149 @@
+import io
+import json
+import struct
+from pathlib import Path
+from typing import Any, Callable
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, features
+from sqlalchemy import event
+
+FRAME_LENGTH = struct.Struct(">I")
+
+
+def parse_frames(body: bytes) -> dict[str, tuple[dict[str, Any], bytes]]:
+    frames: dict[str, tuple[dict[str, Any], bytes]] = {}
+    offset = 0
+    while offset < len(body):
+        (length,) = FRAME_LENGTH.unpack_from(body, offset)
+        offset += FRAME_LENGTH.size
+        header = json.loads(body[offset : offset + length])
+        offset += length
+        (length,) = FRAME_LENGTH.unpack_from(body, offset)
+        offset += FRAME_LENGTH.size
+        frames[header["hash"]] = (header, body[offset : offset + length])
+        offset += length
+    return frames
+
+
+@pytest.fixture
+def hashes(upload_image: Callable[..., str]) -> list[str]:
+    return [
+        upload_image(f"batch_{i}.png", (640, 480), (i * 40, 100, 200 - i * 40))
+        for i in range(4)
+    ]
+
+
+def test_batch_by_hashes(test_app: TestClient, hashes: list[str]) -> None:
+    engine = test_app.app.state.db_sessionmaker.kw["bind"]  # type: ignore[attr-defined]
+    selects: list[str] = []
+    # The folder watcher syncs the uploads with queries of its own
+    test_app.app.state.watcher.stop()  # type: ignore[attr-defined]
+
+    def count(conn: Any, cursor: Any, statement: str, *args: Any) -> None:
+        if "FROM photos" in statement:
+            selects.append(statement)
+
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        resp = test_app.post(
+            "/photos/thumbnails",
+            params={"size": 128},
+            json={"hashes": [*hashes, "missing", hashes[0]]},
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "application/vnd.captioner.thumbnails"
+    assert len(selects) == 1  # one IN query for the whole batch
+    frames = parse_frames(resp.content)
+    assert set(frames) == {*hashes, "missing"}
+    assert frames["missing"][0]["status"] == 404
+    for hash in hashes:
+        header, thumb = frames[hash]
+        assert header["status"] == 200
+        assert header["content_type"] == "image/jpeg"
+        assert header["etag"] == f'"{hash}-128-jpeg"'
+        assert Image.open(io.BytesIO(thumb)).size == (128, 96)
+        single = test_app.get(f"/photos/{hash}/thumbnail", params={"size": 128})
+        assert single.content == thumb
+
+
+def test_batch_by_page_cursor(test_app: TestClient, hashes: list[str]) -> None:
+    resp = test_app.post("/photos/thumbnails", json={"limit": 3})
+    first = parse_frames(resp.content)
+    assert len(first) == 3
+    cursor = resp.headers["x-next-cursor"]
+    resp = test_app.post("/photos/thumbnails", json={"limit": 3, "cursor": cursor})
+    second = parse_frames(resp.content)
+    assert "x-next-cursor" not in resp.headers
+    assert set(first) | set(second) == set(hashes)
+    assert all(header["status"] == 200 for header, _ in second.values())
+
+
+def test_batch_reports_render_errors_per_photo(
+    test_app: TestClient, hashes: list[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def broken(*args: Any, **kwargs: Any) -> bytes:
+        raise OSError("decoder crashed")
+
+    async def broken_async(*args: Any, **kwargs: Any) -> bytes:
+        raise OSError("decoder crashed")
+
+    monkeypatch.setattr("app.image_utils.get_or_create_thumbnail", broken)
+    monkeypatch.setattr("app.image_utils.get_or_create_thumbnail_async", broken_async)
+    frames = parse_frames(
+        test_app.post("/photos/thumbnails", json={"hashes": hashes[:1]}).content
+    )
+    header, payload = frames[hashes[0]]
+    assert (header["status"], header["detail"], payload) == (
+        500,
+        "decoder crashed",
+        b"",
+    )
+
+
+def test_batch_reports_missing_source_file_as_404(
+    test_app: TestClient, hashes: list[str], temp_photos_dir: Path
+) -> None:
+    # Keep the photo row that the watcher would drop with the file
+    test_app.app.state.watcher.stop()  # type: ignore[attr-defined]
+    (temp_photos_dir / "batch_0.png").unlink()
+    frames = parse_frames(
+        test_app.post("/photos/thumbnails", json={"hashes": hashes[:2]}).content
+    )
+    header, payload = frames[hashes[0]]
+    assert (header["status"], header["detail"], payload) == (
+        404,
+        "Image file not found.",
+        b"",
+    )
+    assert frames[hashes[1]][0]["status"] == 200
+
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow built without WebP")
+def test_batch_negotiates_format(test_app: TestClient, hashes: list[str]) -> None:
+    resp = test_app.post(
+        "/photos/thumbnails",
+        json={"hashes": hashes[:2]},
+        headers={"Accept": "image/webp"},
+    )
+    assert "Accept" in resp.headers["vary"].split(", ")
+    for header, thumb in parse_frames(resp.content).values():
+        assert header["content_type"] == "image/webp"
+        assert Image.open(io.BytesIO(thumb)).format == "WEBP"
+
+
+@pytest.mark.parametrize(
+    "params, body",
+    [
+        ({"size": 100}, {"hashes": ["x"]}),
+        ({}, {"cursor": "not-a-cursor"}),
+        ({}, {"limit": 0}),
+    ],
+)
+def test_batch_rejects_bad_requests(
+    test_app: TestClient, params: dict[str, Any], body: dict[str, Any]
+) -> None:
+    resp = test_app.post("/photos/thumbnails", params=params, json=body)
+    assert resp.status_code in (400, 422)
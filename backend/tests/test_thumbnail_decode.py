@@ -0,0 +1,137 @@
+import io
+import struct
+from pathlib import Path
+import pytest
+from PIL import Image
+from app.image_utils import generate_thumbnail
+
+
+def exif_with_thumbnail(thumbnail: bytes, orientation: int = 1) -> bytes:
+    """
+    Minimal little-endian EXIF block: IFD0 with Orientation, IFD1 with a JPEG thumbnail.
+    """
+    header = b"II*\x00" + struct.pack("<I", 8)
+    ifd0 = struct.pack("<H", 1) + struct.pack("<HHII", 0x0112, 3, 1, orientation)
+    ifd1_offset = 8 + len(ifd0) + 4
+    thumbnail_offset = ifd1_offset + 2 + 2 * 12 + 4
+    ifd1 = (
+        struct.pack("<H", 2)
+        + struct.pack("<HHII", 0x0201, 4, 1, thumbnail_offset)
+        + struct.pack("<HHII", 0x0202, 4, 1, len(thumbnail))
+        + struct.pack("<I", 0)
+    )
+    return (
+        b"Exif\x00\x00"
+        + header
+        + ifd0
+        + struct.pack("<I", ifd1_offset)
+        + ifd1
+        + thumbnail
+    )
+
+
+def jpeg_bytes(img: Image.Image, **kwargs: object) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", **kwargs)
+    return buf.getvalue()
+
+
+def decode(data: bytes) -> Image.Image:
+    return Image.open(io.BytesIO(data))
+
+
+def test_jpeg_is_decoded_in_draft_mode(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "big.jpg"
+    path.write_bytes(jpeg_bytes(Image.new("RGB", (4000, 3000), (200, 10, 10))))
+    decoded_sizes: list[tuple[int, int]] = []
+    real_load = Image.Image.load
+
+    def tracking_load(self: Image.Image) -> object:
+        decoded_sizes.append(self.size)
+        return real_load(self)
+
+    monkeypatch.setattr(Image.Image, "load", tracking_load)
+    thumb = decode(generate_thumbnail(path, max_size=256))
+    assert thumb.size == (256, 192)
+    # JPEG DCT scaling decodes at 1/8 scale instead of the full 12 MP
+    assert (4000, 3000) not in decoded_sizes
+
+
+def test_large_png_is_reduced_before_resize(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "big.png"
+    Image.new("RGB", (2400, 1200), (0, 0, 255)).save(path)
+    factors: list[object] = []
+    real_reduce = Image.Image.reduce
+
+    def tracking_reduce(self: Image.Image, factor: object, *a: object) -> object:
+        factors.append(factor)
+        return real_reduce(self, factor, *a)  # type: ignore[arg-type]
+
+    monkeypatch.setattr(Image.Image, "reduce", tracking_reduce)
+    thumb = decode(generate_thumbnail(path, max_size=256))
+    assert thumb.size == (256, 128)
+    assert factors == [4]
+
+
+def test_suitable_exif_thumbnail_is_used(tmp_path: Path) -> None:
+    embedded = jpeg_bytes(Image.new("RGB", (320, 240), (0, 255, 0)))
+    path = tmp_path / "camera.jpg"
+    # The main image is red; the embedded thumbnail is green
+    path.write_bytes(
+        jpeg_bytes(
+            Image.new("RGB", (1600, 1200), (255, 0, 0)),
+            exif=exif_with_thumbnail(embedded),
+        )
+    )
+    thumb = decode(generate_thumbnail(path, max_size=256)).convert("RGB")
+    assert thumb.size == (256, 192)
+    r, g, _ = thumb.getpixel((128, 96))  # type: ignore[misc]
+    assert g > 200 and r < 50
+    # Too small for a larger request: fall back to the main image
+    big = decode(generate_thumbnail(path, max_size=512)).convert("RGB")
+    r, g, _ = big.getpixel((256, 192))  # type: ignore[misc]
+    assert r > 200 and g < 50
+
+
+def test_letterboxed_exif_thumbnail_is_ignored(tmp_path: Path) -> None:
+    embedded = jpeg_bytes(Image.new("RGB", (320, 240), (0, 255, 0)))
+    path = tmp_path / "wide.jpg"
+    path.write_bytes(
+        jpeg_bytes(
+            Image.new("RGB", (1800, 1200), (255, 0, 0)),
+            exif=exif_with_thumbnail(embedded),
+        )
+    )
+    thumb = decode(generate_thumbnail(path, max_size=256)).convert("RGB")
+    assert thumb.size == (256, 171)
+    assert thumb.getpixel((128, 85))[0] > 200  # type: ignore[index]
+
+
+@pytest.mark.parametrize("use_embedded", [False, True])
+def test_exif_orientation_is_applied(tmp_path: Path, use_embedded: bool) -> None:
+    # Stored landscape, orientation 6 means it should be shown rotated 90° clockwise
+    stored = Image.new("RGB", (1200, 800), (255, 0, 0))
+    stored.paste((0, 0, 255), (0, 0, 600, 800))  # left half blue
+    embedded = jpeg_bytes(stored.resize((300, 200)))
+    exif = exif_with_thumbnail(embedded if use_embedded else b"", orientation=6)
+    path = tmp_path / "rotated.jpg"
+    path.write_bytes(jpeg_bytes(stored, exif=exif))
+    thumb = decode(generate_thumbnail(path, max_size=256)).convert("RGB")
+    assert thumb.size == (171, 256)
+    # After a clockwise rotation the stored left half ends up on top
+    top = thumb.getpixel((85, 20))
+    bottom = thumb.getpixel((85, 235))
+    assert top[2] > 200 and top[0] < 50  # type: ignore[index]
+    assert bottom[0] > 200 and bottom[2] < 50  # type: ignore[index]
+
+
+@pytest.mark.parametrize("mode", ["P", "RGBA", "L", "I;16"])
+def test_other_modes_still_render(tmp_path: Path, mode: str) -> None:
+    path = tmp_path / f"mode_{mode.replace(';', '_')}.png"
+    Image.new("RGB", (900, 600), (30, 60, 90)).convert(mode).save(path)
+    thumb = decode(generate_thumbnail(path, max_size=128))
+    assert thumb.format == "JPEG" and thumb.size == (128, 85)
@@ -5,6 +5,7 @@ from typing import Generator, Tuple
 from fastapi.testclient import TestClient
 from PIL import Image
 from app.main import create_app
+from app.image_utils import thumbnail_cache_key
 from pytest import MonkeyPatch
 
 
@@ -84,8 +85,11 @@ def test_thumbnail_cache_eviction(tmp_path: Path, monkeypatch: MonkeyPatch) -> N
     photos_dir = tmp_path / "photos"
     photos_dir.mkdir()
     from app.main import create_app
+    from app.db import init_db
 
-    app = create_app(photos_dir=photos_dir)
+    app = create_app(photos_dir=photos_dir, db_path=tmp_path / "evict.db")
+    # Tables are created at startup, which this client does not run
+    init_db(app.state.db_engine)
     client = TestClient(app)
 
     import uuid
@@ -113,15 +117,17 @@ def test_thumbnail_cache_eviction(tmp_path: Path, monkeypatch: MonkeyPatch) -> N
     cache = app.state.thumbnail_cache
     # Request thumbnails for both
     client.get(f"/photos/{hash1}/thumbnail")
-    assert hash1 in cache.cache
+    assert thumbnail_cache_key(hash1, 256) in cache.cache
     client.get(f"/photos/{hash2}/thumbnail")
-    assert hash2 in cache.cache
+    assert thumbnail_cache_key(hash2, 256) in cache.cache
     # Now hash1 should be evicted (cache too small for both)
-    assert hash1 not in cache.cache
+    assert thumbnail_cache_key(hash1, 256) not in cache.cache
     # Request hash1 again (should be regenerated and re-cached)
     client.get(f"/photos/{hash1}/thumbnail")
-    assert hash1 in cache.cache
-    assert hash2 not in cache.cache  # hash2 should now be evicted
+    assert thumbnail_cache_key(hash1, 256) in cache.cache
+    assert (
+        thumbnail_cache_key(hash2, 256) not in cache.cache
+    )  # hash2 should now be evicted
 
 
 def test_thumbnail_error_on_corrupt_image(client: TestClient, tmp_path: Path) -> None:
@@ -208,6 +214,8 @@ def test_thumbnail_unidentified_image(
     )
     Base.metadata.create_all(bind=engine)
     test_sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # In-process renders go through the patched get_or_create_thumbnail
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "0")
     app = create_app(photos_dir=photos_dir)
     app.state.db_sessionmaker = test_sessionmaker
     client = TestClient(app)
@@ -250,6 +258,8 @@ def test_thumbnail_generic_exception(
     )
     Base.metadata.create_all(bind=engine)
     test_sessionmaker = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # In-process renders go through the patched get_or_create_thumbnail
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "0")
     app = create_app(photos_dir=photos_dir)
     app.state.db_sessionmaker = test_sessionmaker
     client = TestClient(app)
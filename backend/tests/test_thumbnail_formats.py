@@ -0,0 +1,83 @@
+import io
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image, features
+from app.image_utils import (
+    get_thumbnail_formats,
+    negotiate_thumbnail_format,
+    thumbnail_cache_key,
+)
+
+BROWSER_ACCEPT = "image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8"
+
+
+def detailed_image() -> Image.Image:
+    # Enough detail that WebP comes out smaller than JPEG
+    return Image.effect_mandelbrot((800, 600), (-2, -1.5, 1, 1.5), 50).convert("RGB")
+
+
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, "jpeg"),
+        ("*/*", "jpeg"),
+        ("image/*", "jpeg"),
+        ("image/jpeg", "jpeg"),
+        ("image/webp", "webp"),
+        (BROWSER_ACCEPT, "webp"),
+        ("image/avif", "avif"),
+        ("image/webp;q=0, image/avif;q=0.5", "avif"),
+        ("image/webp;q=bogus", "jpeg"),
+    ],
+)
+def test_negotiate_thumbnail_format(accept: str | None, expected: str) -> None:
+    if expected != "jpeg" and not features.check(expected):
+        pytest.skip(f"Pillow built without {expected}")
+    assert negotiate_thumbnail_format(accept) == expected
+
+
+def test_formats_follow_configured_preference(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("THUMBNAIL_FORMATS", "avif, jpeg, gif, webp, avif")
+    expected = tuple(f for f in ("avif", "webp") if features.check(f)) + ("jpeg",)
+    assert get_thumbnail_formats() == expected
+    monkeypatch.setenv("THUMBNAIL_FORMATS", "jpeg")
+    assert get_thumbnail_formats() == ("jpeg",)
+    assert negotiate_thumbnail_format(BROWSER_ACCEPT) == "jpeg"
+
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow built without WebP")
+def test_webp_and_jpeg_are_cached_separately(
+    test_app: TestClient, upload_image: Callable[..., str]
+) -> None:
+    hash = upload_image("formats.png", image=detailed_image())
+    webp = test_app.get(f"/photos/{hash}/thumbnail", headers={"Accept": BROWSER_ACCEPT})
+    jpeg = test_app.get(f"/photos/{hash}/thumbnail", headers={"Accept": "*/*"})
+    assert webp.headers["content-type"] == "image/webp"
+    assert jpeg.headers["content-type"] == "image/jpeg"
+    assert Image.open(io.BytesIO(webp.content)).format == "WEBP"
+    assert Image.open(io.BytesIO(jpeg.content)).format == "JPEG"
+    assert len(webp.content) < len(jpeg.content)
+    for resp in (webp, jpeg):
+        assert "Accept" in resp.headers["vary"].split(", ")
+    assert webp.headers["etag"] == f'"{hash}-256-webp"'
+    assert jpeg.headers["etag"] == f'"{hash}-256-jpeg"'
+    cache = test_app.app.state.thumbnail_cache  # type: ignore[attr-defined]
+    assert thumbnail_cache_key(hash, 256, "webp") in cache
+    assert thumbnail_cache_key(hash, 256, "jpeg") in cache
+
+
+@pytest.mark.skipif(not features.check("webp"), reason="Pillow built without WebP")
+def test_not_modified_is_per_format(
+    test_app: TestClient, upload_image: Callable[..., str]
+) -> None:
+    hash = upload_image("formats.png", image=detailed_image())
+    url = f"/photos/{hash}/thumbnail"
+    etag = test_app.get(url, headers={"Accept": "image/webp"}).headers["etag"]
+    resp = test_app.get(url, headers={"Accept": "image/webp", "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert "Accept" in resp.headers["vary"].split(", ")
+    # Same validator, but the client now negotiates a different representation
+    resp = test_app.get(url, headers={"Accept": "*/*", "If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == "image/jpeg"
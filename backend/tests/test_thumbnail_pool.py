@@ -0,0 +1,120 @@
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import generate_thumbnail
+from app.thumbnail_pool import (
+    ThumbnailPool,
+    ThumbnailPoolBusy,
+    create_thumbnail_pool,
+)
+
+
+def test_renders_in_worker_process(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    path = tmp_path / "a.png"
+    Image.new("RGB", (900, 600), (40, 80, 120)).save(path)
+    expected = generate_thumbnail(path, 128, "jpeg")
+
+    def in_process(*args: object) -> bytes:
+        return b"rendered in-process"
+
+    # Patching the parent's copy has no effect on a separate worker process
+    monkeypatch.setattr("app.image_utils.generate_thumbnail", in_process)
+    pool = ThumbnailPool(workers=1, queue_size=2)
+    try:
+        assert pool.render(path, 128, "jpeg") == expected
+        with pytest.raises(FileNotFoundError):
+            pool.render(tmp_path / "missing.png", 128, "jpeg")
+    finally:
+        pool.shutdown()
+    assert pool.executor is None
+
+
+def test_full_queue_raises_busy(monkeypatch: pytest.MonkeyPatch) -> None:
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(path: Path, max_size: int, fmt: str) -> bytes:
+        started.set()
+        release.wait(5)
+        return b"thumb"
+
+    monkeypatch.setattr("app.image_utils.generate_thumbnail", slow)
+    pool = ThumbnailPool(workers=0, queue_size=1)
+    first = threading.Thread(target=pool.render, args=(Path("x"), 256, "jpeg"))
+    first.start()
+    started.wait(5)
+    with pytest.raises(ThumbnailPoolBusy):
+        pool.render(Path("y"), 256, "jpeg")
+    release.set()
+    first.join()
+    # The slot is released once the render finishes
+    assert pool.render(Path("y"), 256, "jpeg") == b"thumb"
+
+
+def test_pool_configuration(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "3")
+    monkeypatch.delenv("THUMBNAIL_QUEUE_SIZE", raising=False)
+    pool = create_thumbnail_pool()
+    assert (pool.workers, pool.queue_size) == (3, 24)
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "0")
+    monkeypatch.setenv("THUMBNAIL_QUEUE_SIZE", "5")
+    pool = create_thumbnail_pool()
+    assert (pool.workers, pool.queue_size) == (0, 5)
+
+
+def test_route_returns_503_when_queue_is_full(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    hash = upload_image("busy.png", (300, 200), (1, 1, 1))
+
+    def busy(path: Path, max_size: int, fmt: str) -> Future[bytes]:
+        raise ThumbnailPoolBusy("Thumbnail queue is full.")
+
+    state = test_app.app.state  # type: ignore[attr-defined]
+    monkeypatch.setattr(state.thumbnail_pool, "workers", 1)
+    monkeypatch.setattr(state.thumbnail_pool, "submit", busy)
+    resp = test_app.get(f"/photos/{hash}/thumbnail")
+    assert resp.status_code == 503
+    assert resp.headers["retry-after"] == "1"
+    assert resp.json()["detail"] == "Thumbnail queue is full; retry shortly."
+
+
+def test_route_awaits_render_without_holding_a_connection(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    hash = upload_image("slow.png", (300, 200), (2, 2, 2))
+    render: Future[bytes] = Future()
+    submitted = threading.Event()
+
+    def submit(path: Path, max_size: int, fmt: str) -> Future[bytes]:
+        submitted.set()
+        return render
+
+    state = test_app.app.state  # type: ignore[attr-defined]
+    monkeypatch.setattr(state.thumbnail_pool, "workers", 1)
+    monkeypatch.setattr(state.thumbnail_pool, "submit", submit)
+    responses: list[int] = []
+    request = threading.Thread(
+        target=lambda: responses.append(
+            test_app.get(f"/photos/{hash}/thumbnail").status_code
+        )
+    )
+    request.start()
+    try:
+        assert submitted.wait(5)
+        engine = state.db_sessionmaker.kw["bind"]
+        assert engine.pool.checkedout() == 0
+    finally:
+        render.set_result(b"thumb")
+        request.join(5)
+    assert responses == [200]
@@ -0,0 +1,127 @@
+import io
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import (
+    DiskThumbnailCache,
+    LRUThumbnailCache,
+    get_thumbnail_formats,
+    thumbnail_cache_key,
+)
+from app.main import create_app
+from app.thumbnail_prewarm import (
+    ActivityMonitor,
+    ThumbnailPrewarmer,
+    create_prewarmer,
+)
+
+
+def make_state(tmp_path: Path, disk: bool = True) -> SimpleNamespace:
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    for name in ("a.png", "b.png"):
+        Image.new("RGB", (600, 400), (3, 4, 5)).save(photos_dir / name)
+    return SimpleNamespace(
+        photos_dir=photos_dir,
+        thumbnail_cache=LRUThumbnailCache(),
+        thumbnail_disk_cache=DiskThumbnailCache(tmp_path / "thumbs") if disk else None,
+    )
+
+
+def test_uncaptioned_and_recent_photos_come_first() -> None:
+    prewarmer = ThumbnailPrewarmer(SimpleNamespace())
+    prewarmer.enqueue([("old", "old.jpg", False), ("captioned", "c.jpg", True)])
+    prewarmer.enqueue([("new", "new.jpg", False), ("old", "old.jpg", False)])
+    order = [prewarmer._next() for _ in range(3)]  # type: ignore[misc]
+    assert [item[0] for item in order if item] == ["new", "old", "captioned"]
+    assert prewarmer.queued == set()
+
+
+def test_warm_writes_to_disk_tier_only(tmp_path: Path) -> None:
+    state = make_state(tmp_path)
+    prewarmer = ThumbnailPrewarmer(state)
+    assert prewarmer.warm("a-hash", "a.png", 256) is True
+    key = thumbnail_cache_key("a-hash", 256, get_thumbnail_formats()[0])
+    assert key in state.thumbnail_disk_cache
+    assert key not in state.thumbnail_cache
+    # Already cached: nothing to do
+    assert prewarmer.warm("a-hash", "a.png", 256) is False
+    assert prewarmer.warmed == 1
+
+
+def test_warm_uses_memory_without_disk_tier(tmp_path: Path) -> None:
+    state = make_state(tmp_path, disk=False)
+    ThumbnailPrewarmer(state).warm("b-hash", "b.png", 128)
+    key = thumbnail_cache_key("b-hash", 128, get_thumbnail_formats()[0])
+    assert key in state.thumbnail_cache
+
+
+def test_pauses_while_requests_are_running(
+    tmp_path: Path, wait_until: Callable[..., bool]
+) -> None:
+    monitor = ActivityMonitor()
+    prewarmer = ThumbnailPrewarmer(
+        make_state(tmp_path), cpu_budget=1.0, idle_delay=0.05, monitor=monitor
+    )
+    monitor.started()
+    prewarmer.start()
+    try:
+        prewarmer.enqueue([("a-hash", "a.png", False)])
+        time.sleep(0.3)
+        assert prewarmer.warmed == 0
+        monitor.finished()
+        assert wait_until(lambda: prewarmer.warmed == 1)
+    finally:
+        prewarmer.stop()
+    assert prewarmer.thread is None
+
+
+def test_failed_photo_does_not_stop_the_worker(
+    tmp_path: Path, wait_until: Callable[..., bool]
+) -> None:
+    prewarmer = ThumbnailPrewarmer(make_state(tmp_path), cpu_budget=1.0, idle_delay=0)
+    prewarmer.start()
+    try:
+        prewarmer.enqueue([("missing", "missing.png", False), ("b", "b.png", False)])
+        assert wait_until(lambda: prewarmer.warmed == 1)
+    finally:
+        prewarmer.stop()
+
+
+def test_create_prewarmer_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("THUMBNAIL_PREWARM_CPU", "0")
+    assert create_prewarmer(SimpleNamespace(), ActivityMonitor()) is None
+    monkeypatch.setenv("THUMBNAIL_PREWARM_CPU", "0.5")
+    monkeypatch.setenv("THUMBNAIL_PREWARM_SIZES", "128,512")
+    prewarmer = create_prewarmer(SimpleNamespace(), ActivityMonitor())
+    assert prewarmer is not None
+    assert (prewarmer.cpu_budget, prewarmer.sizes) == (0.5, (128, 512))
+
+
+def test_scan_and_upload_feed_the_prewarmer(
+    tmp_path: Path, wait_until: Callable[..., bool], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("THUMBNAIL_WORKERS", "0")
+    monkeypatch.setenv("THUMBNAIL_PREWARM_CPU", "1")
+    monkeypatch.setenv("THUMBNAIL_CACHE_DIR", str(tmp_path / "thumbs"))
+    monkeypatch.setenv("PHOTO_WATCHER", "off")
+    photos_dir = tmp_path / "photos"
+    photos_dir.mkdir()
+    Image.new("RGB", (500, 500), (9, 8, 7)).save(photos_dir / "scanned.png")
+    app = create_app(photos_dir=photos_dir, db_path=tmp_path / "prewarm.db")
+    app.state.thumbnail_prewarmer.idle_delay = 0.05
+    with TestClient(app) as client:
+        prewarmer = app.state.thumbnail_prewarmer
+        assert wait_until(lambda: prewarmer.warmed == 1)
+        buf = io.BytesIO()
+        Image.new("RGB", (500, 500), (1, 2, 3)).save(buf, format="PNG")
+        hash = client.post(
+            "/photos", files={"file": ("uploaded.png", buf.getvalue(), "image/png")}
+        ).json()["hash"]
+        assert wait_until(lambda: prewarmer.warmed == 2)
+        key = thumbnail_cache_key(hash, 256, get_thumbnail_formats()[0])
+        assert key in app.state.thumbnail_disk_cache
@@ -0,0 +1,144 @@
+import asyncio
+import io
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import (
+    LRUThumbnailCache,
+    SingleFlight,
+    get_or_create_thumbnail,
+)
+
+THREADS = 8
+
+
+def test_concurrent_misses_generate_once(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    Image.new("RGB", (640, 480), (5, 6, 7)).save(tmp_path / "a.png")
+    calls: list[int] = []
+    release = threading.Event()
+
+    def slow_generate(path: Path, max_size: int = 256, fmt: str = "jpeg") -> bytes:
+        calls.append(max_size)
+        release.wait(5)
+        return b"thumb"
+
+    monkeypatch.setattr("app.image_utils.generate_thumbnail", slow_generate)
+    cache = LRUThumbnailCache()
+    flights = SingleFlight()
+    with ThreadPoolExecutor(THREADS) as pool:
+        futures = [
+            pool.submit(
+                get_or_create_thumbnail,
+                tmp_path,
+                "abc",
+                "a.png",
+                cache,
+                flights=flights,
+            )
+            for _ in range(THREADS)
+        ]
+        # Hold the leader until every other caller has joined its flight
+        deadline = time.monotonic() + 5
+        while flights.coalesced < THREADS - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+    assert results == [b"thumb"] * THREADS
+    assert calls == [256]
+    assert (flights.executed, flights.coalesced) == (1, THREADS - 1)
+    assert flights.calls == {}
+    # Later requests are plain cache hits
+    get_or_create_thumbnail(tmp_path, "abc", "a.png", cache, flights=flights)
+    assert flights.executed == 1
+
+
+def test_waiters_share_the_leaders_exception() -> None:
+    flights = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    runs: list[int] = []
+
+    def fail() -> bytes:
+        runs.append(1)
+        started.set()
+        release.wait(5)
+        raise ValueError("decode failed")
+
+    def waiter() -> bytes:
+        return flights.do("k", lambda: b"not run")
+
+    with ThreadPoolExecutor(THREADS) as pool:
+        leader = pool.submit(flights.do, "k", fail)
+        started.wait(5)
+        waiters = [pool.submit(waiter) for _ in range(THREADS - 1)]
+        deadline = time.monotonic() + 5
+        while flights.coalesced < THREADS - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        release.set()
+        for future in [leader, *waiters]:
+            with pytest.raises(ValueError, match="decode failed"):
+                future.result()
+    assert runs == [1]
+    # A failed flight is not cached; the next caller runs again
+    assert flights.do("k", lambda: b"ok") == b"ok"
+    assert flights.executed == 2
+
+
+def test_different_keys_do_not_coalesce() -> None:
+    flights = SingleFlight()
+    assert flights.do("a", lambda: 1) == 1
+    assert flights.do("b", lambda: 2) == 2
+    assert (flights.executed, flights.coalesced) == (2, 0)
+
+
+def test_async_callers_share_a_call_their_cancellation_does_not_stop() -> None:
+    flights = SingleFlight()
+    runs: list[int] = []
+
+    async def main() -> None:
+        release = asyncio.Event()
+
+        async def render() -> bytes:
+            runs.append(1)
+            await release.wait()
+            return b"thumb"
+
+        leader = asyncio.ensure_future(flights.do_async("k", render))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flights.do_async("k", render))
+        await asyncio.sleep(0)
+        # The caller that started the call goes away; the follower still gets it
+        leader.cancel()
+        release.set()
+        assert await follower == b"thumb"
+        # A thread-based caller joins an async call the same way
+        release.clear()
+        waiter = asyncio.ensure_future(flights.do_async("k", render))
+        await asyncio.sleep(0)
+        joined = asyncio.to_thread(flights.do, "k", lambda: b"other")
+        joining = asyncio.ensure_future(joined)
+        while flights.coalesced < 2:
+            await asyncio.sleep(0.01)
+        release.set()
+        assert await waiter == await joining == b"thumb"
+
+    asyncio.run(main())
+    assert runs == [1, 1]
+    assert (flights.executed, flights.coalesced, flights.calls) == (2, 2, {})
+
+
+def test_thumbnail_route_uses_app_flights(test_app: TestClient) -> None:
+    buf = io.BytesIO()
+    Image.new("RGB", (300, 200), (9, 9, 9)).save(buf, format="PNG")
+    hash = test_app.post(
+        "/photos", files={"file": ("f.png", buf.getvalue(), "image/png")}
+    ).json()["hash"]
+    assert test_app.get(f"/photos/{hash}/thumbnail").status_code == 200
+    flights = test_app.app.state.thumbnail_flights  # type: ignore[attr-defined]
+    assert flights.executed == 1
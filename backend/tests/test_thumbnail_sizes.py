@@ -0,0 +1,77 @@
+import io
+from pathlib import Path
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+from app.image_utils import (
+    DEFAULT_THUMBNAIL_SIZES,
+    LRUThumbnailCache,
+    get_or_create_thumbnail,
+    get_thumbnail_sizes,
+    thumbnail_cache_key,
+)
+
+
+@pytest.mark.parametrize("size", DEFAULT_THUMBNAIL_SIZES)
+def test_thumbnail_size_parameter(
+    test_app: TestClient, upload_image: Callable[..., str], size: int
+) -> None:
+    hash = upload_image("sizes.png", (1200, 900))
+    resp = test_app.get(f"/photos/{hash}/thumbnail", params={"size": size})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] == f'"{hash}-{size}-jpeg"'
+    assert Image.open(io.BytesIO(resp.content)).size == (size, size * 3 // 4)
+    cache = test_app.app.state.thumbnail_cache  # type: ignore[attr-defined]
+    assert thumbnail_cache_key(hash, size) in cache
+
+
+def test_default_size_is_256(
+    test_app: TestClient, upload_image: Callable[..., str]
+) -> None:
+    hash = upload_image("sizes.png", (1200, 900))
+    resp = test_app.get(f"/photos/{hash}/thumbnail")
+    assert Image.open(io.BytesIO(resp.content)).size == (256, 192)
+
+
+@pytest.mark.parametrize("size", ["100", "0", "-256", "big"])
+def test_unsupported_size_is_rejected(
+    test_app: TestClient, upload_image: Callable[..., str], size: str
+) -> None:
+    hash = upload_image("sizes.png", (1200, 900))
+    resp = test_app.get(f"/photos/{hash}/thumbnail", params={"size": size})
+    assert resp.status_code in (400, 422)
+    assert resp.json()["detail"]
+
+
+def test_sizes_are_configurable(
+    test_app: TestClient,
+    upload_image: Callable[..., str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("THUMBNAIL_SIZES", "1024, 64,256")
+    assert get_thumbnail_sizes() == (64, 256, 1024)
+    hash = upload_image("sizes.png", (1200, 900))
+    assert test_app.get(f"/photos/{hash}/thumbnail?size=64").status_code == 200
+    resp = test_app.get(f"/photos/{hash}/thumbnail?size=128")
+    assert resp.status_code == 400
+    assert "64, 256, 1024" in resp.json()["detail"]
+
+
+def test_smaller_size_is_derived_from_cached_larger_one(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    Image.new("RGB", (1600, 1200), (200, 30, 30)).save(tmp_path / "big.png")
+    cache = LRUThumbnailCache()
+    large = get_or_create_thumbnail(tmp_path, "abc", "big.png", cache, 512)
+
+    # The original must not be decoded again for any smaller size
+    def fail(*args: object, **kwargs: object) -> bytes:
+        raise AssertionError("original decoded")
+
+    monkeypatch.setattr("app.image_utils.generate_thumbnail", fail)
+    for size in (256, 128):
+        thumb = get_or_create_thumbnail(tmp_path, "abc", "big.png", cache, size)
+        assert Image.open(io.BytesIO(thumb)).size == (size, size * 3 // 4)
+        assert cache.get(thumbnail_cache_key("abc", size)) == thumb
+    assert cache.get(thumbnail_cache_key("abc", 512)) == large
@@ -0,0 +1,96 @@
+import threading
+import pytest
+from app import image_utils
+from app.tinylfu import MIN_SHARD_BYTES, CountMinSketch, ShardedTinyLFUCache
+
+KB = 1024
+
+
+def test_get_put_overwrite_and_clear() -> None:
+    cache = ShardedTinyLFUCache(max_bytes=100 * KB, shards=1)
+    assert cache.get("a") is None
+    cache.put("a", b"1" * KB)
+    assert "a" in cache and cache.get("a") == b"1" * KB
+    cache.put("a", b"2" * 2 * KB)
+    assert cache.get("a") == b"2" * 2 * KB
+    assert (cache.entries, cache.current_bytes) == (1, 2 * KB)
+    assert (cache.hits, cache.misses) == (2, 1)
+    cache.put("huge", b"x" * 101 * KB)
+    assert "huge" not in cache
+    cache.clear()
+    assert (cache.entries, cache.current_bytes) == (0, 0)
+
+
+def test_sketch_saturates_and_ages() -> None:
+    sketch = CountMinSketch(64)
+    for _ in range(20):
+        sketch.increment("hot")
+    assert sketch.estimate("hot") == 15
+    assert sketch.estimate("cold") <= 1
+    sketch._age()  # type: ignore[attr-defined]
+    assert sketch.estimate("hot") == 7
+
+
+def test_scan_does_not_flush_hot_entries() -> None:
+    value = b"v" * KB
+    hot = [f"hot-{i}" for i in range(20)]
+    results: dict[str, int] = {}
+    for name, cache in (
+        ("lru", image_utils.LRUThumbnailCache(max_bytes=40 * KB)),
+        ("tinylfu", ShardedTinyLFUCache(max_bytes=40 * KB, shards=1)),
+    ):
+        for _ in range(5):
+            for key in hot:
+                if cache.get(key) is None:
+                    cache.put(key, value)
+        # One sequential sweep through a large library
+        for i in range(500):
+            key = f"scan-{i}"
+            if cache.get(key) is None:
+                cache.put(key, value)
+        results[name] = sum(key in cache for key in hot)
+    assert results["lru"] == 0
+    # Only entries still in the small admission window can be lost
+    assert results["tinylfu"] >= 0.9 * len(hot)
+
+
+def test_shard_count_is_a_bounded_power_of_two() -> None:
+    assert len(ShardedTinyLFUCache(100 * 1024 * KB, shards=16).shards) == 16
+    assert len(ShardedTinyLFUCache(100 * 1024 * KB, shards=12).shards) == 8
+    assert len(ShardedTinyLFUCache(3 * MIN_SHARD_BYTES, shards=16).shards) == 2
+    assert len(ShardedTinyLFUCache(KB, shards=16).shards) == 1
+
+
+def test_concurrent_use_keeps_accounting_consistent() -> None:
+    cache = ShardedTinyLFUCache(max_bytes=64 * MIN_SHARD_BYTES // 16, shards=4)
+
+    def worker(offset: int) -> None:
+        for i in range(2000):
+            key = f"k{(i * 7 + offset) % 300}"
+            if cache.get(key) is None:
+                cache.put(key, b"x" * (KB + i % 512))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for shard in cache.shards:
+        stored = [*shard.window.values(), *shard.probation.values()]
+        stored += shard.protected.values()
+        assert shard.current_bytes == sum(len(v) for v in stored)
+        assert shard.current_bytes <= shard.max_bytes
+    assert cache.hits + cache.misses == 8 * 2000
+
+
+def test_cache_policy_from_env(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Through the module: another test reloads image_utils
+    cache = image_utils.create_thumbnail_cache(10 * KB)
+    assert isinstance(cache, image_utils.LRUThumbnailCache)
+    monkeypatch.setenv("THUMBNAIL_CACHE_POLICY", "tinylfu")
+    monkeypatch.setenv("THUMBNAIL_CACHE_SHARDS", "4")
+    cache = image_utils.create_thumbnail_cache(64 * MIN_SHARD_BYTES)
+    assert isinstance(cache, ShardedTinyLFUCache) and len(cache.shards) == 4
+    monkeypatch.setenv("THUMBNAIL_CACHE_POLICY", "fifo")
+    with pytest.raises(ValueError):
+        image_utils.create_thumbnail_cache(10 * KB)
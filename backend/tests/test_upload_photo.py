@@ -2,7 +2,10 @@ from pathlib import Path
 from fastapi.testclient import TestClient
 from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
+import errno
 import hashlib
+import os
+import pytest
 from typing import cast
 
 
@@ -43,3 +46,103 @@ def test_upload_photo(test_app: TestClient, temp_photos_dir: Path) -> None:
         assert row[0] == filename
         assert row[1] == data["hash"]
         assert row[2] is None
+
+
+def test_upload_is_streamed_in_chunks(tmp_path: Path) -> None:
+    from app.image_utils import spool_upload
+
+    class Stream:
+        def __init__(self, data: bytes) -> None:
+            self.data = data
+            self.largest_read = 0
+
+        def read(self, size: int = -1) -> bytes:
+            self.largest_read = max(self.largest_read, size)
+            chunk, self.data = self.data[:size], self.data[size:]
+            return chunk
+
+    data = bytes(range(256)) * 10_000
+    stream = Stream(data)
+    tmp_file, sha256 = spool_upload(tmp_path, stream, chunk_size=64 * 1024)  # type: ignore[arg-type]
+    assert 0 < stream.largest_read <= 64 * 1024
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    assert tmp_file.parent == tmp_path and tmp_file.read_bytes() == data
+
+
+def test_duplicate_upload_leaves_no_files(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    content = b"duplicate-content"
+    first = test_app.post(
+        "/photos", files={"file": ("first.jpg", content, "image/jpeg")}
+    )
+    assert first.status_code == 201
+    second = test_app.post(
+        "/photos", files={"file": ("second.jpg", content, "image/jpeg")}
+    )
+    assert second.status_code == 409
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["first.jpg"]
+
+
+def test_upload_keeps_only_the_base_name(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    resp = test_app.post(
+        "/photos", files={"file": ("../outside/new/x.jpg", b"escape", "image/jpeg")}
+    )
+    assert resp.status_code == 201
+    assert resp.json()["filename"] == "x.jpg"
+    assert (temp_photos_dir / "x.jpg").read_bytes() == b"escape"
+    assert not (temp_photos_dir.parent / "outside").exists()
+    for name in (".hidden.jpg", "notes.txt", "dir/"):
+        resp = test_app.post("/photos", files={"file": (name, b"x", "image/jpeg")})
+        assert resp.status_code == 400
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["x.jpg"]
+
+
+def test_upload_does_not_replace_a_file_with_the_same_name(
+    test_app: TestClient, temp_photos_dir: Path
+) -> None:
+    first = test_app.post("/photos", files={"file": ("a.jpg", b"first", "image/jpeg")})
+    second = test_app.post(
+        "/photos", files={"file": ("a.jpg", b"second", "image/jpeg")}
+    )
+    assert second.status_code == 409
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["a.jpg"]
+    image = test_app.get(f"/photos/{first.json()['hash']}/image")
+    assert image.content == b"first"
+
+
+def test_concurrent_duplicate_upload_gets_409(
+    test_app: TestClient, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    content = b"same-bytes"
+    first = test_app.post("/photos", files={"file": ("a.jpg", content, "image/jpeg")})
+    assert first.status_code == 201
+
+    def not_found(db: object, hash: str) -> None:
+        return None
+
+    # As if the second upload checked before the first one committed
+    monkeypatch.setattr("app.routes.photos.get_photo_by_hash", not_found)
+    second = test_app.post("/photos", files={"file": ("b.jpg", content, "image/jpeg")})
+    assert second.status_code == 409
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["a.jpg"]
+
+
+def test_upload_without_hard_links(
+    test_app: TestClient, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    def no_link(source: object, target: object) -> None:
+        raise PermissionError(errno.EPERM, "Operation not permitted")
+
+    monkeypatch.setattr(os, "link", no_link)
+    first = test_app.post("/photos", files={"file": ("a.jpg", b"first", "image/jpeg")})
+    assert first.status_code == 201
+    assert (temp_photos_dir / "a.jpg").read_bytes() == b"first"
+    second = test_app.post(
+        "/photos", files={"file": ("a.jpg", b"second", "image/jpeg")}
+    )
+    assert second.status_code == 409
+    assert sorted(p.name for p in temp_photos_dir.iterdir()) == ["a.jpg"]
+    assert (temp_photos_dir / "a.jpg").read_bytes() == b"first"
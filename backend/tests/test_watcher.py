@@ -0,0 +1,148 @@
+import os
+import time
+from pathlib import Path
+from typing import Callable
+import pytest
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session, sessionmaker
+from app.crud import get_all_photos, get_file_index, update_photo_caption
+from app.image_utils import scan_photos_folder_on_startup, sync_photos_folder_paths
+from app.watcher import PhotoWatcher, PollingBackend
+
+
+def filenames(db: Session) -> dict[str, str | None]:
+    db.expire_all()
+    return {p.filename_value: p.caption_value for p in get_all_photos(db)}
+
+
+def test_sync_paths_add_rename_edit_delete(
+    temp_photos_dir: Path, db_session: Session, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    (temp_photos_dir / "a.jpg").write_bytes(b"aaa")
+    stats = sync_photos_folder_paths(temp_photos_dir, db_session, ["a.jpg"])
+    assert stats.files_added == 1
+    original_hash = get_all_photos(db_session)[0].hash_value
+    update_photo_caption(db_session, original_hash, "first")
+
+    # Rename: the hash is reused without reading the file, caption survives
+    os.rename(temp_photos_dir / "a.jpg", temp_photos_dir / "b.jpg")
+    hashed: list[Path] = []
+    from app import image_utils
+
+    real_hash_file = image_utils.hash_file
+
+    def recording_hash_file(path: Path) -> str:
+        hashed.append(path)
+        return real_hash_file(path)
+
+    monkeypatch.setattr(image_utils, "hash_file", recording_hash_file)
+    stats = sync_photos_folder_paths(temp_photos_dir, db_session, ["a.jpg", "b.jpg"])
+    assert hashed == [] and stats.files_hashed == 0
+    assert filenames(db_session) == {"b.jpg": "first"}
+    assert set(get_file_index(db_session)) == {"b.jpg"}
+
+    # Edit in place: new hash, caption carried over, old row removed
+    (temp_photos_dir / "b.jpg").write_bytes(b"bbb-edited")
+    sync_photos_folder_paths(temp_photos_dir, db_session, ["b.jpg"])
+    assert filenames(db_session) == {"b.jpg": "first"}
+    assert get_all_photos(db_session)[0].hash_value != original_hash
+
+    # Delete: photo row goes away with its last file
+    (temp_photos_dir / "b.jpg").unlink()
+    sync_photos_folder_paths(temp_photos_dir, db_session, ["b.jpg"])
+    assert filenames(db_session) == {}
+    assert get_file_index(db_session) == {}
+
+
+def test_sync_paths_keeps_photo_while_a_copy_remains(
+    temp_photos_dir: Path, db_session: Session
+) -> None:
+    (temp_photos_dir / "one.png").write_bytes(b"same")
+    (temp_photos_dir / "two.png").write_bytes(b"same")
+    scan_photos_folder_on_startup(temp_photos_dir, db_session)
+    assert len(get_all_photos(db_session)) == 1
+    (temp_photos_dir / "one.png").unlink()
+    sync_photos_folder_paths(temp_photos_dir, db_session, ["one.png", "notes.txt"])
+    assert len(get_all_photos(db_session)) == 1
+
+
+def test_polling_backend_reports_changed_names(temp_photos_dir: Path) -> None:
+    (temp_photos_dir / "keep.jpg").write_bytes(b"keep")
+    (temp_photos_dir / "gone.jpg").write_bytes(b"gone")
+    backend = PollingBackend(temp_photos_dir, interval=0.01)
+    (temp_photos_dir / "gone.jpg").unlink()
+    (temp_photos_dir / "new.jpg").write_bytes(b"new")
+    (temp_photos_dir / "ignored.txt").write_bytes(b"txt")
+    time.sleep(0.02)
+    assert backend.poll(1.0) == {"gone.jpg", "new.jpg"}
+    time.sleep(0.02)
+    assert backend.poll(1.0) == set()
+
+
+@pytest.mark.parametrize("mode", ["auto", "poll"])
+def test_watcher_syncs_folder_changes(
+    mode: str, temp_photos_dir: Path, tmp_path: Path, wait_until: Callable[..., bool]
+) -> None:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    engine = create_db_engine(tmp_path / f"watch_{mode}.db")
+    init_db(engine)
+    session_maker: sessionmaker[Session] = create_sessionmaker(engine)
+    watcher = PhotoWatcher(
+        temp_photos_dir, session_maker, mode=mode, debounce=0.05, poll_interval=0.05
+    )
+    watcher.start()
+    try:
+        with session_maker() as db:
+            (temp_photos_dir / "w1.jpg").write_bytes(b"watched1")
+            assert wait_until(lambda: "w1.jpg" in filenames(db))
+            os.rename(temp_photos_dir / "w1.jpg", temp_photos_dir / "w2.jpg")
+            assert wait_until(lambda: filenames(db) == {"w2.jpg": None})
+            (temp_photos_dir / "w2.jpg").unlink()
+            assert wait_until(lambda: filenames(db) == {})
+    finally:
+        watcher.stop()
+        engine.dispose()
+
+
+@pytest.mark.parametrize("mode", ["auto", "poll"])
+def test_watcher_syncs_new_shard_folders(
+    mode: str, temp_photos_dir: Path, tmp_path: Path, wait_until: Callable[..., bool]
+) -> None:
+    from app.db import create_db_engine, create_sessionmaker, init_db
+
+    engine = create_db_engine(tmp_path / f"watch_shards_{mode}.db")
+    init_db(engine)
+    session_maker: sessionmaker[Session] = create_sessionmaker(engine)
+    (temp_photos_dir / "ab").mkdir()
+    watcher = PhotoWatcher(
+        temp_photos_dir, session_maker, mode=mode, debounce=0.05, poll_interval=0.05
+    )
+    watcher.start()
+    try:
+        with session_maker() as db:
+            # ab/ existed before the watcher started, ab/cd/ and ef/01/ did not
+            (temp_photos_dir / "ab" / "cd").mkdir()
+            (temp_photos_dir / "ab" / "cd" / "abcd.jpg").write_bytes(b"sharded1")
+            (temp_photos_dir / "ef" / "01").mkdir(parents=True)
+            (temp_photos_dir / "ef" / "01" / "ef01.jpg").write_bytes(b"sharded2")
+            assert wait_until(lambda: len(filenames(db)) == 2)
+            assert set(get_file_index(db)) == {"ab/cd/abcd.jpg", "ef/01/ef01.jpg"}
+            (temp_photos_dir / "ab" / "cd" / "abcd.jpg").unlink()
+            assert wait_until(lambda: len(filenames(db)) == 1)
+    finally:
+        watcher.stop()
+        engine.dispose()
+
+
+def test_get_photos_does_not_scan_folder(
+    tmp_path: Path, temp_photos_dir: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    from app.main import create_app
+
+    monkeypatch.setenv("PHOTO_WATCHER", "off")
+    app = create_app(photos_dir=temp_photos_dir, db_path=tmp_path / "nowatch.db")
+    with TestClient(app) as client:
+        assert app.state.watcher is None
+        (temp_photos_dir / "late.jpg").write_bytes(b"late")
+        assert client.get("/photos").json() == []